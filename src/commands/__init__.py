@@ -61,6 +61,8 @@ class ShellCommands:
         self.register("bg tasks", help="List all background tasks.")
         self.register("bg output", help="Usage: \"bg output <id>\" see a task's output")
         self.register("bg kill", help="Usage: \"bg kill <id>\" send a kill signal to a task")
+        self.register("stats", self._cmd_stats, f"Show {SHELL_NAME} performance statistics for this session.")
+        self.register("stats completion", help="Completion and highlighting latency per source (p50/p95/p99).")
 
     def register(self, command, handler=None, help=None, simple_help=None):
         node = self.command_tree
@@ -198,8 +200,11 @@ class ShellCommands:
                 new_dir = os.path.abspath(os.path.expanduser(path_arg))
 
             if os.path.isdir(new_dir):
+                from core.input.dircache import dir_cache
+
                 self.shell.working_dir = new_dir
                 os.chdir(self.shell.working_dir)  # update Python process cwd
+                dir_cache.prefetch(new_dir)  # warm path completion for the new directory
             else:
                 dir_name = " ".join(args).strip("\"\'")
                 print(f"{SHELL_NAME}: cd: no such directory: {dir_name}")
@@ -221,6 +226,7 @@ class ShellCommands:
         # execute the original behavior
         with yaspin(text=f"Mapping: {args[0]}...", color="green", ) as spinner:
             self.shell.input_handler.indexer.help_indexer.map_tool(args[0], spinner=spinner)
+        self.shell.input_handler.reload_completion_index()
 
     def _cmd_ai(self, args):
         import ai
@@ -334,9 +340,12 @@ class ShellCommands:
                   "Example: activate venv")
             return
 
+        from core.environment import environment
+
         # update environment
         os.environ["VIRTUAL_ENV"] = path
         os.environ["PATH"] = bindir + os.pathsep + os.environ["PATH"]
+        environment.bump()
 
         # store it in shell instance
         self.shell.active_venv = os.path.basename(path)
@@ -351,6 +360,8 @@ class ShellCommands:
             self.shell.active_venv_version = "unknown"
 
     def _cmd_deactivate(self, args):
+        from core.environment import environment
+
         if "VIRTUAL_ENV" not in os.environ:
             print("No active venv to deactivate")
             return
@@ -366,6 +377,7 @@ class ShellCommands:
         paths = os.environ["PATH"].split(os.pathsep)
         paths = [p for p in paths if p != bindir]
         os.environ["PATH"] = os.pathsep.join(paths)
+        environment.bump()
 
         self.shell.active_venv = None
         self.shell.active_venv_version = None
@@ -462,3 +474,31 @@ class ShellCommands:
             self.shell.btm.task_table()
         else:
             print("Usage: bg <command>")
+
+    def _cmd_stats(self, args):
+        if len(args) != 1 or args[0] != "completion":
+            print("Usage: stats completion")
+            return
+
+        from prettytable import PrettyTable
+        from core.input.stats import completion_stats
+
+        rows = completion_stats.rows()
+        cache_rows = completion_stats.cache_rows()
+        if not rows and not cache_rows:
+            print("No completions recorded in this session yet.")
+            return
+
+        if rows:
+            table = PrettyTable()
+            table.field_names = ["Source", "Calls", "p50 ms", "p95 ms", "p99 ms", "Max ms", "Avg Candidates", "Dropped"]
+            for row in rows:
+                table.add_row(row)
+            print(table)
+
+        if cache_rows:
+            table = PrettyTable()
+            table.field_names = ["Cache", "Hits", "Misses", "Hit Rate %"]
+            for row in cache_rows:
+                table.add_row(row)
+            print(table)
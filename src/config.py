@@ -39,8 +39,30 @@ COMPLETE_COMMAND = True
 COMPLETE_PATHS = True
 COMPLETE_ARGS = True
 COMPLETE_HISTORY = True
+DIR_CACHE_SIZE = 256  # directory listings kept for path completion and highlighting
+PATH_COMPLETION_LIMIT = 1000  # path matches offered at once; typing more narrows further
+PATH_STREAM_THRESHOLD = 5_000  # uncached directories larger than this are streamed, not listed
+COMPLETION_SOURCE_BUDGET_MS = 150  # results from a source slower than this are dropped
+COMPLETION_DEBOUNCE_MS = 30  # wait for typing to pause before completing
+RANK_COMPLETIONS = True  # order completions by frequency and recency of use
+RANKING_HALF_LIFE_DAYS = 7
+RANKING_MAX_ITEMS = 20_000  # scored tokens kept; the least frecent are forgotten beyond this
+RANKING_MAX_DIRECTORIES = 200  # directories with their own scores
+RANKING_MAX_DIRECTORY_ITEMS = 1_000  # scored tokens kept per directory
+FUZZY_PATH_COMPLETION = True  # "**" in a path token searches the whole project
+FILE_INDEX_MAX_FILES = 1_000_000
+FILE_INDEX_WORKERS = 8
+FILE_INDEX_REFRESH_SECONDS = 30
+FS_PROBE_TIMEOUT_MS = 100  # filesystem checks slower than this mark the directory as slow
+FS_SCAN_TIMEOUT_MS = 1000  # longest a directory listing holds up its caller; the scan goes on in the background
+SLOW_PATH_RETRY_SECONDS = 5  # path features stay off for a slow directory at least this long
+SLOW_PATH_RETRY_MAX_SECONDS = 120
+COMPLETION_WORKER = False  # compute slow completion sources in a separate process
+AUTO_SUGGEST = True  # show the most likely history entry as ghost text
 
 PROMPT_HIGHLIGHTING = True
+HIGHLIGHT_CACHE_SECONDS = 1.0  # an unchanged line is re-highlighted at most this often
+ASYNC_HIGHLIGHT = True  # check highlighted paths in the background, never blocking a render
 
 # For Indexing
 PATH_INDEXING = True
@@ -71,9 +93,31 @@ DEFAULT_SETTINGS = {
         "COMPLETE_PATHS": COMPLETE_PATHS,
         "COMPLETE_ARGS": COMPLETE_ARGS,
         "COMPLETE_HISTORY": COMPLETE_HISTORY,
+        "DIR_CACHE_SIZE": DIR_CACHE_SIZE,
+        "PATH_COMPLETION_LIMIT": PATH_COMPLETION_LIMIT,
+        "PATH_STREAM_THRESHOLD": PATH_STREAM_THRESHOLD,
+        "COMPLETION_SOURCE_BUDGET_MS": COMPLETION_SOURCE_BUDGET_MS,
+        "COMPLETION_DEBOUNCE_MS": COMPLETION_DEBOUNCE_MS,
+        "RANK_COMPLETIONS": RANK_COMPLETIONS,
+        "RANKING_HALF_LIFE_DAYS": RANKING_HALF_LIFE_DAYS,
+        "RANKING_MAX_ITEMS": RANKING_MAX_ITEMS,
+        "RANKING_MAX_DIRECTORIES": RANKING_MAX_DIRECTORIES,
+        "RANKING_MAX_DIRECTORY_ITEMS": RANKING_MAX_DIRECTORY_ITEMS,
+        "FUZZY_PATH_COMPLETION": FUZZY_PATH_COMPLETION,
+        "FILE_INDEX_MAX_FILES": FILE_INDEX_MAX_FILES,
+        "FILE_INDEX_WORKERS": FILE_INDEX_WORKERS,
+        "FILE_INDEX_REFRESH_SECONDS": FILE_INDEX_REFRESH_SECONDS,
+        "FS_PROBE_TIMEOUT_MS": FS_PROBE_TIMEOUT_MS,
+        "FS_SCAN_TIMEOUT_MS": FS_SCAN_TIMEOUT_MS,
+        "SLOW_PATH_RETRY_SECONDS": SLOW_PATH_RETRY_SECONDS,
+        "SLOW_PATH_RETRY_MAX_SECONDS": SLOW_PATH_RETRY_MAX_SECONDS,
+        "COMPLETION_WORKER": COMPLETION_WORKER,
+        "AUTO_SUGGEST": AUTO_SUGGEST,
     },
     "prompt": {
         "PROMPT_HIGHLIGHTING": PROMPT_HIGHLIGHTING,
+        "HIGHLIGHT_CACHE_SECONDS": HIGHLIGHT_CACHE_SECONDS,
+        "ASYNC_HIGHLIGHT": ASYNC_HIGHLIGHT,
         "SHOW_USER": SHOW_USER,
     },
     "indexing": {
@@ -0,0 +1,55 @@
+import os
+from threading import Lock
+
+from .utils import prefix_range
+
+
+class EnvironmentSnapshot:
+    """
+    Generation-counted copy of os.environ.
+    Anything that changes the shell's environment calls bump(); consumers compare
+    generations instead of the environment itself.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._environ = None
+        self._names = None
+        self._lock = Lock()
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+            self._environ = None
+            self._names = None
+
+    def snapshot(self):
+        """
+        Return (generation, environ copy). The copy is shared, do not modify it.
+        """
+        with self._lock:
+            if self._environ is None:
+                self._environ = dict(os.environ)
+            return self.generation, self._environ
+
+    def __contains__(self, name):
+        return name in self.snapshot()[1]
+
+    def get(self, name, default=None):
+        return self.snapshot()[1].get(name, default)
+
+    def matching(self, prefix):
+        """
+        Variable names starting with prefix, sorted. The sorted names are built once per generation.
+        """
+        with self._lock:
+            if self._environ is None:
+                self._environ = dict(os.environ)
+            if self._names is None:
+                self._names = sorted(self._environ)
+            names = self._names
+        start, end = prefix_range(names, prefix)
+        return names[start:end]
+
+
+environment = EnvironmentSnapshot()
@@ -1,16 +1,21 @@
+import atexit
+
 from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.output import ColorDepth
 from prompt_toolkit.shortcuts import CompleteStyle
 
 import ai
 import config
-from config import AUTO_COMPLETE, HISTORY_FILE, PROMPT_HIGHLIGHTING
+from config import AUTO_COMPLETE, HISTORY_FILE, PROMPT_HIGHLIGHTING, IGNORE_SPACE
 from core.indexer import CommandIndexer
 from .completer import CommandCompleter
+from .dircache import dir_cache
+from .history import ShellFileHistory
 from .lexer import ShellLexer
+from .ranking import FrecencyRanker
 from .style import style
+from .suggest import HistoryAutoSuggest
 from .toolbar import bottom_toolbar
 
 kb = KeyBindings()
@@ -58,6 +63,19 @@ def _(event):
     buffer.start_completion(select_first=False)
 
 
+@kb.add('c-t')
+def _(event):
+    # Fuzzy file picker over the current project, filtered by the token at the cursor
+    from . import completer
+
+    buffer = event.app.current_buffer
+
+    completer.picker_mode = True
+
+    buffer.complete_state = None
+    buffer.start_completion(select_first=False)
+
+
 
 
 
@@ -67,10 +85,23 @@ class ShellInput:
         self.shell = shell
         self.indexer = CommandIndexer(index_path=AUTO_COMPLETE)
 
-        # Use FileHistory for persistent history
-        # self.history = ShellFileHistory(shell, history_file)
-        self.history = FileHistory(history_file)
+        # FileHistory with per-command metadata (cwd, venv, timestamp)
+        self.history = ShellFileHistory(shell, history_file)
+
+        # Frecency scores, persisted next to the history and seeded from it once
+        self.ranker = FrecencyRanker(history_file + ".rank")
+        if not self.ranker.load():
+            self.ranker.bootstrap(self.history.cmd_meta)
+        atexit.register(self.ranker.save)
+
+        self.completion_worker = None
+        self._build_session()
+        self.cmd_prefix = cmd_prefix
 
+    def _build_session(self):
+        """
+        Create the completer, lexer and prompt session, and the hooks tying them together.
+        """
         if AUTO_COMPLETE:
             completer = CommandCompleter(
                 self,
@@ -80,9 +111,10 @@ class ShellInput:
             )
         else:
             completer = None
+        self._attach_completion_worker(completer)
 
         if PROMPT_HIGHLIGHTING:
-            lexer = ShellLexer(self.shell)
+            lexer = ShellLexer(self.shell, async_validation=config.ASYNC_HIGHLIGHT)
         else:
             lexer = None
 
@@ -91,19 +123,25 @@ class ShellInput:
             style=style,
             completer=completer,
             history=self.history,
+            auto_suggest=self._auto_suggest(),
             complete_while_typing=True,
-            complete_in_thread=True,
+            complete_in_thread=False,
             complete_style=CompleteStyle.MULTI_COLUMN,
             key_bindings=kb,
             bottom_toolbar=bottom_toolbar,
             refresh_interval=0.1,
             color_depth=ColorDepth.TRUE_COLOR
         )
-        self.cmd_prefix = cmd_prefix
+        if completer is not None:
+            # Lazy menus grow a page at a time as the selection scrolls through them
+            buffer = self.session.default_buffer
+            self.session.app.key_processor.after_key_press += lambda _: completer.more_completions(buffer)
 
     def input(self, cmd_prefix=None):
         if cmd_prefix is None:
             cmd_prefix = self.cmd_prefix
+        # Whatever ran since the last prompt may have changed what highlighting shows
+        dir_cache.touch()
         try:
             command = self.session.prompt(cmd_prefix, )
         except EOFError:
@@ -112,8 +150,59 @@ class ShellInput:
         if not command.strip():
             return None
 
+        if self.completion_worker is not None:
+            self.completion_worker.add_history(command)
+        self._learn(command)
         return command
 
+    def _attach_completion_worker(self, completer):
+        """
+        Start (or restart, e.g. after the history was cleared) the out-of-process
+        completion worker when COMPLETION_WORKER is enabled.
+        """
+        if self.completion_worker is not None:
+            self.completion_worker.stop()
+            self.completion_worker = None
+        if completer is None or not config.COMPLETION_WORKER:
+            return
+
+        from .worker import CompletionWorker
+
+        self.completion_worker = CompletionWorker(
+            self.indexer.get_commands() + self.shell.command_handler.get_commands(),
+            self.shell.command_handler.command_list,
+            self.history.filename,
+            self.shell.working_dir,
+            ignore_case=completer.ignore_case,
+        )
+        completer.worker = self.completion_worker
+        atexit.register(self.completion_worker.stop)
+
+    def _auto_suggest(self):
+        return HistoryAutoSuggest(self.history, self.shell) if config.AUTO_SUGGEST else None
+
+    def reload_completion_index(self):
+        """
+        Tell the completion worker, if any, that the help index changed.
+        """
+        if self.completion_worker is not None:
+            self.completion_worker.reload()
+
+    def _learn(self, command):
+        """
+        Feed a submitted command into the completion ranking.
+        """
+        if IGNORE_SPACE and command.startswith(" "):
+            return
+
+        cwd = self.shell.working_dir
+        self.ranker.record_line(command, cwd=cwd)
+
+        completer = self.session.completer
+        if completer is not None:
+            for text in completer.accepted_completions(command):
+                self.ranker.record(text, cwd=cwd, accepted=True)
+
     def print_history(self):
         for i, line in enumerate(self.history.get_strings()):
             print(f"{i + 1}: {line}")
@@ -121,31 +210,20 @@ class ShellInput:
     def get_history(self):
         return self.history.get_strings()
 
+    @property
+    def history_index(self):
+        return self.history.index
+
     def clear_history(self):
-        # wipe the file
+        # wipe the file, its metadata and what was learned from it
         filename = self.history.filename
+        meta_filename = self.history.meta_filename
         del self.history
         open(filename, "w").close()
+        open(meta_filename, "w").close()
+        self.ranker.clear()
 
         # rebuild the session
-        self.history = FileHistory(filename)
-
-        if AUTO_COMPLETE:
-            completer = CommandCompleter(
-                self,
-                extra_commands=self.shell.command_handler.get_commands(),
-                ignore_case=True
-            )
-        else:
-            completer = None
+        self.history = ShellFileHistory(self.shell, filename)
 
-        self.session = PromptSession(
-            lexer=ShellLexer(self.shell),
-            style=style,
-            completer=completer,
-            history=self.history,
-            complete_while_typing=True,
-            complete_in_thread=True,
-            complete_style=CompleteStyle.MULTI_COLUMN,
-            key_bindings=kb
-        )
+        self._build_session()
@@ -1,13 +1,93 @@
+import asyncio
 import os
-
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from threading import Lock
+from typing import Callable, Iterator
+
+from prompt_toolkit.application import get_app_or_none
 from prompt_toolkit.completion import Completer, Completion
 
 import ai
 import config
 from ai.translation import translate_to_command
-from config import COMPLETE_ARGS, COMPLETE_PATHS, COMPLETE_HISTORY
+from core.environment import environment
+from core.utils import prefix_range
+from .dircache import dir_cache, path_resolver
+from .file_index import project_index
+from .sources import CompletionContext, default_sources
+from .stats import completion_stats
 
 ai_mode = False
+picker_mode = False
+
+# Lazy sources are materialized a menu page at a time. The page is estimated from
+# the rows PromptSession reserves for the menu and a typical column width.
+_MENU_ROWS = 8
+_MENU_COLUMN_WIDTH = 16
+_WORKER_MARGIN_SECONDS = 0.05
+_RESTART_RETRY_SECONDS = 0.05
+_MEMO_SIZE = 256
+
+
+class PartialMatches(list):
+    """
+    [(match key, Completion)] from a computation that stopped early.
+    Narrowing recomputes instead of filtering these, since matches may be missing.
+    """
+
+
+@dataclass
+class ScheduledSource:
+    """
+    One completion source, bound to a single request.
+    Fast sources run inline. The rest run on the completion pool, and timed ones
+    are dropped once they miss COMPLETION_SOURCE_BUDGET_MS.
+    """
+    name: str
+    func: Callable[[], list]
+    fast: bool = False
+    timed: bool = True
+    # func returns an iterator in display order, pulled one menu page at a time
+    lazy: bool = False
+
+    def run(self):
+        start = time.perf_counter()
+        result = self.func()
+        completion_stats.record(self.name, time.perf_counter() - start, len(result))
+        return result
+
+    def pages(self, size):
+        """
+        Pull a lazy source size completions at a time, timing each page.
+        """
+        iterator = iter(self.func())
+        while True:
+            start = time.perf_counter()
+            page = list(islice(iterator, size))
+            if not page:
+                return
+            completion_stats.record(self.name, time.perf_counter() - start, len(page))
+            yield page
+            if len(page) < size:
+                return
+
+
+@dataclass
+class LazyMenu:
+    """
+    The ungenerated rest of a lazy source whose first pages fill the open menu.
+    """
+    text: str
+    pages: Iterator[list]
+    seen: set
+    size: int
+    shown: int = 0
+
 
 class CommandCompleter(Completer):
     """
@@ -16,18 +96,161 @@ class CommandCompleter(Completer):
     2. Body: subcommands, flags, paths, and history after the last token.
     """
 
+    _COMMAND_CATEGORIES = (("sudo", "SUDO"), ("built_in", "BUILT-IN"), ("command", "INDEXED COMMAND"))
+
     def __init__(self, input_handler, extra_commands=None, ignore_case=True, completer_style=None):
         self.input_handler = input_handler
         self.help_indexer = input_handler.indexer
         self.ignore_case = ignore_case
         self.commands = sorted(self.help_indexer.get_commands() + (extra_commands or []))
         self.built_in_commands = input_handler.shell.command_handler.command_list
+        self.rebuild_command_index()
+        # source -> (line key, fragment, [(match key, Completion)]) of the last run
+        self._narrowing = {}
+        self._narrowing_context = None
+        self._last_text = ""
+        # the prompt's application, captured on its own thread for callbacks from others
+        self._app = None
+        # get_completions_async requests in progress
+        self._streaming = 0
+        # completion texts shown since the last submitted command
+        self._offered = set()
+        # rest of the lazy source shown in the open menu, extended by more_completions
+        self._lazy_menu = None
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="completion")
+        # optional CompletionWorker computing the slow sources out of process
+        self.worker = None
+        self.sources = sorted(default_sources(), key=lambda s: s.priority)
+        # memo key -> (computed at, result) for sources that declare a cache key
+        self._memo = OrderedDict()
+        self._memo_lock = Lock()
         if completer_style:
             self.style = completer_style
 
+    # -------------------- Command index -------------------- #
+    def rebuild_command_index(self):
+        """
+        Precompute the lookup tables used on every keystroke.
+        Call again whenever the command list or the built-ins change.
+        """
+        built_in_set = set(self.built_in_commands)
+
+        # category -> sorted [(key, name)], deduped by name
+        categories = {"sudo": {}, "built_in": {}, "command": {}}
+        for cmd in self.commands:
+            cmd_name = cmd.split(".")[0]
+            words = cmd_name.split()
+            if not words:
+                continue
+            if cmd_name == "sudo":
+                category = "sudo"
+            elif cmd_name in built_in_set:
+                category = "built_in"
+            else:
+                category = "command"
+            name = words[0]
+            categories[category].setdefault(name, self._fold(name))
+
+        # name -> first category it is offered under, for ranking without a scan
+        self._command_categories = {}
+        for category, _ in self._COMMAND_CATEGORIES:
+            for name in categories[category]:
+                self._command_categories.setdefault(name, category)
+
+        # (ranker, ranker version, cwd, no_sudo) -> scored commands, best first
+        self._ranked_commands = (None, [])
+
+        self._command_index = {}
+        for category, names in categories.items():
+            entries = sorted((key, name) for name, key in names.items())
+            self._command_index[category] = (
+                [key for key, _ in entries],
+                [name for _, name in entries],
+            )
+
+        # (first token, argument index) -> argument names
+        self._built_in_args = {}
+        for cmd in self.built_in_commands:
+            cmd_tokens = cmd.split()
+            for index, cmd_arg in enumerate(cmd_tokens[1:], start=1):
+                args = self._built_in_args.setdefault((cmd_tokens[0], index), [])
+                if cmd_arg not in args:
+                    args.append(cmd_arg)
+
+    def _fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _lookup_prefix(self, category, text):
+        keys, names = self._command_index[category]
+        key = self._fold(text)
+        start, end = prefix_range(keys, key)
+        return names[start:end]
+
+    # -------------------- Incremental narrowing -------------------- #
+    def _narrow(self, source, text, fragment, compute):
+        """
+        Complete fragment, the token at the end of text, for one source.
+        When the user only typed more characters onto the token since the last run,
+        the previous candidates are filtered instead of calling compute() again.
+        compute() returns [(match key, Completion)].
+        """
+        prefix = text[:len(text) - len(fragment)] if text.endswith(fragment) else text
+        key = (prefix, self._narrowing_context)
+        cached = self._narrowing.get(source)
+
+        if cached and cached[0] == key and cached[1] and fragment.startswith(cached[1]):
+            delta = len(fragment) - len(cached[1])
+            pairs = [
+                (match_key, self._shift(c, delta))
+                for match_key, c in cached[2]
+                if self._matches_token(match_key, fragment)
+            ]
+        else:
+            pairs = compute()
+
+        if isinstance(pairs, PartialMatches):
+            self._narrowing.pop(source, None)
+        else:
+            self._narrowing[source] = (key, fragment, pairs)
+        return [c for _, c in pairs]
+
+    @staticmethod
+    def _shift(completion, delta):
+        return Completion(
+            completion.text,
+            start_position=completion.start_position - delta,
+            display=completion.display,
+            display_meta=completion.display_meta,
+            style=completion.style,
+            selected_style=completion.selected_style,
+        )
+
+    # -------------------- Ranking -------------------- #
+    def _rank(self, completions):
+        ranker = self.input_handler.ranker
+        if ranker is None or not config.RANK_COMPLETIONS:
+            return completions
+        return ranker.rank(completions, cwd=self.input_handler.shell.working_dir)
+
+    def _offer(self, completion):
+        if len(self._offered) > 10_000:
+            self._offered.clear()
+        self._offered.add(completion.text)
+        return completion
+
+    def accepted_completions(self, line):
+        """
+        Return the tokens of a submitted line that had been offered as completions,
+        and start tracking afresh for the next line.
+        """
+        accepted = [token for token in line.split() if token in self._offered]
+        self._offered.clear()
+        return accepted
+
     # -------------------- Dedupe Gate -------------------- #
-    def _dedupe(self, completions):
-        seen = set()
+    def _dedupe(self, completions, seen=None):
+        if seen is None:
+            seen = set()
         for c in completions:
             key = (
                 c.text.lower() if self.ignore_case else c.text,
@@ -43,6 +266,7 @@ class CommandCompleter(Completer):
         if not text_before_cursor or text_before_cursor[-1] == " " or text_before_cursor[-1] == "~":
             return []
 
+        line = text_before_cursor
         text_before_cursor = text_before_cursor.split()[-1]
 
         text_before_expanded = text_before_cursor
@@ -65,17 +289,22 @@ class CommandCompleter(Completer):
 
             text_before_cursor = fragment
 
-        # TODO: This can cause problems so here it is for future me, Later: okay but why?
-        if "." in text_before_cursor:
-            return []
+        return self._narrow(
+            "path",
+            line,
+            text_before_cursor,
+            lambda: self._path_completions(text_before_cursor, working_dir, expanded),
+        )
 
-        paths = self._complete_path_raw(
+    def _path_completions(self, text_before_cursor, working_dir, expanded):
+        paths, complete = self._complete_path_raw(
             text_before_cursor,
             working_dir,
             ignore_case=self.ignore_case,
+            limit=config.PATH_COMPLETION_LIMIT,
         )
 
-        out = []
+        out = [] if complete else PartialMatches()
         dir_part, file_part = os.path.split(text_before_cursor)
 
         for path in paths:
@@ -85,22 +314,28 @@ class CommandCompleter(Completer):
             if quoted and expanded:
                 continue
 
-            out.append(
+            out.append((
+                os.path.basename(path.rstrip(os.sep)),
                 Completion(
                     formatted_path,
                     start_position=(-len(file_part) - 1) if is_absolute else - len(text_before_cursor),
                     style="class:quotes" if quoted else "class:path",
                     display_meta="QUOTED PATH" if quoted else "PATH",
-                )
-            )
+                ),
+            ))
         return out
 
-    @staticmethod
     def _complete_path_raw(
+            self,
             text_before_cursor: str,
             working_dir = None,
             ignore_case: bool = False,
+            limit: int | None = None,
     ):
+        """
+        Return (paths, complete): at most limit matching paths, directories with a
+        trailing separator, and whether that is all of them.
+        """
         text_expanded = os.path.expanduser(text_before_cursor)
         dir_part, file_part = os.path.split(text_expanded)
 
@@ -113,31 +348,70 @@ class CommandCompleter(Completer):
 
         dir_part = os.path.abspath(dir_part)
 
-        if not os.path.isdir(dir_part):
-            return []
-
-        try:
-            entries = os.listdir(dir_part)
-        except (FileNotFoundError, PermissionError):
-            return []
-
+        matches, complete = dir_cache.matching(dir_part, file_part, ignore_case, limit)
+        if not complete and limit is not None and len(matches) < limit:
+            # The scan stopped short of the limit, so matches may still be in the listing
+            future = dir_cache.filling(dir_part)
+            if future is None or future.done():
+                matches, complete = dir_cache.matching(dir_part, file_part, ignore_case, limit)
+            else:
+                self._refresh_when_listed(future)
         results = []
-        for entry in entries:
-            match = (
-                entry.lower().startswith(file_part.lower())
-                if ignore_case
-                else entry.startswith(file_part)
-            )
-            if not match:
-                continue
-
+        for entry, is_dir in matches:
             full_path = os.path.join(dir_part, entry)
-            if os.path.isdir(full_path):
+            if is_dir:
                 full_path += os.sep
-
             results.append(full_path)
 
-        return results
+        return results, complete
+
+    def _refresh_when_listed(self, future):
+        """
+        Restart completion once the background listing future is stored, if the
+        prompt still shows the text the partial answer was computed for.
+        """
+        app = self._app
+        if app is None:
+            return
+        text = self._last_text
+
+        def restart():
+            buffer = app.current_buffer
+            if buffer.document.text_before_cursor != text:
+                return
+            if self._streaming:
+                # Restarting now would drop the request still being answered
+                app.loop.call_later(_RESTART_RETRY_SECONDS, restart)
+                return
+            buffer.complete_state = None
+            buffer.start_completion(select_first=False)
+
+        def filled(_):
+            loop = app.loop
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(restart)
+
+        future.add_done_callback(filled)
+
+    def _complete_fuzzy_path(self, token, working_dir, display_meta="FUZZY PATH"):
+        """
+        Project-wide subsequence match on token (with any '**' removed), replacing the whole token.
+        """
+        index = project_index(working_dir)
+        out = []
+        for rel_path in index.search(token.replace("**", "")):
+            path = os.path.relpath(os.path.join(index.root, rel_path), working_dir)
+            formatted_path = f'"{path}"' if any(ch in path for ch in ' \t"\'') else path
+            out.append(
+                Completion(
+                    formatted_path,
+                    start_position=-len(token),
+                    display=rel_path,
+                    style="class:path",
+                    display_meta=display_meta,
+                )
+            )
+        return out
 
     def _format_path(self, path, working_dir):
         no_quotes = path.strip("\"\'")
@@ -153,97 +427,269 @@ class CommandCompleter(Completer):
 
     # -------------------- Command completion -------------------- #
     def _complete_command(self, text, no_sudo=False, built_in_index=0):
-        sudo = []
-        built_in = []
-        command = []
-        for cmd in self.commands:
-            cmd_name = cmd.split(".")[0]
-            match = cmd_name.lower().startswith(text.lower()) if self.ignore_case else cmd_name.startswith(text)
-            if match:
-                if cmd_name == "sudo":
-                    if no_sudo:
-                        continue
-                    color = "class:sudo"
-                    sudo.append(Completion(cmd_name.split()[0], start_position=-len(text), style=color, display_meta="SUDO",))
-
-                elif cmd_name in self.built_in_commands:
-                    color = "class:built_in"
-                    built_in.append(Completion(cmd_name.split()[0], start_position=-len(text), style=color, display_meta="BUILT-IN",))
+        return list(self._iter_commands(text, no_sudo))
 
-                else:
-                    color = "class:command"
-                    command.append(Completion(cmd_name.split()[0], start_position=-len(text), style=color, display_meta="INDEXED COMMAND",))
-
-        return sudo + built_in + command
+    def _iter_commands(self, text, no_sudo=False, skip=()):
+        for category, meta in self._COMMAND_CATEGORIES:
+            if category == "sudo" and no_sudo:
+                continue
+            for name in self._lookup_prefix(category, text):
+                if name not in skip:
+                    yield Completion(name, start_position=-len(text), style=f"class:{category}", display_meta=meta)
+
+    def _lazy_commands(self, no_sudo=False):
+        """
+        Every command, in ranked order, one Completion at a time.
+        Scored commands come first, found through the ranker's vocabulary rather than
+        a scan of the index; the rest follow in index order.
+        """
+        ranked = self._scored_commands(no_sudo)
+        metas = dict(self._COMMAND_CATEGORIES)
+        for name in ranked:
+            category = self._command_categories[name]
+            yield Completion(name, start_position=0, style=f"class:{category}", display_meta=metas[category])
+        yield from self._iter_commands("", no_sudo, skip=set(ranked))
+
+    def _scored_commands(self, no_sudo=False):
+        """
+        Commands the ranker has scored, best first.
+        Kept until the ranker, the directory or the command index changes, so
+        refreshing the empty-line menu does not re-sort the vocabulary.
+        """
+        ranker = self.input_handler.ranker
+        if ranker is None or not config.RANK_COMPLETIONS:
+            return []
+        cwd = self.input_handler.shell.working_dir
+        key = (ranker, ranker.version, cwd, no_sudo)
+        cached_key, ranked = self._ranked_commands
+        if cached_key != key:
+            ranked = [
+                name for name in ranker.scores
+                if name in self._command_categories and not (no_sudo and self._command_categories[name] == "sudo")
+            ]
+            ranked.sort(key=lambda name: -ranker.score(name, cwd))
+            self._ranked_commands = (key, ranked)
+        return ranked
 
     def _complete_build_in_arg(self, text, built_in_index=1):
         out = []
         text_tokens = text.split()
-        text_arg = text_tokens[built_in_index] if built_in_index < len(text_tokens) else ""
         if not text_tokens:
             return []
-        for cmd in self.built_in_commands:
-            cmd_tokens = cmd.split()
-            if built_in_index >= len(cmd_tokens):
-                continue
-            if cmd_tokens[0] != text_tokens[0]:
-                continue
-            cmd_arg = cmd_tokens[built_in_index]
-
-            match = cmd_arg.lower().startswith(text_arg.lower()) if self.ignore_case else cmd_arg.startswith(text_arg)
-            match = match or text.endswith(" ")
-
+        text_arg = text_tokens[built_in_index] if built_in_index < len(text_tokens) else ""
+        for cmd_arg in self._built_in_args.get((text_tokens[0], built_in_index), ()):
+            match = self._matches_token(cmd_arg, text_arg) or text.endswith(" ")
             if match:
                 out.append(Completion(cmd_arg, start_position=-len(text_arg), style="class:arg"))
         return out
 
+    # -------------------- Sources -------------------- #
+    def register_source(self, source):
+        """
+        Add a CompletionSource. It is triggered, scheduled and memoized like the built-in ones.
+        """
+        self.sources.append(source)
+        self.sources.sort(key=lambda s: s.priority)
+
+    def _context(self, text, kind, token_index=None, tool_index=None):
+        tokens = text.split()
+        if tool_index is None:
+            tool_index = 1 if tokens and tokens[0] == "sudo" else 0
+        return CompletionContext(
+            text=text,
+            kind=kind,
+            cwd=self.input_handler.shell.working_dir,
+            completer=self,
+            env_generation=environment.generation,
+            tokens=tokens,
+            token_index=len(tokens) if token_index is None else token_index,
+            tool_index=tool_index,
+        )
+
+    def _schedule(self, context):
+        """
+        Bind every source triggered by context to this request, in priority order.
+        """
+        return [
+            ScheduledSource(
+                source.name,
+                partial(self._memoized, source, context),
+                fast=source.fast,
+                timed=source.timed,
+                lazy=source.lazy,
+            )
+            for source in self.sources
+            if context.kind in source.kinds and source.applies(context)
+        ]
+
+    def _memoized(self, source, context):
+        key = source.memo_key(context)
+        if key is None:
+            return source.complete(context)
+
+        now = time.monotonic()
+        with self._memo_lock:
+            cached = self._memo.get(key)
+            if cached is not None and (source.ttl is None or now - cached[0] < source.ttl):
+                self._memo.move_to_end(key)
+                return cached[1]
+
+        result = source.complete(context)
+        with self._memo_lock:
+            self._memo[key] = (now, result)
+            while len(self._memo) > _MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return result
+
     # -------------------- Deterministic completion -------------------- #
     def complete_deterministic(self, last_token, text_before_cursor, token_index, tool_index):
-        out = []
-        found_path = False
-
-        if COMPLETE_ARGS:
-            out += self._complete_build_in_arg(text_before_cursor.removeprefix("sudo"))
-            suggested = self.help_indexer.help_indexer.get_suggested(text_before_cursor)
-            command_suggestions = suggested.get("subcommand_suggestions", [])
-            if text_before_cursor[-1] == " " or last_token.startswith("-") or last_token.startswith(
-                    "--") or last_token.startswith("/"):
-                optional_suggestions = suggested.get("option_suggestions", [])
-            else:
-                optional_suggestions = suggested.get("optional_suggestions", [])
-
-            partial = suggested.get("partial", True)
-
-            for s in command_suggestions:
-                out.append(
-                    Completion(
-                        s,
-                        start_position=-len(last_token) if partial else 0,
-                        style="class:arg",
-                        display_meta="MAP - ARGUMENT",
-                    )
-                )
-
-            for s in optional_suggestions:
-                out.append(
-                    Completion(
-                        s,
-                        start_position=-len(last_token) if partial else 0,
-                        style="class:optional",
-                        display_meta="MAP - OPTIONAL",
-                    )
-                )
+        context = self._context(text_before_cursor, "line", token_index, tool_index)
+        return self._collect(text_before_cursor, self._schedule(context))
+
+    # -------------------- Scheduling -------------------- #
+    def _collect(self, text, sources):
+        """
+        Run sources to completion and concatenate their results in source order.
+        """
+        results = self._run_sources(text, [source for source in sources if not source.fast])
+        for source in sources:
+            if source.fast:
+                results[source.name] = source.run()
+        return [c for source in sources for c in results.get(source.name, [])]
+
+    def _run_sources(self, text, sources):
+        """
+        Run sources concurrently on the completion pool, timed ones against their budget.
+        Returns {name: result}. Sources that miss their deadline are dropped, and
+        nothing is returned once the document has moved on from text.
+        """
+        budget = config.COMPLETION_SOURCE_BUDGET_MS / 1000
+        started = time.monotonic()
+        futures = [(source, self._executor.submit(source.run)) for source in sources]
+
+        results = {}
+        for source, future in futures:
+            timeout = max(0.0, started + budget - time.monotonic()) if source.timed else None
+            try:
+                results[source.name] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                completion_stats.drop(source.name)
+
+        if self._is_stale(text):
+            return {}
+        return results
 
-        if COMPLETE_PATHS:
-            paths = self._complete_path(text_before_cursor, self.input_handler.shell.working_dir)
-            if paths:
-                found_path = True
-                out.extend(paths)
+    @staticmethod
+    def _menu_page_size():
+        """
+        Roughly how many completions the multi-column menu shows at once.
+        """
+        app = get_app_or_none()
+        columns = app.output.get_size().columns if app is not None else 80
+        return _MENU_ROWS * max(1, columns // _MENU_COLUMN_WIDTH)
+
+    def _first_pages(self, text, source):
+        """
+        Yield the first two menu pages of a lazy source and keep the rest for
+        more_completions. The request ends there, so the prompt is free to start
+        another one while the menu stays open.
+        """
+        size = self._menu_page_size()
+        menu = LazyMenu(text, source.pages(size), set(), size)
+        for page in islice(menu.pages, 2):
+            for c in self._dedupe(page, menu.seen):
+                menu.shown += 1
+                yield self._offer(c)
+        self._lazy_menu = menu
+
+    def more_completions(self, buffer):
+        """
+        Key hook: add the next page of a lazy source to the open menu once the
+        selection reaches the last page shown.
+        """
+        menu = self._lazy_menu
+        state = buffer.complete_state
+        if menu is None or state is None or state.complete_index is None:
+            return
+        # Only the menu the lazy source filled, as the prompt left it
+        if state.original_document.text_before_cursor != menu.text or len(state.completions) != menu.shown:
+            return
+        if state.complete_index < menu.shown - menu.size:
+            return
+
+        page = next(menu.pages, None)
+        if page is None:
+            self._lazy_menu = None
+            return
+        for c in self._dedupe(page, menu.seen):
+            state.completions.append(self._offer(c))
+        menu.shown = len(state.completions)
+        buffer.on_completions_changed.fire()
 
-        if COMPLETE_HISTORY:
-            out = self._complete_history(text_before_cursor, tool_index, token_index, last_token,
-                                         self.input_handler.shell.working_dir) + out
+    @staticmethod
+    def _is_stale(text):
+        """
+        True if the prompt's text before the cursor is no longer text.
+        """
+        app = get_app_or_none()
+        if app is None:
+            return False
+        return app.current_buffer.document.text_before_cursor != text
 
+    @staticmethod
+    def _debounce_delay(complete_event):
+        """
+        Seconds to wait for typing to pause. Explicitly requested completions (Tab) are never delayed.
+        """
+        if complete_event is None or complete_event.completion_requested:
+            return 0
+        return max(0, config.COMPLETION_DEBOUNCE_MS) / 1000
+
+    def _debounce(self, text, complete_event):
+        """
+        Wait for typing to pause. Returns False if the text changed meanwhile.
+        """
+        delay = self._debounce_delay(complete_event)
+        if not delay:
+            return True
+        time.sleep(delay)
+        return not self._is_stale(text)
+
+    async def _debounce_async(self, text, complete_event):
+        delay = self._debounce_delay(complete_event)
+        if not delay:
+            return True
+        await asyncio.sleep(delay)
+        return not self._is_stale(text)
+
+    def _complete_map(self, last_token, text_before_cursor):
+        out = []
+        suggested = self.help_indexer.help_indexer.get_suggested(text_before_cursor)
+        command_suggestions = suggested.get("subcommand_suggestions", [])
+        if text_before_cursor[-1] == " " or last_token.startswith("-") or last_token.startswith(
+                "--") or last_token.startswith("/"):
+            optional_suggestions = suggested.get("option_suggestions", [])
+        else:
+            optional_suggestions = suggested.get("optional_suggestions", [])
+
+        start_position = -len(last_token) if suggested.get("partial", True) else 0
+
+        for s in command_suggestions:
+            out.append(Completion(
+                s,
+                start_position=start_position,
+                style="class:arg",
+                display_meta="MAP - ARGUMENT",
+            ))
+
+        for s in optional_suggestions:
+            out.append(Completion(
+                s,
+                start_position=start_position,
+                style="class:optional",
+                display_meta="MAP - OPTIONAL",
+            ))
         return out
 
     def _complete_history(self, text_before_cursor, tool_index, token_index, last_token, working_dir):
@@ -256,66 +702,67 @@ class CommandCompleter(Completer):
                     or (len(token) >= 2 and token[1] == ":")  # Windows drive
             )
 
-        def _verify_path(token: str, working_dir) -> bool:
+        def _path_probes(token: str, working_dir):
+            """
+            The path itself and its parent as a directory: either existing keeps the
+            candidate (the parent alone means the user is still typing the file name).
+            """
             expanded = os.path.expanduser(token)
 
             if not os.path.isabs(expanded) and working_dir:
                 expanded = os.path.join(working_dir, expanded)
-
-            # exact path exists
-            if os.path.exists(expanded):
-                return True
-
-            # parent exists (user still typing filename)
-            parent = os.path.dirname(expanded)
-            return bool(parent) and os.path.isdir(parent)
+            expanded = os.path.abspath(expanded)
+            return [expanded, os.path.join(os.path.dirname(expanded), "")]
 
         out = []
         seen = set()
-        history = reversed(self.input_handler.get_history())
-
-        tokens = text_before_cursor.split()
+        candidates = []
 
         if token_index == tool_index:
             return out
 
-        prev_typed = tokens[token_index - 1] if token_index > 0 else None
-        prev_typed_minus_one = tokens[token_index - 2] if token_index > 0 else None
+        tokens = text_before_cursor.split()
+        trailing_space = text_before_cursor.endswith(" ")
+
+        # Position of the token being completed and the token it must follow
+        position = token_index if trailing_space else token_index - 1
+        if position < 1:
+            return out
+        previous = tokens[position - 1]
 
-        for entry in history:
-            words = entry.split()
-            if len(words) <= token_index:
+        for candidate, _ in self.input_handler.history_index.candidates(previous, position):
+            key = candidate.lower() if self.ignore_case else candidate
+            if key in seen:
                 continue
 
-            # context lock
-            if token_index > tool_index:
-                if text_before_cursor.endswith(" "):
-                    if words[token_index - 1] != prev_typed:
-                        continue
-                else:
-                    if words[token_index - 2] != prev_typed_minus_one:
-                        continue
+            if not trailing_space and not self._matches_token(candidate, last_token):
+                continue
 
-            candidate = words[token_index if text_before_cursor.endswith(" ") else token_index - 1]
+            candidates.append(candidate)
+            seen.add(key)
 
-            key = candidate.lower() if self.ignore_case else candidate
-            if key in seen:
+        # Every path-like candidate is checked in one batch against the shared listings
+        probes = {
+            candidate: _path_probes(candidate, working_dir)
+            for candidate in candidates
+            if _looks_like_path(candidate)
+        }
+        flat = [path for paths in probes.values() for path in paths]
+        statuses = dict(zip(flat, path_resolver.resolve(flat)))
+
+        for candidate in candidates:
+            paths = probes.get(candidate)
+            if paths is not None and not any(statuses[path].exists for path in paths):
                 continue
 
-            if _looks_like_path(candidate):
-                if not _verify_path(candidate, working_dir):
-                    continue
-
-            if self._matches_token(candidate, last_token) or text_before_cursor.endswith(" "):
-                out.append(
-                    Completion(
-                        candidate,
-                        start_position=-len(last_token) if not text_before_cursor.endswith(" ") else 0,
-                        style="class:link",
-                        display_meta="HISTORY",
-                    )
+            out.append(
+                Completion(
+                    candidate,
+                    start_position=0 if trailing_space else -len(last_token),
+                    style="class:link",
+                    display_meta="HISTORY",
                 )
-                seen.add(key)
+            )
 
         return out
 
@@ -345,65 +792,76 @@ class CommandCompleter(Completer):
 
     @staticmethod
     def ai_get_nearby_files(cwd: str, prefix: str, limit: int = 30):
-        try:
-            items = os.listdir(cwd)
-        except Exception:
+        listing = dir_cache.listing(cwd)
+        if listing is None:
             return []
 
-        token = (prefix.split(" ")[-1] if prefix else "").lower()
-
-        if token:
-            filtered = [i for i in items if i.lower().startswith(token)]
-        else:
-            filtered = items
-
-        return filtered[:limit]
+        token = prefix.split(" ")[-1] if prefix else ""
+        return listing.matching(token, ignore_case=True, limit=limit)
 
 
     def complete_ai(self, text):
-        out = []
+        return self._complete_ai_translation(text) + self._complete_ai_suggestions(text)
 
-        if config.AI_ENABLED and ai.AI_INTERFACE:
-            current_os = config.PLATFORM
-            cwd = self.input_handler.shell.working_dir
-            nearby_files = self.ai_get_nearby_files(cwd, prefix=text)
-            history = self.ai_limit_history(self.input_handler.get_history())
-            history_text = ", ".join(history)
-            nearby_files_text = ", ".join(nearby_files)
-
-            ai_completions = [translate_to_command(text, os=current_os, cwd=cwd)]
-            ai_completions.extend(
-                ai.AI_INTERFACE.autocomplete
-                (
-                    text,
-                    os=current_os,
-                    cwd=cwd,
-                    nearby_files=nearby_files_text,
-                    history_text=history_text,
-                )
-            )
+    @staticmethod
+    def _ai_available():
+        return config.AI_ENABLED and ai.AI_INTERFACE
 
-            for i, completion in enumerate(ai_completions):
-                if not completion:
-                    continue
+    def _complete_ai_translation(self, text):
+        if not self._ai_available():
+            return []
 
-                completion = completion.strip()
+        cwd = self.input_handler.shell.working_dir
+        translation = translate_to_command(text, os=config.PLATFORM, cwd=cwd)
+        return self._ai_completions(text, [translation], "AI (Natural -> Command)")
+
+    def _complete_ai_suggestions(self, text):
+        if not self._ai_available():
+            return []
 
-                insert_text = completion
+        current_os = config.PLATFORM
+        cwd = self.input_handler.shell.working_dir
+        nearby_files = self.ai_get_nearby_files(cwd, prefix=text)
+        history = self.ai_limit_history(self.input_handler.get_history())
+        history_text = ", ".join(history)
+        nearby_files_text = ", ".join(nearby_files)
+
+        suggestions = ai.AI_INTERFACE.autocomplete(
+            text,
+            os=current_os,
+            cwd=cwd,
+            nearby_files=nearby_files_text,
+            history_text=history_text,
+        )
+        return self._ai_completions(text, suggestions, "AI")
 
-                display = self.ellipsize_left(insert_text, 50)
+    def _ai_completions(self, text, suggestions, label):
+        out = []
+        for completion in suggestions:
+            if not completion:
+                continue
 
+            insert_text = completion.strip()
+            display = self.ellipsize_left(insert_text, 50)
 
-                out.append(
-                    Completion(
-                        insert_text,
-                        start_position=-len(text),
-                        style="class:completion-ai",
-                        display_meta=f"AI{display}" if i != 0 else f"AI (Natural -> Command){display}",
-                    )
+            out.append(
+                Completion(
+                    insert_text,
+                    start_position=-len(text),
+                    style="class:completion-ai",
+                    display_meta=f"{label}{display}",
                 )
+            )
         return out
 
+    @staticmethod
+    def _no_ai_result(text):
+        return Completion(
+            "NO RESULT",
+            start_position=-len(text),
+            style="class:completion-ai",
+            display_meta="AI"
+        )
 
     # -------------------- Utility -------------------- #
     def _matches_token(self, candidate, token):
@@ -422,86 +880,193 @@ class CommandCompleter(Completer):
                 display_meta="ERROR",
             )
 
+    @staticmethod
+    def _error_messages(e):
+        # Get the traceback object from the exception
+        tb = e.__traceback__
+
+        # Iterate through the traceback frames to find the last one (where the error occurred)
+        last_frame = None
+        while tb:
+            last_frame = tb
+            tb = tb.tb_next
+
+        if not last_frame:
+            return None
+
+        function_name = last_frame.tb_frame.f_code.co_name
+        line_number = last_frame.tb_lineno
+        return [str(e), str(function_name), str(line_number), "PLEASE REPORT"]
+
     # -------------------- Main entry -------------------- #
+    def _begin(self, document):
+        text = document.text_before_cursor
+        self._lazy_menu = None
+
+        # Deletion, cursor movement, cd or an environment change invalidates every narrowed source
+        if not text.startswith(self._last_text):
+            self._narrowing.clear()
+        self._last_text = text
+        self._app = get_app_or_none()
+        self._narrowing_context = (
+            document.text_after_cursor,
+            self.input_handler.shell.working_dir,
+            environment.generation,
+        )
+
+    def _plan(self, text):
+        """
+        Choose the sources for text, in display order.
+        Returns (sources, keep), keep being an optional filter over the merged completions.
+        """
+        if ai_mode:
+            kind = "ai"
+        elif picker_mode:
+            kind = "picker"
+        elif not text.split() or text == "sudo ":
+            kind = "empty"
+        else:
+            kind = "line"
+
+        context = self._context(text, kind)
+        sources = self._schedule(context)
+        if kind != "line":
+            return sources, None
+
+        keep = None
+        if len(context.tokens) == 1 and not context.trailing_space:
+            keep = lambda c: not c.style == "class:arg"
+
+        if self.worker is not None and self.worker.alive:
+            sources = self._delegate(text, sources)
+        return sources, keep
+
+    def _delegate(self, text, sources):
+        """
+        Keep the fast sources local and hand the rest to the worker process as one source.
+        """
+        cwd = self.input_handler.shell.working_dir
+        budget = config.COMPLETION_SOURCE_BUDGET_MS / 1000 + _WORKER_MARGIN_SECONDS
+        local = [source for source in sources if source.fast]
+        if len(local) == len(sources):
+            return sources
+        # The worker drops its own slow sources at the budget; the margin covers the pipe
+        return local + [ScheduledSource("worker", lambda: self.worker.complete(text, cwd, budget), timed=False)]
+
     def get_completions(self, document, complete_event):
-        global ai_mode
+        global ai_mode, picker_mode
         try:
-
             text = document.text_before_cursor
-            tokens = text.split()
-            candidates = []
+
+            if not self._debounce(text, complete_event):
+                return
+
+            self._begin(document)
+            sources, keep = self._plan(text)
+            if not sources:
+                return
+            if sources[0].lazy:
+                # Pulled by the caller, so only what it consumes is ever built
+                seen = set()
+                for page in sources[0].pages(self._menu_page_size()):
+                    for c in self._dedupe(page, seen):
+                        yield self._offer(c)
+                return
+
+            candidates = self._collect(text, sources)
+
+            picker_mode = False
 
             # AI-only mode
             if ai_mode:
-                completions = self.complete_ai(text)
-                if len(completions) > 0:
-                    for c in completions:
-                        yield c
-                else:
-                    yield Completion(
-                        "NO RESULT",
-                        start_position=-len(text),
-                        style="class:completion-ai",
-                        display_meta="AI"
-                    )
                 ai_mode = False
-                return
+                if not candidates:
+                    candidates = [self._no_ai_result(text)]
 
-            if not tokens:
-                candidates.extend(self._complete_command(""))
-                for c in self._dedupe(candidates):
-                    yield c
-                return
+            for c in self._dedupe(self._rank(candidates)):
+                if keep is None or keep(c):
+                    yield self._offer(c)
 
-            tool_offset = tokens[0] == "sudo"
-            tool_index = 1 if tool_offset else 0
-            start_whitespace = " " if text[0] == " " else ""
-            end_whitespace = " " if text[-1] == " " else ""
+        except Exception as e:
+            yield from self._yield_autocomplete_errors(messages=self._error_messages(e))
+
+    async def get_completions_async(self, document, complete_event):
+        """
+        Streaming variant used by the prompt: fast sources are shown at once and
+        slower ones are added to the open menu as they finish. Closing the
+        generator (the document changed) cancels whatever is still pending.
+        """
+        global ai_mode, picker_mode
+        pending = {}
+        self._streaming += 1
+        try:
+            text = document.text_before_cursor
 
-            if text == "sudo ":
-                candidates.extend(self._complete_command("", no_sudo=True))
-                for c in self._dedupe(candidates):
-                    yield c
+            if not await self._debounce_async(text, complete_event):
                 return
 
-            last_token = tokens[-1]
-            candidates.extend(
-                self.complete_deterministic(
-                    last_token,
-                    text,
-                    token_index=len(tokens),
-                    tool_index=tool_index,
-                )
-            )
+            self._begin(document)
+            sources, keep = self._plan(text)
+            from_ai = ai_mode
+            ai_mode = False
+            picker_mode = False
 
-            if len(tokens) == 1 and not text.endswith(" "):
-                candidates.extend(
-                    self._complete_command(tokens[0])
-                )
-                for c in self._dedupe(candidates):
-                    if not c.style == "class:arg":
-                        yield c
-            else:
-                for c in self._dedupe(candidates):
+            if not sources:
+                return
+            if sources[0].lazy:
+                for c in self._first_pages(text, sources[0]):
                     yield c
-
-        except Exception as e:
-            # Get the traceback object from the exception
-            tb = e.__traceback__
-
-            # Iterate through the traceback frames to find the last one (where the error occurred)
-            last_frame = None
-            while tb:
-                last_frame = tb
-                tb = tb.tb_next
-
-            if last_frame:
-                filename = last_frame.tb_frame.f_code.co_filename
-                function_name = last_frame.tb_frame.f_code.co_name
-                line_number = last_frame.tb_lineno
-
-                messages = [str(e), str(function_name), str(line_number), "PLEASE REPORT"]
-                yield from self._yield_autocomplete_errors(messages=messages)
                 return
 
-            yield from self._yield_autocomplete_errors()
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + config.COMPLETION_SOURCE_BUDGET_MS / 1000
+            order = {source.name: index for index, source in enumerate(sources)}
+            for source in sources:
+                if not source.fast:
+                    pending[loop.run_in_executor(self._executor, source.run)] = source
+
+            seen = set()
+            emitted = False
+
+            fast = [c for source in sources if source.fast for c in source.run()]
+            for c in self._dedupe(self._rank(fast), seen):
+                if keep is None or keep(c):
+                    emitted = True
+                    yield self._offer(c)
+
+            while pending:
+                timeout = None
+                if any(source.timed for source in pending.values()):
+                    timeout = max(0.0, deadline - loop.time())
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if self._is_stale(text):
+                    return
+
+                arrived = []
+                for future in sorted(done, key=lambda f: order[pending[f].name]):
+                    pending.pop(future)
+                    arrived.extend(future.result())
+
+                for c in self._dedupe(self._rank(arrived), seen):
+                    if keep is None or keep(c):
+                        emitted = True
+                        yield self._offer(c)
+
+                if loop.time() >= deadline:
+                    for future, source in list(pending.items()):
+                        if source.timed:
+                            future.cancel()
+                            del pending[future]
+                            completion_stats.drop(source.name)
+
+            if from_ai and not emitted:
+                yield self._no_ai_result(text)
+
+        except Exception as e:
+            for c in self._yield_autocomplete_errors(messages=self._error_messages(e)):
+                yield c
+        finally:
+            self._streaming -= 1
+            for future in pending:
+                future.cancel()
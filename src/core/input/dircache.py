@@ -0,0 +1,341 @@
+import os
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Lock, Thread
+from typing import NamedTuple
+
+import config
+from core.utils import prefix_range
+from .fsguard import fs_guard
+
+
+class DirectoryListing:
+    """
+    Snapshot of one directory, taken with a single os.scandir pass.
+    """
+    __slots__ = ("path", "mtime_ns", "names", "dirs", "_folded")
+
+    def __init__(self, path, mtime_ns, entries):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.names = sorted(name for name, _ in entries)
+        self.dirs = frozenset(name for name, is_dir in entries if is_dir)
+        self._folded = None
+
+    def is_dir(self, name):
+        return name in self.dirs
+
+    def __contains__(self, name):
+        index = bisect_left(self.names, name)
+        return index < len(self.names) and self.names[index] == name
+
+    def _folded_index(self):
+        """
+        (lowercased names, names) sorted case-insensitively, built on first use.
+        """
+        if self._folded is None:
+            # names is sorted, so the stable sort breaks ties between cases consistently
+            names = sorted(self.names, key=str.lower)
+            self._folded = [name.lower() for name in names], names
+        return self._folded
+
+    def matching(self, prefix, ignore_case=False, limit=None):
+        """
+        Names starting with prefix, in sorted order and at most limit of them.
+        Costs a bisect plus the matches, however large the directory.
+        """
+        if ignore_case:
+            keys, names = self._folded_index()
+            prefix = prefix.lower()
+        else:
+            keys = names = self.names
+        start, end = prefix_range(keys, prefix)
+        if limit is not None:
+            end = min(end, start + limit)
+        return names[start:end]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class DirectoryCache:
+    """
+    LRU cache of directory listings, shared by the completer and the lexer.
+    An entry stays valid for as long as the directory's mtime does not change.
+
+    generation counts the changes the cache has seen (listings scanned or dropped,
+    commands run through touch()), so results derived from the filesystem can be
+    cached per generation without stat'ing anything.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or config.DIR_CACHE_SIZE
+        self.generation = 0
+        self._listings: OrderedDict[str, DirectoryListing] = OrderedDict()
+        # path -> (listing future, deadline) of the background scans in flight
+        self._filling: dict[str, tuple[Future, float]] = {}
+        self._lock = Lock()
+
+    def touch(self):
+        """
+        Note that the filesystem may have changed, e.g. because a command ran.
+        """
+        with self._lock:
+            self.generation += 1
+
+    def _cached(self, path):
+        """
+        (cached listing or None, current mtime) for an absolute path.
+        The mtime is None if path does not exist or is on a slow mount.
+        """
+        try:
+            stat = fs_guard.run(path, os.stat, path)
+        except OSError:
+            self.invalidate(path)
+            return None, None
+        if stat is None:
+            return None, None
+
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is not None and cached.mtime_ns == stat.st_mtime_ns:
+                self._listings.move_to_end(path)
+                return cached, stat.st_mtime_ns
+        return None, stat.st_mtime_ns
+
+    def listing(self, path, strict=False):
+        """
+        Return the listing of path, or None if it does not exist or is on a slow mount.
+        Paths that exist but cannot be listed return None, or raise OSError if strict.
+
+        An uncached directory is scanned in the background, and the caller waits for
+        it until FS_SCAN_TIMEOUT_MS after the scan started. A scan that takes longer
+        answers None, goes on filling the cache, and holds up nobody else: readdir can
+        hang on a mount whose stat still answers, while a large healthy directory only
+        needs more time than a probe, not to be marked slow.
+        """
+        path = os.path.abspath(path)
+        cached, mtime_ns = self._cached(path)
+        if cached is not None or mtime_ns is None:
+            return cached
+
+        future, deadline = self._fill(path)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            return None
+        except OSError:
+            if strict:
+                raise
+            return None
+
+    def matching(self, path, prefix, ignore_case=False, limit=None):
+        """
+        Return ([(name, is_dir)], complete) for the entries of path starting with prefix.
+
+        A cached listing answers with a bisect. Otherwise the directory is scanned
+        directly. With a limit, the scan on the caller's side stops as soon as more
+        than limit entries matched, or after PATH_STREAM_THRESHOLD entries, answers
+        with the matches found so far and leaves the full listing to a background
+        fill (see filling()), so a huge directory costs the first page a bounded
+        scan instead of a full listing.
+        complete is False when matches may be missing: the limit was hit, or the scan
+        stopped early or ran into the slow-mount timeout.
+        """
+        path = os.path.abspath(path)
+        cached, mtime_ns = self._cached(path)
+        if cached is not None:
+            names = cached.matching(prefix, ignore_case, None if limit is None else limit + 1)
+            return self._limited([(name, cached.is_dir(name)) for name in names], limit, True)
+        if mtime_ns is None:
+            return [], True
+
+        result = fs_guard.run(path, self._stream, path, mtime_ns, prefix, ignore_case, limit)
+        if result is None:
+            return [], False
+        return result
+
+    @staticmethod
+    def _limited(matches, limit, complete):
+        if limit is not None and len(matches) > limit:
+            return matches[:limit], False
+        return matches, complete
+
+    def _stream(self, path, mtime_ns, prefix, ignore_case, limit):
+        folded = prefix.lower() if ignore_case else prefix
+        threshold = config.PATH_STREAM_THRESHOLD
+        entries = []
+        matches = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name, is_dir))
+
+                    name = entry.name.lower() if ignore_case else entry.name
+                    if name.startswith(folded):
+                        matches.append((entry.name, is_dir))
+                    if limit is not None and (len(matches) > limit or len(entries) >= threshold):
+                        break
+                else:
+                    # Scanned it all: cache the listing and answer from it, sorted
+                    listing = self._store(path, mtime_ns, entries)
+                    names = listing.matching(prefix, ignore_case, None if limit is None else limit + 1)
+                    return self._limited([(name, listing.is_dir(name)) for name in names], limit, True)
+        except OSError:
+            self.invalidate(path)
+            return [], True
+
+        self.prefetch(path)
+        matches.sort(key=lambda match: (match[0].lower(), match[0]) if ignore_case else match[0])
+        return matches[:limit], False
+
+    def _scan(self, path, mtime_ns):
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name, is_dir))
+        except OSError:
+            self.invalidate(path)
+            raise
+        return self._store(path, mtime_ns, entries)
+
+    def _store(self, path, mtime_ns, entries):
+        listing = DirectoryListing(path, mtime_ns, entries)
+        with self._lock:
+            self.generation += 1
+            self._listings[path] = listing
+            self._listings.move_to_end(path)
+            while len(self._listings) > self.max_size:
+                self._listings.popitem(last=False)
+        return listing
+
+    def prefetch(self, path):
+        """
+        Warm the cache for path without blocking the caller.
+        """
+        self._fill(os.path.abspath(path))
+
+    def filling(self, path):
+        """
+        The future of the background scan of path in flight, or None.
+        """
+        with self._lock:
+            filling = self._filling.get(os.path.abspath(path))
+        return filling[0] if filling is not None else None
+
+    def _fill(self, path):
+        """
+        Scan path in a background thread, or join the scan already in flight.
+        Returns (future of the listing, deadline for waiting on it); the future
+        holds None on a slow mount and the OSError if path cannot be listed.
+        """
+        with self._lock:
+            filling = self._filling.get(path)
+            if filling is not None:
+                return filling
+            future = Future()
+            filling = self._filling[path] = (future, time.monotonic() + config.FS_SCAN_TIMEOUT_MS / 1000)
+
+        def fill():
+            # Already off the prompt thread: scan directly rather than through the
+            # guard, whose timeout would mark a large but healthy directory as slow
+            try:
+                listing = None
+                if not fs_guard.is_slow(path):
+                    listing = self._scan(path, os.stat(path).st_mtime_ns)
+                    listing._folded_index()
+                future.set_result(listing)
+            except OSError as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._filling[path]
+
+        Thread(target=fill, daemon=True).start()
+        return filling
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+                self.generation += 1
+            elif self._listings.pop(os.path.abspath(path), None) is not None:
+                self.generation += 1
+
+
+dir_cache = DirectoryCache()
+
+
+class PathStatus(NamedTuple):
+    exists: bool
+    # exists, or is the start of an entry's name in its directory
+    partial: bool
+    is_dir: bool
+    # the parent exists but cannot be listed (not a directory, no permission)
+    error: bool = False
+
+
+MISSING = PathStatus(False, False, False)
+_UNLISTABLE = PathStatus(False, False, False, True)
+_DIRECTORY = PathStatus(True, True, True)
+
+
+class PathResolver:
+    """
+    Answers "exists / is a prefix of something / is a directory" for many paths at
+    once from the directory cache, so highlighting and path completion share the same
+    listings. Each distinct parent directory is looked up once per batch, and every
+    path in it is answered with a bisect.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def resolve(self, paths):
+        """
+        PathStatus for each absolute path, in order. A trailing separator asks whether
+        the path is a listable directory.
+        """
+        by_parent: dict[str, list[int]] = {}
+        split = []
+        for index, path in enumerate(paths):
+            parent, name = os.path.split(path)
+            split.append(name)
+            by_parent.setdefault(parent, []).append(index)
+
+        statuses = [MISSING] * len(paths)
+        for parent, indexes in by_parent.items():
+            try:
+                listing = self.cache.listing(parent, strict=True)
+            except OSError:
+                for index in indexes:
+                    statuses[index] = _UNLISTABLE
+                continue
+            if listing is None:
+                continue
+
+            for index in indexes:
+                name = split[index]
+                if name in ("", ".", ".."):
+                    statuses[index] = _DIRECTORY
+                elif name in listing:
+                    is_dir = listing.is_dir(name)
+                    statuses[index] = PathStatus(True, True, is_dir)
+                elif listing.matching(name, limit=1):
+                    statuses[index] = PathStatus(False, True, False)
+        return statuses
+
+
+path_resolver = PathResolver(dir_cache)
+
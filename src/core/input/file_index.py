@@ -0,0 +1,445 @@
+import operator
+import os
+import re
+from bisect import bisect_right
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from threading import Lock, Thread
+
+import config
+
+# Possessive quantifiers arrived in Python 3.11; older interpreters fall back to greedy.
+_POSSESSIVE = "+" if sys.version_info >= (3, 11) else ""
+
+
+class GitIgnore:
+    """
+    The subset of .gitignore needed to prune an index: globs, '**', '!' negation,
+    leading or inner '/' anchoring and trailing '/' for directories.
+    """
+
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            regex = self._translate(line)
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            self.rules.append((re.compile(regex + r"\Z"), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return cls(f.readlines())
+        except OSError:
+            return None
+
+    @staticmethod
+    def _translate(pattern):
+        out = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                out.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                out.append("[^/]")
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+                end = pattern.index("]", i + 1)
+                out.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+                i = end + 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        return "".join(out)
+
+    def match(self, rel_path, is_dir):
+        """
+        True if ignored, False if re-included, None if no rule applies.
+        """
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                result = not negate
+        return result
+
+
+def find_project_root(path):
+    """
+    Nearest ancestor of path holding a .git entry, or path itself.
+    """
+    path = os.path.abspath(path)
+    current = path
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return path
+        current = parent
+
+
+class ProjectFileIndex:
+    """
+    Background index of every file under a project root, for fuzzy path search.
+    Directories are scanned level by level on a thread pool; a refresh only
+    rescans directories whose mtime changed.
+    """
+    SKIP_DIRS = {".git"}
+
+    def __init__(self, root):
+        self.root = root
+        self.ready = False
+        self.refreshed = 0.0
+        # rel dir -> (mtime_ns, [file names], [subdir names], GitIgnore | None)
+        self._dirs: dict[str, tuple] = {}
+        self._paths: list[str] = []
+        # Lowercased paths and file names, "\n"-joined, with the offset of each entry
+        self._blob = ""
+        self._starts: list[int] = []
+        self._names = ""
+        self._name_starts: list[int] = []
+        self._chars: set[str] = set()
+        self._contains: dict[str, int] = {}
+        self._count = 0
+        self._lock = Lock()
+        self._building = False
+
+    # -------------------- Scanning -------------------- #
+    def _ignores(self, rel_dir):
+        """
+        GitIgnore rule sets that apply inside rel_dir, outermost first, with their base dir.
+        """
+        chain = []
+        parts = rel_dir.split("/") if rel_dir else []
+        for depth in range(len(parts) + 1):
+            base = "/".join(parts[:depth])
+            entry = self._dirs.get(base)
+            if entry and entry[3] is not None:
+                chain.append((base, entry[3]))
+        return chain
+
+    @staticmethod
+    def _ignored(chain, rel_path, is_dir):
+        ignored = False
+        for base, ignore in chain:
+            result = ignore.match(rel_path[len(base) + 1:] if base else rel_path, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def _scan_dir(self, rel_dir):
+        full = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        files, dirs = [], []
+        try:
+            mtime_ns = os.stat(full).st_mtime_ns
+            with os.scandir(full) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.SKIP_DIRS:
+                                dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return rel_dir, None
+        ignore = GitIgnore.from_file(os.path.join(full, ".gitignore")) if ".gitignore" in files else None
+        return rel_dir, (mtime_ns, files, dirs, ignore)
+
+    def _scan_tree(self, rel_dirs, executor):
+        """
+        Scan rel_dirs and everything below them, pruning ignored entries.
+        """
+        frontier = list(rel_dirs)
+        while frontier and self._count_files() < config.FILE_INDEX_MAX_FILES:
+            next_frontier = []
+            for rel_dir, entry in executor.map(self._scan_dir, frontier):
+                if entry is None:
+                    self._dirs.pop(rel_dir, None)
+                    continue
+                prefix = rel_dir + "/" if rel_dir else ""
+                next_frontier.extend(prefix + d for d in self._store(rel_dir, entry))
+            frontier = next_frontier
+
+    def _store(self, rel_dir, entry):
+        """
+        Index a scanned directory's entries minus the ignored ones. Returns its kept
+        subdirectory names.
+        """
+        mtime_ns, files, dirs, ignore = entry
+        # Store first so this directory's own .gitignore applies to its entries
+        self._dirs[rel_dir] = entry
+        chain = self._ignores(rel_dir)
+        prefix = rel_dir + "/" if rel_dir else ""
+        files = [f for f in files if not self._ignored(chain, prefix + f, False)]
+        dirs = [d for d in dirs if not self._ignored(chain, prefix + d, True)]
+        self._dirs[rel_dir] = (mtime_ns, files, dirs, ignore)
+        return dirs
+
+    def _count_files(self):
+        return sum(len(entry[1]) for entry in self._dirs.values())
+
+    def _drop_tree(self, rel_dir):
+        prefix = rel_dir + "/"
+        for key in [k for k in self._dirs if k == rel_dir or k.startswith(prefix)]:
+            del self._dirs[key]
+
+    def _rebuild_blob(self):
+        paths = []
+        for rel_dir, (_, files, _, _) in self._dirs.items():
+            prefix = rel_dir + "/" if rel_dir else ""
+            paths.extend(prefix + f for f in files)
+        self._set_paths(paths)
+
+    def _set_paths(self, paths):
+        # In rank order within a search tier, so a scan can stop after enough matches
+        paths = sorted(paths, key=lambda path: (len(path), path))
+        lowered = [path.lower() for path in paths]
+        # Every entry is preceded by a newline so search patterns can anchor on it
+        blob, starts = self._join(lowered)
+        names, name_starts = self._join([path.rsplit("/", 1)[-1] for path in lowered])
+        chars = set(blob)
+        chars.discard("\n")
+        # Per ASCII character, one byte per entry: 1 if the entry contains it. ANDed
+        # as big ints they leave the only entries worth a subsequence match.
+        contains = {
+            ch: int.from_bytes(bytes(map(operator.contains, lowered, repeat(ch))), "little")
+            for ch in chars if ch.isascii()
+        }
+        with self._lock:
+            self._paths = paths
+            self._blob, self._starts = blob, starts
+            self._names, self._name_starts = names, name_starts
+            self._chars, self._contains = chars, contains
+            self._count = len(paths)
+
+    @staticmethod
+    def _join(items):
+        """
+        ("\n" + item for each item, as one string; offset of each item's newline).
+        """
+        starts = []
+        offset = 0
+        for item in items:
+            starts.append(offset)
+            offset += len(item) + 1
+        return "".join("\n" + item for item in items), starts
+
+    def build(self):
+        with ThreadPoolExecutor(max_workers=config.FILE_INDEX_WORKERS) as executor:
+            self._dirs.clear()
+            self._scan_tree([""], executor)
+        self._rebuild_blob()
+        self.ready = True
+        self.refreshed = time.monotonic()
+
+    def refresh(self):
+        """
+        Rescan the entries of directories whose mtime changed since they were indexed.
+        Their subdirectories are checked by their own mtime: only new ones are scanned
+        as a whole and removed ones dropped. A changed .gitignore rescans the subtree
+        it applies to.
+        """
+        changed = []
+        for rel_dir, entry in list(self._dirs.items()):
+            full = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            try:
+                if os.stat(full).st_mtime_ns != entry[0]:
+                    changed.append(rel_dir)
+            except OSError:
+                changed.append(rel_dir)
+
+        if changed:
+            with ThreadPoolExecutor(max_workers=config.FILE_INDEX_WORKERS) as executor:
+                new_dirs = []
+                # Parents first, so a directory dropped with its parent is skipped
+                changed.sort(key=lambda rel_dir: rel_dir.count("/") + bool(rel_dir))
+                for rel_dir, entry in executor.map(self._scan_dir, changed):
+                    new_dirs.extend(self._update(rel_dir, entry))
+                self._scan_tree(new_dirs, executor)
+            self._rebuild_blob()
+        self.refreshed = time.monotonic()
+
+    def _update(self, rel_dir, entry):
+        """
+        Replace the indexed entries of rel_dir with a rescan of it. Returns the
+        directories that still need a full scan.
+        """
+        old = self._dirs.get(rel_dir)
+        if old is None:
+            return []  # dropped along with its parent
+        if entry is None:
+            self._drop_tree(rel_dir)
+            return []
+        if self._rules(entry[3]) != self._rules(old[3]):
+            self._drop_tree(rel_dir)
+            return [rel_dir]
+
+        prefix = rel_dir + "/" if rel_dir else ""
+        dirs = self._store(rel_dir, entry)
+        for name in set(old[2]) - set(dirs):
+            self._drop_tree(prefix + name)
+        return [prefix + name for name in dirs if prefix + name not in self._dirs]
+
+    @staticmethod
+    def _rules(ignore):
+        return ignore.rules if ignore is not None else None
+
+    def ensure_fresh(self):
+        """
+        Build or refresh in the background when due. Never blocks.
+        """
+        if self._building:
+            return
+        due = not self.ready or time.monotonic() - self.refreshed > config.FILE_INDEX_REFRESH_SECONDS
+        if not due:
+            return
+
+        def run():
+            try:
+                if self.ready:
+                    self.refresh()
+                else:
+                    self.build()
+            finally:
+                self._building = False
+
+        self._building = True
+        Thread(target=run, daemon=True).start()
+
+    # -------------------- Searching -------------------- #
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _pattern(query):
+        # '[^\nx]*+x' per character finds each character's first occurrence; the
+        # possessive quantifier stops a failed line from backtracking through every
+        # earlier gap. The leading literal newline lets the regex engine jump from line
+        # to line and try each path exactly once.
+        parts = ["\n"]
+        for ch in query:
+            escaped = re.escape(ch)
+            parts.append(f"[^\\n{escaped}]*{_POSSESSIVE}{escaped}")
+        return re.compile("".join(parts))
+
+    @staticmethod
+    def _entries(starts, positions):
+        """
+        Index of the entry holding each position, once per entry.
+        """
+        last = -1
+        for pos in positions:
+            index = bisect_right(starts, pos) - 1
+            if index != last:
+                last = index
+                yield index
+
+    @staticmethod
+    def _find_all(blob, needle):
+        pos = blob.find(needle)
+        while pos != -1:
+            yield pos
+            pos = blob.find(needle, pos + 1)
+
+    def _subsequence_matches(self, query, blob, starts, contains, count):
+        """
+        Indexes of entries containing query as a subsequence. Only entries holding
+        every ASCII character of query are tried.
+        """
+        pattern = self._pattern(query)
+        masks = [contains[ch] for ch in set(query) if ch in contains]
+        if not masks:
+            candidates = range(count)
+        else:
+            mask = masks[0]
+            for other in masks[1:]:
+                mask &= other
+            candidates = (m.start() for m in re.finditer(b"\x01", mask.to_bytes(count, "little")))
+        for index in candidates:
+            if pattern.match(blob, starts[index]):
+                yield index
+
+    def search(self, query, limit=50):
+        """
+        Fuzzy search over the index, best matches first. Matches are ranked in tiers:
+        query starting the file name, inside the file name, inside the path, then only
+        as a subsequence of the path; shorter paths first within a tier.
+
+        Entries are stored in that within-tier order, so each tier is a C-level scan
+        that stops once limit matches were found, and a lower tier is only scanned if
+        the ones above fell short. Subsequence matching is only tried on entries that
+        contain every character of query.
+        """
+        with self._lock:
+            paths = self._paths
+            blob, starts = self._blob, self._starts
+            names, name_starts = self._names, self._name_starts
+            chars, contains = self._chars, self._contains
+        if not paths:
+            return []
+        if not query:
+            return paths[:limit]
+
+        query = query.lower()
+        tiers = []
+        if "/" not in query:
+            tiers.append(self._entries(name_starts, self._find_all(names, "\n" + query)))
+            tiers.append(self._entries(name_starts, self._find_all(names, query)))
+        tiers.append(self._entries(starts, self._find_all(blob, query)))
+        if set(query) <= chars:
+            tiers.append(self._subsequence_matches(query, blob, starts, contains, len(paths)))
+
+        found = {}  # path index -> None, in rank order
+        for tier in tiers:
+            for index in tier:
+                found.setdefault(index)
+                if len(found) >= limit:
+                    return [paths[index] for index in found]
+        return [paths[index] for index in found]
+
+
+_indexes: OrderedDict[str, ProjectFileIndex] = OrderedDict()
+_indexes_lock = Lock()
+
+
+def project_index(cwd, max_projects=4):
+    """
+    Shared index for the project containing cwd, started in the background if needed.
+    """
+    root = find_project_root(cwd)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = ProjectFileIndex(root)
+        _indexes.move_to_end(root)
+        while len(_indexes) > max_projects:
+            _indexes.popitem(last=False)
+    index.ensure_fresh()
+    return index
@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+
+import config
+
+
+class FilesystemGuard:
+    """
+    Runs filesystem probes in worker threads so a hung mount (stale NFS, /mnt/c, ...)
+    cannot block the prompt. A directory whose probe times out is remembered as slow
+    and skipped until its retry time; the next probe after that is a trial, and path
+    features come back as soon as a trial finishes in time.
+    """
+
+    def __init__(self, workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fsprobe")
+        self._slow: dict[str, tuple[float, float]] = {}  # directory -> (retry_at, backoff)
+        self._pending = {}  # directory -> probe still stuck on it
+        self._lock = Lock()
+
+    # -------------------- Slow directories -------------------- #
+    def _slow_key(self, directory):
+        """
+        The remembered slow directory containing directory, if any.
+        """
+        while True:
+            if directory in self._slow:
+                return directory
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    def is_slow(self, path):
+        """
+        True while path lies in a directory that is waiting out its backoff
+        or still has a stuck probe.
+        """
+        if not self._slow:
+            return False
+        with self._lock:
+            key = self._slow_key(os.path.abspath(path))
+            if key is None:
+                return False
+            retry_at, _ = self._slow[key]
+            return key in self._pending or time.monotonic() < retry_at
+
+    def _mark_slow(self, directory, future):
+        with self._lock:
+            _, backoff = self._slow.get(directory, (0.0, 0.0))
+            backoff = min(max(backoff * 2, config.SLOW_PATH_RETRY_SECONDS), config.SLOW_PATH_RETRY_MAX_SECONDS)
+            self._slow[directory] = (time.monotonic() + backoff, backoff)
+            self._pending[directory] = future
+        future.add_done_callback(lambda _: self._unstick(directory, future))
+
+    def _unstick(self, directory, future):
+        with self._lock:
+            if self._pending.get(directory) is future:
+                del self._pending[directory]
+
+    def _mark_fast(self, directory):
+        if not self._slow:
+            return
+        with self._lock:
+            key = self._slow_key(directory)
+            if key is not None:
+                del self._slow[key]
+
+    def reset(self):
+        with self._lock:
+            self._slow.clear()
+            self._pending.clear()
+
+    # -------------------- Probes -------------------- #
+    def run(self, directory, func, *args, default=None):
+        """
+        Call func(*args) in a worker on behalf of directory.
+        Returns default if the directory is known to be slow or the call times out;
+        exceptions raised by func propagate.
+        """
+        directory = os.path.abspath(directory)
+        if self.is_slow(directory):
+            return default
+
+        future = self._executor.submit(func, *args)
+        try:
+            result = future.result(timeout=config.FS_PROBE_TIMEOUT_MS / 1000)
+        except FutureTimeoutError:
+            # A probe that never started says nothing about the directory
+            if not future.cancel():
+                self._mark_slow(directory, future)
+            return default
+
+        self._mark_fast(directory)
+        return result
+
+    def exists(self, path, default=False):
+        # path itself is probed unnormalized: a trailing slash must still require a directory
+        return self.run(os.path.dirname(os.path.abspath(path)), os.path.exists, path, default=default)
+
+    def isdir(self, path, default=False):
+        return self.run(path, os.path.isdir, path, default=default)
+
+
+fs_guard = FilesystemGuard()
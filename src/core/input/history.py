@@ -1,13 +1,224 @@
 import json
 import os
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from threading import Event, Lock, Thread
 
 from prompt_toolkit.history import FileHistory
 
 from config import IGNORE_SPACE
+from .ranking import FrecencyRanker
 
 
-class ShellFileHistory(FileHistory):
+class HistoryTokenIndex:
+    """
+    Maps (previous token, position) to the tokens that followed it in history.
+    Each bucket keeps at most MAX_BUCKET candidates, most recent last, so a
+    lookup costs the same no matter how long the history is.
+    """
+    MAX_BUCKET = 256
+
+    def __init__(self):
+        self._buckets: dict[tuple[str, int], OrderedDict[str, int]] = {}
+        self._lock = Lock()
+
+    def add(self, entry):
+        words = entry.split()
+        with self._lock:
+            for position in range(1, len(words)):
+                bucket = self._buckets.setdefault((words[position - 1], position), OrderedDict())
+                candidate = words[position]
+                bucket[candidate] = bucket.pop(candidate, 0) + 1
+                if len(bucket) > self.MAX_BUCKET:
+                    bucket.popitem(last=False)
+
+    def rebuild(self, entries):
+        """
+        Reindex from scratch. entries must be ordered oldest first.
+        """
+        with self._lock:
+            self._buckets.clear()
+        for entry in entries:
+            self.add(entry)
+
+    def candidates(self, previous, position):
+        """
+        Return [(candidate, count)] that followed previous at position, most recent first.
+        """
+        with self._lock:
+            bucket = self._buckets.get((previous, position))
+            if not bucket:
+                return []
+            return list(reversed(bucket.items()))
+
+
+class _PrefixNode:
+    __slots__ = ("label", "children", "top")
+
+    def __init__(self, label=""):
+        self.label = label
+        self.children: dict[str, _PrefixNode] = {}
+        self.top: list[str] = []
+
+
+class HistoryPrefixIndex:
+    """
+    Radix trie over deduplicated history entries for inline suggestions.
+    Every node keeps the TOP_K best-scoring entries below it, so a lookup walks the
+    prefix once and reranks TOP_K candidates for the cwd, however long the history is.
+
+    Entries are scored by frecency with an uncapped FrecencyRanker, as every entry in
+    the trie must keep its score. Scores only ever grow, so offering an entry to the
+    nodes on its own path whenever it is used keeps every node's top list exact.
+    """
+    TOP_K = 8
+    # Entries from before history metadata existed have no timestamp and count as ancient
+    UNKNOWN_TS = 1
+
+    def __init__(self):
+        self._root = _PrefixNode()
+        self._ranker = FrecencyRanker(None, capped=False)
+        self._lock = Lock()
+        # Entries added while rebuild() runs, replayed onto the rebuilt trie
+        self._pending = None
+        self.ready = Event()
+        self.ready.set()
+
+    def __len__(self):
+        return len(self._ranker.scores)
+
+    def rebuild(self, items):
+        """
+        Replace the contents with items [(entry, cwd, ts)], oldest first.
+        Suggestions come from the old contents until the new trie is complete.
+        """
+        fresh = HistoryPrefixIndex()
+        with self._lock:
+            self._pending = []
+        try:
+            for entry, cwd, ts in items:
+                fresh.add(entry, cwd, ts)
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._root, self._ranker = fresh._root, fresh._ranker
+            for entry, cwd, ts in pending:
+                self.add(entry, cwd, ts)
+        finally:
+            # A failed rebuild keeps the old contents, but must not keep queueing entries
+            with self._lock:
+                self._pending = None
+            self.ready.set()
+
+    def rebuild_in_background(self, items):
+        """
+        rebuild() on a daemon thread; a history of a million entries takes seconds to index.
+        """
+        self.ready.clear()
+        Thread(target=self.rebuild, args=(items,), daemon=True).start()
+
+    def add(self, entry, cwd=None, ts=None):
+        if not entry.strip() or "\n" in entry:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((entry, cwd, ts))
+            self._ranker.record(entry, cwd=cwd, ts=ts or self.UNKNOWN_TS)
+            node = self._root
+            i = 0
+            while i < len(entry):
+                child = node.children.get(entry[i])
+                if child is None:
+                    child = node.children[entry[i]] = _PrefixNode(entry[i:])
+                    self._offer(child, entry)
+                    return
+
+                label = child.label
+                if entry.startswith(label, i):
+                    common = len(label)
+                else:
+                    common = 1
+                    limit = min(len(label), len(entry) - i)
+                    while common < limit and label[common] == entry[i + common]:
+                        common += 1
+                if common < len(label):
+                    # Split the edge; everything below child is below the new node too
+                    middle = _PrefixNode(label[:common])
+                    middle.top = list(child.top)
+                    child.label = label[common:]
+                    middle.children[child.label[0]] = child
+                    node.children[entry[i]] = child = middle
+
+                self._offer(child, entry)
+                node = child
+                i += common
+
+    def _offer(self, node, entry):
+        scores = self._ranker.scores
+        score = lambda e: scores.get(e, float("-inf"))
+        top = node.top
+        if not top or score(entry) >= score(top[0]):
+            # The common case: entries arrive in time order, so the newest use is the best
+            if top and top[0] == entry:
+                return
+            if entry in top:
+                top.remove(entry)
+            top.insert(0, entry)
+            del top[self.TOP_K:]
+            return
+        if entry not in top:
+            if len(top) >= self.TOP_K:
+                if score(entry) <= score(top[-1]):
+                    return
+                top.pop()
+            top.append(entry)
+        top.sort(key=score, reverse=True)
+
+    def suggest(self, prefix, cwd=None):
+        """
+        The best entry that extends prefix, preferring ones used in cwd, or None.
+        """
+        if not prefix:
+            return None
+        with self._lock:
+            node = self._root
+            i = 0
+            while i < len(prefix):
+                node = node.children.get(prefix[i])
+                if node is None:
+                    return None
+                label = node.label
+                n = min(len(label), len(prefix) - i)
+                if label[:n] != prefix[i:i + n]:
+                    return None
+                i += n
+
+            ranker = self._ranker
+            scored = [(ranker.score(entry, cwd), entry) for entry in node.top if entry != prefix]
+            scored = [(score, entry) for score, entry in scored if score is not None]
+            if not scored:
+                return None
+            return max(scored, key=lambda item: item[0])[1]
+
+
+class IndexedFileHistory(FileHistory):
+    """
+    FileHistory that keeps a HistoryTokenIndex in step with its entries.
+    """
+
+    def __init__(self, filename):
+        self.index = HistoryTokenIndex()
+        super().__init__(filename)
+
+    def load_history_strings(self):
+        strings = list(super().load_history_strings())
+        self.index.rebuild(reversed(strings))
+        return strings
+
+    def append_string(self, string):
+        self.index.add(string)
+        super().append_string(string)
+
+
+class ShellFileHistory(IndexedFileHistory):
     """
     Stores command history in standard prompt_toolkit format.
     Metadata stored separately.
@@ -18,6 +229,7 @@ class ShellFileHistory(FileHistory):
         self.shell = shell
         self.meta_filename = filename + ".meta"
         self.cmd_meta: dict[str, list[dict]] = defaultdict(list)
+        self.prefix_index = HistoryPrefixIndex()
         self.rebuild_cmd_meta()
         # print(self.cmd_meta)
 
@@ -60,20 +272,33 @@ class ShellFileHistory(FileHistory):
             self.cmd_meta[last_cmd][-1]['exit_codes'] = value
 
     def rebuild_cmd_meta(self):
+        """
+        Rebuild cmd_meta and the prefix index from the history and metadata files.
+        """
         self.cmd_meta.clear()
-        if not os.path.exists(self.filename) or not os.path.exists(self.meta_filename):
+        if not os.path.exists(self.filename):
+            self.prefix_index.rebuild([])
             return
 
         try:
-            with open(self.filename, "r", encoding="utf-8") as f_cmd, \
-                    open(self.meta_filename, "r", encoding="utf-8") as f_meta:
-                for line_cmd, line_meta in zip(f_cmd, f_meta):
-                    cmd = line_cmd.rstrip("\n").lstrip("+")
-                    try:
-                        meta = json.loads(line_meta)
-                    except Exception:
-                        meta = {}
-                    self.cmd_meta[cmd].append(meta)
+            # Entries span several lines of the history file, so pair parsed entries
+            # with metadata lines. Metadata only exists for recent entries: align the tails.
+            entries = list(reversed(list(FileHistory.load_history_strings(self))))
+            meta_lines = []
+            if os.path.exists(self.meta_filename):
+                with open(self.meta_filename, "r", encoding="utf-8") as f_meta:
+                    meta_lines = f_meta.readlines()
+
+            count = min(len(entries), len(meta_lines))
+            prefix_items = [(cmd, None, None) for cmd in entries[:len(entries) - count]]
+            for cmd, line_meta in zip(entries[len(entries) - count:], meta_lines[len(meta_lines) - count:]):
+                try:
+                    meta = json.loads(line_meta)
+                except Exception:
+                    meta = {}
+                self.cmd_meta[cmd].append(meta)
+                prefix_items.append((cmd, meta.get("cwd"), meta.get("ts")))
+            self.prefix_index.rebuild_in_background(prefix_items)
         except Exception:
             pass
 
@@ -92,4 +317,5 @@ class ShellFileHistory(FileHistory):
 
         # Update in-memory
         self.cmd_meta[text].append(meta)
+        self.prefix_index.add(text, cwd=cwd, ts=meta["ts"])
         super().append_string(text)
@@ -1,179 +1,334 @@
 import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
 
+from prompt_toolkit.application import get_app_or_none
 from prompt_toolkit.lexers import Lexer
 
+import config
 from config import COMMAND_LINKING_SYMBOLS
+from core.environment import environment
+from .dircache import MISSING, dir_cache, path_resolver
+from .stats import completion_stats
+
+# $NAME or ${NAME}; special parameters ($?, $1, $$) and $(...) do not match
+_ENV_VAR = re.compile(r"\$\{?([A-Za-z_][A-Za-z0-9_]*)")
+_CACHE_SIZE = 512
+_SEGMENT_CACHE_SIZE = 4096
+
+
+class _Segment:
+    """
+    Tokens of one linker-separated segment. base holds None for words whose style
+    depends on the filesystem, tokens the styles from the last statuses resolved for
+    paths, along with the generations and time they were resolved at.
+    """
+    __slots__ = ("base", "words", "paths", "tokens", "statuses", "generation", "env_generation", "checked",
+                 "document")
+
+    def __init__(self, base, words):
+        self.base = base
+        self.words = words
+        self.paths = [full_path for _, _, full_path in words if full_path is not None]
+        self.tokens = base
+        self.statuses = None
+        self.generation = None
+        self.env_generation = None
+        self.checked = 0.0
+        self.document = None
 
 
 class ShellLexer(Lexer):
-    def __init__(self, shell):
+    """
+    Highlights commands, paths, variables and linkers.
+
+    prompt_toolkit asks for every line on every render, ten times a second while
+    idle (refresh_interval). Tokens are cached per (line, cwd, filesystem generation,
+    environment generation) for up to HIGHLIGHT_CACHE_SECONDS, so a render only
+    re-stats paths when something may have changed. Below that, segments between
+    linkers are cached by text, so editing a long line re-lexes only what changed.
+
+    With async_validation, paths are resolved by a background worker instead: a
+    render never waits on the filesystem, new words are styled as if their paths did
+    not exist until the answers arrive, and the app is invalidated to redraw them.
+    """
+
+    def __init__(self, shell, async_validation=False):
         self.shell = shell
+        self.async_validation = async_validation
+        self._app = None
+        self._pending: set[_Segment] = set()
+        self._validating = False
+        self._lock = Lock()
+        self._cache: OrderedDict[tuple, tuple[float, list, int]] = OrderedDict()
+        self._segments: OrderedDict[tuple, _Segment] = OrderedDict()
+        self._links: dict[str, _Segment] = {}
+        self._document = 0  # counts the documents lexed, to pin what the current one uses
+
+    def _evict(self, cache, size, document_of):
+        """
+        Drop least recently used entries beyond size, but never one the current document
+        uses: a document larger than the cache would otherwise evict its own lines
+        while rendering and re-lex all of them after every edit.
+        """
+        while len(cache) > size and document_of(next(iter(cache.values()))) != self._document:
+            cache.popitem(last=False)
 
     def lex_document(self, document):
-        text = document.text
         cwd = os.path.expanduser(self.shell.working_dir)
+        self._document += 1
+        document_id = self._document
+        # Captured here: the validation worker runs outside the app's context
+        self._app = get_app_or_none()
 
-        def split_by_linkers(line: str):
-            parts = []
-            buf = ""
-            i = 0
-            in_quotes = False
-            quote_char = None
-            link_symbols = sorted(COMMAND_LINKING_SYMBOLS, key=len, reverse=True)
+        def get_line(lineno):
+            line = document.lines[lineno]
+            key = (line, cwd, dir_cache.generation, environment.generation)
+            now = time.monotonic()
+            cached = self._cache.get(key)
+            if cached is not None and now - cached[0] < config.HIGHLIGHT_CACHE_SECONDS:
+                self._cache[key] = (cached[0], cached[1], document_id)
+                self._cache.move_to_end(key)
+                completion_stats.cache_hit("lexer")
+                return list(cached[1])
+            completion_stats.cache_miss("lexer")
 
-            while i < len(line):
-                ch = line[i]
+            start = time.perf_counter()
+            tokens, final = self._lex_line(line, cwd)
+            completion_stats.record("lexer", time.perf_counter() - start, len(tokens))
+            if not final:
+                return tokens  # provisional; lexed again once the worker has answered
 
-                if ch == "\\" and in_quotes and quote_char == '"' and i + 1 < len(line):
-                    buf += line[i:i + 2]
-                    i += 2
-                    continue
+            # Stored under the generation after lexing: listings scanned for this line
+            # move it on, and the next render should still hit
+            key = (line, cwd, dir_cache.generation, environment.generation)
+            self._cache[key] = (now, tokens, document_id)
+            self._cache.move_to_end(key)
+            self._evict(self._cache, _CACHE_SIZE, lambda entry: entry[2])
+            return list(tokens)
 
-                if ch in ("'", '"'):
-                    if not in_quotes:
-                        in_quotes = True
-                        quote_char = ch
-                    elif ch == quote_char:
-                        in_quotes = False
-                        quote_char = None
-                    buf += ch
-                    i += 1
-                    continue
+        return get_line
+
+    def _lex_line(self, line, cwd):
+        """
+        Tokenize line segment by segment. Segments seen before reuse their tokens, so
+        an edit re-tokenizes only the segments it touched. Segments that are new, or
+        may be stale because the filesystem generation moved on or HIGHLIGHT_CACHE_SECONDS
+        passed, have their paths answered by one path_resolver batch for the whole line
+        and are reclassified only if an answer changed.
 
-                matched = False
+        Returns (tokens, final). tokens are provisional (final is False) while the
+        validation worker still has segments of the line to answer.
+        """
+        now = time.monotonic()
+        generation = dir_cache.generation
+        parts = []
+        stale = []
+        for kind, value in split_by_linkers(line):
+            if kind == "link":
+                link = self._links.get(value)
+                if link is None:
+                    link = self._links[value] = _Segment([("class:link", value.strip())], [])
+                parts.append(link)
+                continue
 
-                for sym in link_symbols:
-                    if not in_quotes and line.startswith(sym, i):
-                        if buf:
-                            parts.append(("segment", buf))
-                        parts.append(("link", sym))
-                        buf = ""
-                        i += len(sym)
-                        matched = True
-                        break
+            key = (value, cwd)
+            segment = self._segments.get(key)
+            if segment is None or segment.env_generation != environment.generation:
+                segment = self._segments[key] = self._tokenize(value, cwd)
+                stale.append(segment)
+            elif segment.generation != generation or now - segment.checked >= config.HIGHLIGHT_CACHE_SECONDS:
+                stale.append(segment)
+            segment.document = self._document
+            self._segments.move_to_end(key)
+            parts.append(segment)
+        self._evict(self._segments, _SEGMENT_CACHE_SIZE, lambda segment: segment.document)
 
-                if not matched:
-                    buf += line[i]
-                    i += 1
+        if stale and self.async_validation:
+            for segment in stale:
+                if segment.statuses is None:
+                    self._apply(segment, [MISSING] * len(segment.paths))
+            self._validate_later(stale)
+        elif stale:
+            self._resolve(stale, now)
 
-            if buf:
-                parts.append(("segment", buf))
+        tokens = []
+        for segment in parts:
+            tokens.extend(segment.tokens)
+        return tokens, not (stale and self.async_validation)
 
-            return parts
+    def _resolve(self, segments, now):
+        """
+        Answer the paths of segments in one path_resolver batch and restyle them.
+        True if any of their tokens changed.
+        """
+        statuses = iter(path_resolver.resolve([path for segment in segments for path in segment.paths]))
+        generation = dir_cache.generation
+        changed = False
+        for segment in segments:
+            tokens = segment.tokens
+            self._apply(segment, [next(statuses) for _ in segment.paths])
+            segment.generation = generation
+            segment.checked = now
+            changed = changed or segment.tokens is not tokens
+        return changed
 
-        def parse_segment(segment):
-            tokens = []
-            current = ""
-            in_quotes = False
-            quote_char = None
-            quoted_word = False
-            seen_command = False
+    def _validate_later(self, segments):
+        """
+        Queue segments for the validation worker, starting it if it is not running.
+        A segment already queued is answered once.
+        """
+        with self._lock:
+            self._pending.update(segments)
+            if self._validating:
+                return
+            self._validating = True
+        Thread(target=self._validate, daemon=True).start()
 
-            def flush_word(word, quoted=False):
-                nonlocal seen_command
-                if not word:
-                    return
+    def _validate(self):
+        segments = None
+        try:
+            while True:
+                with self._lock:
+                    segments = list(self._pending)
+                    self._pending.clear()
+                    if not segments:
+                        self._validating = False
+                        return
 
                 try:
-                    # strip quotes only for path checking
-                    full_path = os.path.expanduser(word.strip("'\""))
-                    if not os.path.isabs(full_path):
-                        full_path = os.path.join(cwd, full_path)
-
-                    path_exists = os.path.exists(full_path)
-                    dirname = os.path.dirname(full_path)
-                    path_partial = (
-                            path_exists or
-                            (os.path.exists(dirname) and any(
-                                f.startswith(os.path.basename(full_path))
-                                for f in os.listdir(dirname)
-                            ))
-                    )
-
-                    if quoted:
-                        tokens.append(("class:quotes", word))
-                    elif word.lower() == "sudo" and not seen_command:
-                        tokens.append(("class:sudo", word))
-                    elif not seen_command:
-                        seen_command = True
-                        if word.strip() in self.shell.command_handler.get_commands():
-                            tokens.append(("class:built_in", word))
-                        else:
-                            tokens.append(("class:command", word))
-                    elif word.startswith("$"):
-                        tokens.append(("class:env_var", word))
-                    elif path_exists or path_partial:
-                        if "/" in word or "\\" in word:
-                            tokens.append((
-                                "class:path_complete" if path_exists else "class:path",
-                                word
-                            ))
-                        else:
-                            tokens.append((
-                                "class:file_complete" if path_exists else "class:file",
-                                word
-                            ))
-                    elif word.replace(".", "").isdigit():
-                        tokens.append(("class:digit", word))
-                    elif word.startswith("-") or word.startswith("/"):
-                        tokens.append(("class:optional", word))
-                    else:
-                        tokens.append(("class:arg", word))
-
-                except Exception:
-                    tokens.append(("class:error", word))
-
-            i = 0
-            while i < len(segment):
-                ch = segment[i]
-
-                if ch == "\\" and in_quotes and quote_char == '"' and i + 1 < len(segment):
-                    current += segment[i:i + 2]
-                    i += 2
+                    changed = self._resolve(segments, time.monotonic())
+                except OSError:
                     continue
+                app = self._app
+                if changed and app is not None:
+                    app.invalidate()
+        finally:
+            # Left by an exception: let the next render start a new worker
+            if segments:
+                with self._lock:
+                    self._validating = False
 
-                if ch in ("'", '"'):
-                    if not in_quotes:
-                        in_quotes = True
-                        quote_char = ch
-                        quoted_word = True
-                        current += ch
-                    elif ch == quote_char:
-                        in_quotes = False
-                        current += ch
-                        quote_char = None
-                    else:
-                        current += ch
-                    i += 1
-                    continue
+    def _tokenize(self, segment, cwd):
+        """
+        A _Segment with everything that does not depend on the filesystem classified.
+        """
+        commands = self.shell.command_handler.get_commands()
+        base = []
+        words = []  # (index in base, word, full path or None)
+        seen_command = False
+        for word, quoted in split_words(segment):
+            if word is None:
+                base.append(("", " "))  # preserve real space
+                continue
 
-                if ch == " " and not in_quotes:
-                    flush_word(current, quoted=quoted_word)
-                    current = ""
-                    quoted_word = False
-                    tokens.append(("", " "))  # preserve real space
-                    i += 1
-                    continue
+            if quoted:
+                style = "class:quotes"
+            elif word.lower() == "sudo" and not seen_command:
+                style = "class:sudo"
+            elif not seen_command:
+                seen_command = True
+                style = "class:built_in" if word.strip() in commands else "class:command"
+            elif word.startswith("$"):
+                match = _ENV_VAR.match(word)
+                if match is None or match.group(1) in environment:
+                    style = "class:env_var"
+                else:
+                    style = "class:env_var.undefined"
+            else:
+                style = None  # depends on the filesystem
 
-                current += ch
-                i += 1
+            try:
+                # strip quotes only for path checking
+                full_path = os.path.expanduser(word.strip("'\""))
+                if not os.path.isabs(full_path):
+                    full_path = os.path.join(cwd, full_path)
+            except Exception:
+                full_path = None
 
-            # flush anything left (in case segment ends without space)
-            if current:
-                flush_word(current, quoted=quoted_word or in_quotes)
+            words.append((len(base), word, full_path))
+            base.append((style, word))
 
-            return tokens
+        segment = _Segment(base, words)
+        segment.env_generation = environment.generation
+        return segment
 
-        def get_line(lineno):
-            line = document.lines[lineno]
-            tokens = []
+    def _apply(self, segment, statuses):
+        if statuses == segment.statuses:
+            return
+        tokens = list(segment.base)
+        statuses_iter = iter(statuses)
+        for index, word, full_path in segment.words:
+            status = next(statuses_iter) if full_path is not None else None
+            if status is None or status.error:
+                tokens[index] = ("class:error", word)
+            elif tokens[index][0] is None:
+                tokens[index] = (self._classify(word, status), word)
+        segment.tokens = tokens
+        segment.statuses = statuses
 
-            for kind, value in split_by_linkers(line):
-                if kind == "link":
-                    tokens.append(("class:link", value.strip()))
-                else:
-                    tokens.extend(parse_segment(value))
+    @staticmethod
+    def _classify(word, status):
+        if status.exists or status.partial:
+            if "/" in word or "\\" in word:
+                return "class:path_complete" if status.exists else "class:path"
+            return "class:file_complete" if status.exists else "class:file"
+        if word.replace(".", "").isdigit():
+            return "class:digit"
+        if word.startswith("-") or word.startswith("/"):
+            return "class:optional"
+        return "class:arg"
 
-            return tokens
 
-        return get_line
+# A quoted region, skipped whole by both scanners. Inside double quotes a backslash
+# escapes the next character; an unterminated quote runs to the end of the input.
+_QUOTED = r"""(?:"(?:[^"\\]+|\\.?)*"?|'[^']*'?)"""
+
+
+def _linker_pattern(symbols):
+    """
+    Scanner for split_by_linkers: a linker (longest first), or a run of text in which
+    linkers are only matched outside quoted regions.
+    """
+    symbols = sorted(symbols, key=len, reverse=True)
+    link = "|".join(re.escape(symbol) for symbol in symbols) or "(?!)"
+    starts = "".join(sorted({re.escape(symbol[0]) for symbol in symbols}))
+    return re.compile(
+        rf"""(?P<link>{link})"""
+        rf"""|(?P<text>(?:{_QUOTED}|[^'"{starts}]+|(?!{link})[^'"])+)""",
+        re.DOTALL,
+    )
+
+
+_LINKERS = _linker_pattern(COMMAND_LINKING_SYMBOLS)
+# A single space outside quotes, or a word: quoted regions and runs of other characters
+_WORDS = re.compile(rf"""(?P<space> )|(?P<word>(?:{_QUOTED}|[^ '"]+)+)""", re.DOTALL)
+
+
+def split_by_linkers(line: str):
+    """
+    [("segment", text) | ("link", symbol)] for line, splitting on linking symbols
+    outside quotes. One regex pass, linear in the length of the line.
+    """
+    return [
+        ("link", match.group()) if match.lastgroup == "link" else ("segment", match.group())
+        for match in _LINKERS.finditer(line)
+    ]
+
+
+def split_words(segment: str):
+    """
+    [(word, quoted)] for segment, with (None, False) for every space outside quotes.
+    A word is quoted if a quote opened anywhere in it, i.e. if it contains a quote
+    character at all.
+    """
+    items = []
+    for match in _WORDS.finditer(segment):
+        word = match.group("word")
+        if word is None:
+            items.append((None, False))
+        else:
+            items.append((word, "'" in word or '"' in word))
+    return items
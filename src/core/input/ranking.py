@@ -0,0 +1,161 @@
+import heapq
+import json
+import math
+import os
+import time
+
+import config
+
+
+class FrecencyRanker:
+    """
+    Frequency + recency scores for completion texts.
+
+    Every use at time ts adds 2 ** (ts / half_life) to an item's weight, and the
+    log2 of that sum is stored. All items decay at the same rate, so stored scores
+    stay comparable forever and never need to be recomputed; ranking k completions
+    is a dict lookup each plus one sort.
+
+    Comparable scores also make pruning simple: beyond RANKING_MAX_ITEMS tokens (and
+    the per-directory limits) the lowest scored, i.e. least frecent, are dropped.
+    An uncapped ranker keeps every item's score and prunes only the per-directory ones.
+    """
+    ACCEPT_BONUS = 1.0  # an accepted completion counts as two uses
+    CWD_BONUS = 2.0  # uses in the current directory count four times as much
+
+    def __init__(self, path, half_life_days=None, capped=True):
+        self.path = path
+        self.capped = capped
+        self.half_life = (half_life_days or config.RANKING_HALF_LIFE_DAYS) * 86400
+        self.scores: dict[str, float] = {}
+        self.cwd_scores: dict[str, dict[str, float]] = {}
+        self.dirty = False
+        # bumped on every change, so callers can cache what they derive from the scores
+        self.version = 0
+
+    # -------------------- Recording -------------------- #
+    def record(self, text, cwd=None, ts=None, accepted=False):
+        if not text:
+            return
+        weight = (ts or time.time()) / self.half_life
+        if accepted:
+            weight += self.ACCEPT_BONUS
+
+        self.scores[text] = self._add(self.scores.get(text), weight)
+        if self.capped:
+            self._prune(self.scores, config.RANKING_MAX_ITEMS)
+        if cwd:
+            scores = self.cwd_scores.get(cwd)
+            if scores is None:
+                self.cwd_scores[cwd] = {text: weight}
+                self._prune_directories()
+            else:
+                scores[text] = self._add(scores.get(text), weight)
+                self._prune(scores, config.RANKING_MAX_DIRECTORY_ITEMS)
+        self.dirty = True
+        self.version += 1
+
+    def record_line(self, line, cwd=None, ts=None):
+        for token in line.split():
+            self.record(token, cwd=cwd, ts=ts)
+
+    def bootstrap(self, cmd_meta):
+        """
+        Seed scores from ShellFileHistory metadata ({command: [{"cwd", "ts"}, ...]}).
+        """
+        for command, metas in cmd_meta.items():
+            for meta in metas:
+                self.record_line(command, cwd=meta.get("cwd"), ts=meta.get("ts"))
+
+    def clear(self):
+        self.scores, self.cwd_scores = {}, {}
+        self.dirty = True
+        self.version += 1
+        self.save()
+
+    @staticmethod
+    def _prune(scores, limit, slack=True):
+        """
+        Keep the limit best scores. With slack, only once scores outgrew limit by a
+        quarter, so pruning costs O(log n) amortized per record.
+        """
+        if len(scores) <= (limit + limit // 4 if slack else limit):
+            return
+        keep = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        scores.clear()
+        scores.update(keep)
+
+    def _prune_directories(self, slack=True):
+        limit = config.RANKING_MAX_DIRECTORIES
+        if len(self.cwd_scores) <= (limit + limit // 4 if slack else limit):
+            return
+        # A directory is as recent as its best score
+        best = {cwd: max(scores.values(), default=0.0) for cwd, scores in self.cwd_scores.items()}
+        keep = set(heapq.nlargest(limit, best, key=best.get))
+        self.cwd_scores = {cwd: scores for cwd, scores in self.cwd_scores.items() if cwd in keep}
+
+    @staticmethod
+    def _add(score, weight):
+        if score is None:
+            return weight
+        high, low = max(score, weight), min(score, weight)
+        return high + math.log2(1 + 2 ** (low - high))
+
+    # -------------------- Ranking -------------------- #
+    def score(self, text, cwd=None):
+        score = self.scores.get(text)
+        if cwd:
+            local = self.cwd_scores.get(cwd, {}).get(text)
+            if local is not None:
+                score = self._add(score, local + self.CWD_BONUS)
+        return score
+
+    def rank(self, completions, cwd=None):
+        """
+        Order completions by score, best first. Unscored ones keep their relative order, last.
+        """
+        scored = [(self.score(c.text, cwd), i, c) for i, c in enumerate(completions)]
+        if all(score is None for score, _, _ in scored):
+            return list(completions)
+        scored.sort(key=lambda item: (item[0] is None, -(item[0] or 0), item[1]))
+        return [c for _, _, c in scored]
+
+    # -------------------- Persistence -------------------- #
+    def load(self):
+        """
+        Load persisted scores. Returns False if there were none.
+        """
+        if not os.path.exists(self.path):
+            return False
+        self.version += 1
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.scores = data.get("scores", {})
+            self.cwd_scores = data.get("cwd_scores", {})
+            # Files written before the limits existed, or with larger ones
+            if self.capped:
+                self._prune(self.scores, config.RANKING_MAX_ITEMS, slack=False)
+            self._prune_directories(slack=False)
+            for scores in self.cwd_scores.values():
+                self._prune(scores, config.RANKING_MAX_DIRECTORY_ITEMS, slack=False)
+        except (OSError, json.JSONDecodeError, AttributeError):
+            self.scores, self.cwd_scores = {}, {}
+            return False
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.version += 1
+        if self.capped:
+            self._prune(self.scores, config.RANKING_MAX_ITEMS, slack=False)
+        self._prune_directories(slack=False)
+        for scores in self.cwd_scores.values():
+            self._prune(scores, config.RANKING_MAX_DIRECTORY_ITEMS, slack=False)
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"scores": self.scores, "cwd_scores": self.cwd_scores}, f)
+            self.dirty = False
+        except OSError:
+            pass
@@ -0,0 +1,2 @@
+from .base import CompletionContext, CompletionSource
+from .standard import default_sources
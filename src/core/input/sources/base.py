@@ -0,0 +1,112 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+from ..fsguard import fs_guard
+
+
+@dataclass
+class CompletionContext:
+    """
+    Everything a source may look at for one completion request.
+    kind is "ai" or "picker" in those modes, "empty" for an empty line or "sudo ",
+    and "line" otherwise.
+    """
+    text: str
+    kind: str
+    cwd: str
+    completer: Any
+    env_generation: int = 0
+    tokens: list[str] = field(default_factory=list)
+    token_index: int = 0
+    tool_index: int = 0
+
+    @property
+    def trailing_space(self):
+        return self.text.endswith(" ")
+
+    @property
+    def last_token(self):
+        return self.tokens[-1] if self.tokens else ""
+
+    @property
+    def fragment(self):
+        """
+        The token being completed, "" right after a space.
+        """
+        return "" if self.trailing_space else self.last_token
+
+    @property
+    def command(self):
+        """
+        The command being completed for (after any sudo), or "".
+        """
+        return self.tokens[self.tool_index] if self.tool_index < len(self.tokens) else ""
+
+
+class CompletionSource:
+    """
+    A completion source the completer can schedule and memoize without knowing
+    what it does.
+
+    Sources run in ascending priority order, which is also their display order.
+    Fast sources run inline on the prompt thread; the rest run on the completion
+    pool, and timed ones are dropped once they miss COMPLETION_SOURCE_BUDGET_MS.
+
+    Memoization is declared, not implemented: when key() returns something other
+    than None, results are reused for as long as that key, the cwd (cache_by_cwd),
+    the environment generation (cache_by_env) and the mtimes of watched_files()
+    stay the same, and for at most ttl seconds if ttl is set.
+    """
+    name = ""
+    priority = 100
+    kinds = ("line",)
+    fast = False
+    timed = True
+    lazy = False
+
+    cache_by_cwd = False
+    cache_by_env = False
+    ttl = None
+
+    def applies(self, context):
+        """
+        Trigger condition, checked after kinds.
+        """
+        return True
+
+    def key(self, context):
+        """
+        Request-specific part of the memo key, or None to always recompute.
+        """
+        return None
+
+    def watched_files(self, context):
+        return ()
+
+    def complete(self, context):
+        raise NotImplementedError
+
+    def memo_key(self, context):
+        """
+        The complete memo key for context, or None if the source is not memoized.
+        """
+        key = self.key(context)
+        if key is None:
+            return None
+
+        mtimes = []
+        for path in self.watched_files(context):
+            try:
+                stat = fs_guard.run(os.path.dirname(os.path.abspath(path)), os.stat, path)
+            except OSError:
+                stat = None
+            mtimes.append(stat.st_mtime_ns if stat is not None else None)
+
+        return (
+            self.name,
+            key,
+            context.cwd if self.cache_by_cwd else None,
+            context.env_generation if self.cache_by_env else None,
+            tuple(mtimes),
+        )
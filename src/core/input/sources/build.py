@@ -0,0 +1,172 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from threading import Lock
+
+from prompt_toolkit.completion import Completion
+
+from .base import CompletionSource
+
+MAKEFILES = ("GNUmakefile", "makefile", "Makefile")
+JUSTFILES = ("justfile", "Justfile", ".justfile")
+PACKAGE_JSON = ("package.json",)
+
+# "target another: deps", but not "VAR := value", "VAR ::= value" or recipe lines
+_MAKE_RULE = re.compile(r"^([^\s:#=][^:#=]*?)\s*::?(?![:=])")
+# "name arg='x':", "@name:", "alias b := build"
+_JUST_RECIPE = re.compile(r"^@?([A-Za-z_][A-Za-z0-9_-]*)(?:\s+[^:]*)?:(?![=])")
+_JUST_ALIAS = re.compile(r"^alias\s+([A-Za-z_][A-Za-z0-9_-]*)\s*:=")
+
+
+def parse_makefile(text):
+    targets = []
+    for line in text.splitlines():
+        if not line or line[0] in "\t#":
+            continue
+        match = _MAKE_RULE.match(line)
+        if match is None:
+            continue
+        for target in match.group(1).split():
+            # special (.PHONY), pattern and computed targets cannot be typed usefully
+            if target.startswith(".") or "%" in target or "$" in target:
+                continue
+            targets.append(target)
+    return list(dict.fromkeys(targets))
+
+
+def parse_justfile(text):
+    recipes = []
+    private = False
+    for line in text.splitlines():
+        if line.startswith("["):
+            private = private or "private" in line
+            continue
+        if not line or line[0] in " \t#":
+            continue
+        match = _JUST_ALIAS.match(line) or _JUST_RECIPE.match(line)
+        if match is None or line.startswith(("set ", "export ", "import ", "mod ")):
+            continue
+        name = match.group(1)
+        if not name.startswith("_") and not private:
+            recipes.append(name)
+        private = False
+    return list(dict.fromkeys(recipes))
+
+
+def parse_package_json(text):
+    try:
+        scripts = json.loads(text).get("scripts", {})
+    except (ValueError, AttributeError):
+        return []
+    return list(scripts) if isinstance(scripts, dict) else []
+
+
+class ParseCache:
+    """
+    Parsed build files keyed by path, valid while (mtime, size) is unchanged.
+    Shared by every directory and keystroke, so a file is parsed once per change.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, path, parser):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(path)
+                return cached[1]
+
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                result = parser(f.read())
+        except OSError:
+            return None
+
+        with self._lock:
+            self._entries[path] = (stamp, result)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+
+
+parse_cache = ParseCache()
+
+
+def find_build_file(cwd, names, search_parents):
+    directory = os.path.abspath(cwd)
+    while True:
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        parent = os.path.dirname(directory)
+        if not search_parents or parent == directory:
+            return None
+        directory = parent
+
+
+class BuildTargetSource(CompletionSource):
+    """
+    Makefile targets after make, package.json scripts after npm/yarn/pnpm run,
+    and justfile recipes after just.
+    """
+    name = "build_targets"
+    priority = 26
+
+    # (command, subcommand or None) -> (file names, search parent directories, parser, meta)
+    TOOLS = {
+        ("make", None): (MAKEFILES, False, parse_makefile, "MAKE TARGET"),
+        ("just", None): (JUSTFILES, True, parse_justfile, "JUST RECIPE"),
+        ("npm", "run"): (PACKAGE_JSON, True, parse_package_json, "NPM SCRIPT"),
+        ("npm", "run-script"): (PACKAGE_JSON, True, parse_package_json, "NPM SCRIPT"),
+        ("yarn", "run"): (PACKAGE_JSON, True, parse_package_json, "YARN SCRIPT"),
+        ("pnpm", "run"): (PACKAGE_JSON, True, parse_package_json, "PNPM SCRIPT"),
+    }
+
+    def _tool(self, context):
+        """
+        The TOOLS entry for the line, if the token being completed is a target.
+        """
+        if len(context.tokens) <= context.tool_index + 1 and not context.trailing_space:
+            return None  # still typing the command
+        args = context.tokens[context.tool_index + 1:]
+        if not context.trailing_space:
+            args = args[:-1]  # the fragment being typed
+        if context.fragment.startswith("-"):
+            return None
+
+        tool = self.TOOLS.get((context.command, None))
+        if tool is not None:
+            # make takes several targets; just takes one recipe plus its arguments
+            return tool if context.command == "make" or not args else None
+        if len(args) == 1:
+            return self.TOOLS.get((context.command, args[0]))
+        return None
+
+    def applies(self, context):
+        return self._tool(context) is not None
+
+    def complete(self, context):
+        names, search_parents, parser, meta = self._tool(context)
+        path = find_build_file(context.cwd, names, search_parents)
+        if path is None:
+            return []
+
+        targets = parse_cache.get(path, parser) or []
+        fragment = context.fragment
+        return [
+            Completion(target, start_position=-len(fragment), style="class:arg", display_meta=meta)
+            for target in targets
+            if target.startswith(fragment)
+        ]
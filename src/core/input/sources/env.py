@@ -0,0 +1,44 @@
+import re
+
+from prompt_toolkit.completion import Completion
+
+from core.environment import environment
+from .base import CompletionSource
+
+# A $NAME or ${NAME being typed at the end of the fragment
+_PARTIAL_VAR = re.compile(r"\$(\{?)([A-Za-z_][A-Za-z0-9_]*)?$")
+META_WIDTH = 40
+
+
+class EnvVarSource(CompletionSource):
+    """
+    Environment variable names after $ or ${, anywhere in a word ($HOME/src, --out=$TMP).
+    Served from the environment snapshot, so a keystroke is one bisect.
+    """
+    name = "env_vars"
+    priority = 24
+    fast = True
+
+    def applies(self, context):
+        return "$" in context.fragment
+
+    def complete(self, context):
+        match = _PARTIAL_VAR.search(context.fragment)
+        if match is None:
+            return []
+
+        braced = bool(match.group(1))
+        typed = match.group(0)
+        out = []
+        for name in environment.matching(match.group(2) or ""):
+            value = environment.get(name, "")
+            if len(value) > META_WIDTH:
+                value = value[:META_WIDTH - 3] + "..."
+            out.append(Completion(
+                f"${{{name}}}" if braced else f"${name}",
+                start_position=-len(typed),
+                display=f"${name}",
+                style="class:env_var",
+                display_meta=value,
+            ))
+        return out
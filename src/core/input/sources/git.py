@@ -0,0 +1,197 @@
+import os
+import time
+from threading import Lock
+
+from prompt_toolkit.completion import Completion
+
+from core.utils import mtime_ns, prefix_range, stamps_changed
+from .base import CompletionSource
+
+# Subcommands whose arguments are refs
+REF_SUBCOMMANDS = frozenset({
+    "checkout", "switch", "merge", "rebase", "branch", "log", "diff", "show", "reset",
+    "cherry-pick", "revert", "tag", "restore", "range-diff", "shortlog", "describe", "bisect",
+})
+# HEAD, packed-refs and the refs/ directories are re-stated at most this often
+VALIDATE_INTERVAL = 0.5
+MAX_RESULTS = 1000
+
+# In precedence order: a branch shadows a tag or remote branch of the same name
+_KINDS = (("refs/heads/", "branch"), ("refs/tags/", "tag"), ("refs/remotes/", "remote"))
+_PRECEDENCE = {kind: index for index, (_, kind) in enumerate(_KINDS)}
+
+
+def find_git_dir(cwd):
+    """
+    (git dir, common dir) of the repository containing cwd, or None.
+    In a linked worktree .git is a file pointing at .git/worktrees/<name>, which holds
+    HEAD while refs and packed-refs live in the common dir.
+    """
+    path = os.path.abspath(cwd)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        git_dir = None
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+        elif os.path.isfile(dot_git):
+            try:
+                with open(dot_git, "r", encoding="utf-8") as f:
+                    line = f.readline().strip()
+            except OSError:
+                line = ""
+            if line.startswith("gitdir:"):
+                git_dir = os.path.normpath(os.path.join(path, line[len("gitdir:"):].strip()))
+
+        if git_dir is not None:
+            common_dir = git_dir
+            try:
+                with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as f:
+                    common_dir = os.path.normpath(os.path.join(git_dir, f.readline().strip()))
+            except OSError:
+                pass
+            return git_dir, common_dir
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class GitRefs:
+    """
+    Snapshot of a repository's refs: names sorted for bisect, the kind of each and
+    the mtimes they were read at (HEAD, packed-refs and every directory under refs/).
+    """
+
+    def __init__(self, git_dir, common_dir):
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self.head = None
+        self.kinds: dict[str, str] = {}
+        self.names: list[str] = []
+        self.stamps: dict[str, int | None] = {}
+        self.validated = 0.0
+
+    def _add(self, ref):
+        for prefix, kind in _KINDS:
+            if ref.startswith(prefix):
+                name = ref[len(prefix):]
+                if kind == "remote" and name.endswith("/HEAD"):
+                    return
+                current = self.kinds.get(name)
+                if current is None or _PRECEDENCE[kind] < _PRECEDENCE[current]:
+                    self.kinds[name] = kind
+                return
+
+    def load(self):
+        head_path = os.path.join(self.git_dir, "HEAD")
+        packed_path = os.path.join(self.common_dir, "packed-refs")
+        stamps = {head_path: mtime_ns(head_path), packed_path: mtime_ns(packed_path)}
+
+        try:
+            with open(head_path, "r", encoding="utf-8") as f:
+                head = f.readline().strip()
+            self.head = head[len("ref: refs/heads/"):] if head.startswith("ref: refs/heads/") else None
+        except OSError:
+            self.head = None
+
+        self.kinds = {}
+        refs_root = os.path.join(self.common_dir, "refs")
+        pending = [(refs_root, "refs/")]
+        while pending:
+            directory, prefix = pending.pop()
+            stamps[directory] = mtime_ns(directory)
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append((entry.path, prefix + entry.name + "/"))
+                        elif not entry.name.endswith(".lock"):
+                            self._add(prefix + entry.name)
+            except OSError:
+                continue
+
+        try:
+            with open(packed_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith(("#", "^")):
+                        continue
+                    _, _, ref = line.rstrip("\n").partition(" ")
+                    self._add(ref)
+        except OSError:
+            pass
+
+        self.names = sorted(self.kinds)
+        self.stamps = stamps
+        self.validated = time.monotonic()
+
+    def is_current(self):
+        if time.monotonic() - self.validated < VALIDATE_INTERVAL:
+            return True
+        if stamps_changed(self.stamps):
+            return False
+        self.validated = time.monotonic()
+        return True
+
+    def matching(self, prefix):
+        start, end = prefix_range(self.names, prefix)
+        return self.names[start:min(end, start + MAX_RESULTS)]
+
+
+class GitRefCache:
+    """
+    GitRefs per repository, reloaded only when one of their mtimes changed.
+    """
+
+    def __init__(self):
+        self._refs: dict[str, GitRefs] = {}
+        self._lock = Lock()
+
+    def refs(self, cwd):
+        dirs = find_git_dir(cwd)
+        if dirs is None:
+            return None
+
+        with self._lock:
+            refs = self._refs.get(dirs[0])
+            if refs is None:
+                refs = self._refs[dirs[0]] = GitRefs(*dirs)
+                refs.load()
+            elif not refs.is_current():
+                refs.load()
+            return refs
+
+
+git_refs = GitRefCache()
+
+
+class GitRefSource(CompletionSource):
+    """
+    Branches, tags and remote branches for git subcommands that take refs.
+    Memoized by GitRefCache rather than the completer, since loose refs can change
+    anywhere under refs/.
+    """
+    name = "git_refs"
+    priority = 25
+
+    def applies(self, context):
+        return (
+                context.command == "git"
+                and len(context.tokens) > context.tool_index + 1
+                and context.tokens[context.tool_index + 1] in REF_SUBCOMMANDS
+                and (len(context.tokens) > context.tool_index + 2 or context.trailing_space)
+                and not context.fragment.startswith("-")
+        )
+
+    def complete(self, context):
+        refs = git_refs.refs(context.cwd)
+        if refs is None:
+            return []
+
+        fragment = context.fragment
+        out = []
+        for name in refs.matching(fragment):
+            kind = refs.kinds[name]
+            meta = "GIT BRANCH (current)" if kind == "branch" and name == refs.head else f"GIT {kind.upper()}"
+            out.append(Completion(name, start_position=-len(fragment), style="class:arg", display_meta=meta))
+        return out
@@ -0,0 +1,116 @@
+import time
+from threading import Lock
+
+import psutil
+from prompt_toolkit.completion import Completion
+
+from .base import CompletionSource
+
+# Commands whose plain arguments are PIDs
+PID_COMMANDS = frozenset({"kill", "renice", "pstree", "pwdx", "prlimit"})
+# Options whose value is a PID, for strace -p, gdb -p, py-spy --pid, ...
+PID_OPTIONS = frozenset({"-p", "--pid"})
+# A process snapshot is reused for this long, so a menu costs one walk of /proc
+SNAPSHOT_TTL = 2.0
+MAX_RESULTS = 1000
+
+
+class ProcessSnapshot:
+    """
+    (pid, name) of every process, from one psutil.process_iter call per SNAPSHOT_TTL.
+    """
+
+    def __init__(self):
+        self._processes: list[tuple[int, str]] = []
+        self._taken = None
+        self._lock = Lock()
+
+    def processes(self):
+        with self._lock:
+            if self._taken is None or time.monotonic() - self._taken >= SNAPSHOT_TTL:
+                processes = []
+                for proc in psutil.process_iter(["pid", "name"]):
+                    info = proc.info
+                    processes.append((info["pid"], info["name"] or ""))
+                processes.sort()
+                self._processes = processes
+                self._taken = time.monotonic()
+            return self._processes
+
+
+process_snapshot = ProcessSnapshot()
+
+
+class ProcessSource(CompletionSource):
+    """
+    PIDs with the process name as metadata. A numeric fragment matches PIDs, anything
+    else matches process names and is replaced by the PID.
+    """
+    name = "processes"
+    priority = 28
+
+    def applies(self, context):
+        if context.fragment.startswith("-"):
+            return False
+        args = context.tokens[context.tool_index + 1:]
+        if not context.trailing_space:
+            if not args:
+                return False  # still typing the command
+            args = args[:-1]
+        if args and args[-1] in PID_OPTIONS:
+            return True
+        return context.command in PID_COMMANDS
+
+    def complete(self, context):
+        fragment = context.fragment
+        by_pid = fragment.isdigit() or not fragment
+        lowered = fragment.lower()
+
+        out = []
+        for pid, name in process_snapshot.processes():
+            if by_pid:
+                if not str(pid).startswith(fragment):
+                    continue
+            elif not name.lower().startswith(lowered):
+                continue
+            out.append(Completion(str(pid), start_position=-len(fragment), style="class:arg", display_meta=name))
+            if len(out) >= MAX_RESULTS:
+                break
+        return out
+
+
+class BackgroundTaskSource(CompletionSource):
+    """
+    Task IDs with their status after 'bg kill' and 'bg output'. Only running tasks
+    can be killed.
+    """
+    name = "background_tasks"
+    priority = 22
+    fast = True
+
+    def applies(self, context):
+        tokens = context.tokens
+        return (
+                len(tokens) >= 2
+                and tokens[0] == "bg"
+                and tokens[1] in ("kill", "output")
+                and (len(tokens) == 3 and not context.trailing_space
+                     or len(tokens) == 2 and context.trailing_space)
+        )
+
+    def complete(self, context):
+        btm = getattr(context.completer.input_handler.shell, "btm", None)
+        if btm is None:
+            return []
+
+        fragment = context.fragment
+        running_only = context.tokens[1] == "kill"
+        out = []
+        for task in list(btm.tasks.values()):
+            if running_only and not task.running:
+                continue
+            task_id = str(task.id)
+            if task_id.startswith(fragment):
+                out.append(Completion(task_id, start_position=-len(fragment), style="class:arg",
+                                      display_meta=f"{task.status()} {task.command}"))
+        return out
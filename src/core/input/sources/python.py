@@ -0,0 +1,340 @@
+import glob
+import os
+import re
+import shutil
+import sys
+import time
+from importlib.machinery import EXTENSION_SUFFIXES
+from threading import Lock
+
+from prompt_toolkit.completion import Completion
+
+from core.utils import mtime_ns, prefix_range, stamps_changed
+from .base import CompletionSource
+
+# An environment's sys.path directories are re-stated at most once a second
+VALIDATE_INTERVAL = 1.0
+MAX_RESULTS = 1000
+
+PIP_SUBCOMMANDS = frozenset({"uninstall", "show"})
+
+_DIST_SUFFIXES = (".dist-info", ".egg-info")
+_VERSION = re.compile(r"(?:^|python)(\d+\.\d+)(?:\.\d+)*$")
+
+
+def _matching(names, prefix):
+    start, end = prefix_range(names, prefix)
+    return names[start:min(end, start + MAX_RESULTS)]
+
+
+def _is_python_executable(name):
+    name = os.path.basename(name).lower().removesuffix(".exe")
+    return name in ("python", "py") or (name.startswith("python") and name[6:].replace(".", "").isdigit())
+
+
+def scan_directory(path):
+    """
+    Top-level modules and installed distributions of one sys.path entry.
+    Returns ({module: package directory or None}, {distribution: version}).
+    """
+    modules = {}
+    dists = {}
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return modules, dists
+
+    for entry in entries:
+        name = entry.name
+        if name.endswith(_DIST_SUFFIXES):
+            dist, _, version = name.rsplit(".", 1)[0].partition("-")
+            if dist:
+                dists[dist] = version
+            continue
+
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if is_dir:
+            # Regular and namespace packages alike
+            if name.isidentifier() and name != "__pycache__":
+                modules[name] = entry.path
+            continue
+
+        for suffix in (".py", *EXTENSION_SUFFIXES):
+            if name.endswith(suffix):
+                module = name[:-len(suffix)]
+                if module.isidentifier() and module not in modules:
+                    modules[module] = None
+                break
+    return modules, dists
+
+
+class PythonEnvironment:
+    """
+    Snapshot of the modules and distributions importable in one environment:
+    the merged scans of its sys.path directories and the mtimes they were read at.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.modules: dict[str, str | None] = {}
+        self.module_names: list[str] = []
+        self.dists: dict[str, str] = {}
+        self.dist_names: list[str] = []
+        self.stamps: dict[str, int | None] = {}
+        self.validated = 0.0
+
+    def load(self, scans):
+        modules = dict.fromkeys(sys.builtin_module_names)
+        dists = {}
+        # Earlier entries shadow later ones, as they do for the import system
+        for path in reversed(self.paths):
+            path_modules, path_dists = scans.get(path)
+            modules.update(path_modules)
+            dists.update(path_dists)
+
+        self.modules = modules
+        self.module_names = sorted(modules)
+        self.dists = dists
+        self.dist_names = sorted(dists, key=str.lower)
+        self.stamps = {path: scans.stamp(path) for path in self.paths}
+        self.validated = time.monotonic()
+
+    def is_current(self):
+        if time.monotonic() - self.validated < VALIDATE_INTERVAL:
+            return True
+        if stamps_changed(self.stamps):
+            return False
+        self.validated = time.monotonic()
+        return True
+
+    def matching_modules(self, prefix):
+        return _matching(self.module_names, prefix)
+
+    def matching_dists(self, prefix):
+        # pip treats distribution names case-insensitively
+        lowered = prefix.lower()
+        return [name for name in self.dist_names if name.lower().startswith(lowered)][:MAX_RESULTS]
+
+
+class DirectoryScans:
+    """
+    scan_directory results per path, rescanned only when the directory's mtime changed.
+    Shared between environments, so the base interpreter's stdlib is scanned once.
+    """
+
+    def __init__(self):
+        self._scans: dict[str, tuple] = {}
+        self._lock = Lock()
+
+    def stamp(self, path):
+        cached = self._scans.get(path)
+        return cached[0] if cached is not None else None
+
+    def get(self, path):
+        mtime = mtime_ns(path)
+        with self._lock:
+            cached = self._scans.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        result = scan_directory(path) if mtime is not None else ({}, {})
+        with self._lock:
+            self._scans[path] = (mtime, result)
+        return result
+
+
+def _read_venv_config(venv):
+    """
+    The key = value pairs of venv's pyvenv.cfg, keys lowercased.
+    """
+    values = {}
+    try:
+        with open(os.path.join(venv, "pyvenv.cfg"), "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                values[key.strip().lower()] = value.strip()
+    except OSError:
+        pass
+    return values
+
+
+def _version_of(name):
+    """
+    "3.11" for python3.11, python3.11.7 or 3.11.7, None if name carries no minor version.
+    """
+    match = _VERSION.search(name)
+    return match.group(1) if match else None
+
+
+def _installation_paths(home, version):
+    """
+    (stdlib, site-packages) directories of the Python whose executable is in home.
+    """
+    if os.name == "nt":
+        lib = os.path.join(home, "Lib")
+        return [lib, os.path.join(home, "DLLs")], [os.path.join(lib, "site-packages")]
+    if version is None:
+        return [], []
+    prefix = os.path.dirname(home)
+    lib = os.path.join(prefix, "lib", f"python{version}")
+    stdlib = [lib, os.path.join(lib, "lib-dynload")]
+    site = [
+        os.path.join(lib, "site-packages"),
+        os.path.join(lib, "dist-packages"),
+        os.path.join(prefix, "lib", "python3", "dist-packages"),
+    ]
+    return stdlib, site
+
+
+def _interpreter_paths(executable):
+    """
+    The sys.path directories of a Python that is not a venv.
+    """
+    executable = os.path.realpath(executable)
+    home = os.path.dirname(executable)
+    version = _version_of(os.path.basename(executable))
+    if version is None:
+        # A plain "python": the newest version installed next to it
+        installed = glob.glob(os.path.join(os.path.dirname(home), "lib", "python3.*"))
+        versions = filter(None, (_version_of(os.path.basename(path)) for path in installed))
+        version = max(versions, key=lambda v: tuple(map(int, v.split("."))), default=None)
+
+    stdlib, site = _installation_paths(home, version)
+    if version is not None and os.name != "nt":
+        site.insert(0, os.path.expanduser(f"~/.local/lib/python{version}/site-packages"))
+    return [path for path in stdlib + site if os.path.isdir(path)]
+
+
+def environment_paths(venv):
+    """
+    The sys.path directories of venv, or of the python on PATH for None, worked
+    out from the installation layout rather than the shell's own sys.path.
+    A venv shares its base interpreter's stdlib, found through the home of its
+    pyvenv.cfg, and sees its site-packages only with include-system-site-packages.
+    """
+    if venv is None:
+        executable = shutil.which("python") or shutil.which("python3")
+        if executable is None:
+            return []
+        # A venv's python put on PATH without activating the venv
+        root = os.path.dirname(os.path.dirname(executable))
+        if not os.path.isfile(os.path.join(root, "pyvenv.cfg")):
+            return _interpreter_paths(executable)
+        venv = root
+
+    own = sorted(glob.glob(os.path.join(venv, "lib", "python*", "site-packages")))
+    own += glob.glob(os.path.join(venv, "Lib", "site-packages"))
+
+    values = _read_venv_config(venv)
+    version = _version_of(values.get("version_info") or values.get("version", ""))
+    if version is None and own:
+        version = _version_of(os.path.basename(os.path.dirname(own[0])))
+
+    stdlib, site = _installation_paths(values["home"], version) if values.get("home") else ([], [])
+    paths = stdlib + own
+    if values.get("include-system-site-packages", "").lower() == "true":
+        paths += site
+    return [path for path in paths if os.path.isdir(path)]
+
+
+class PythonEnvironmentCache:
+    """
+    PythonEnvironment per venv (None for the python on PATH). Switching back to
+    a venv reuses its snapshot and only rescans directories that changed.
+    """
+
+    def __init__(self):
+        self.scans = DirectoryScans()
+        self._envs: dict[tuple[str | None, str | None], PythonEnvironment] = {}
+        self._lock = Lock()
+
+    def get(self, venv):
+        # Without a venv, which python runs depends on PATH
+        key = (venv, None if venv else os.environ.get("PATH", ""))
+        with self._lock:
+            env = self._envs.get(key)
+            if env is None:
+                env = self._envs[key] = PythonEnvironment(environment_paths(venv))
+                env.load(self.scans)
+            elif not env.is_current():
+                env.load(self.scans)
+            return env
+
+    def submodules(self, package_dir):
+        modules, _ = self.scans.get(package_dir)
+        return sorted(modules)
+
+
+python_envs = PythonEnvironmentCache()
+
+
+class PythonPackageSource(CompletionSource):
+    """
+    Importable modules after python -m, installed distributions after pip
+    uninstall/show (or python -m pip ...), for the active venv.
+    """
+    name = "python_packages"
+    priority = 27
+
+    @staticmethod
+    def _target(context):
+        """
+        "module", "dist" or None for the token being completed.
+        """
+        argv = context.tokens[context.tool_index:]
+        if not context.trailing_space:
+            argv = argv[:-1]  # the fragment being typed
+        if not argv or context.fragment.startswith("-"):
+            return None
+
+        if _is_python_executable(argv[0]):
+            if argv[1:] == ["-m"]:
+                return "module"
+            if argv[1:3] != ["-m", "pip"]:
+                return None
+            argv = ["pip", *argv[3:]]
+
+        if argv[0] in ("pip", "pip3") and len(argv) >= 2 and argv[1] in PIP_SUBCOMMANDS:
+            return "dist"
+        return None
+
+    def applies(self, context):
+        return self._target(context) is not None
+
+    def complete(self, context):
+        env = python_envs.get(os.environ.get("VIRTUAL_ENV") or None)
+        fragment = context.fragment
+
+        if self._target(context) == "dist":
+            return [
+                Completion(name, start_position=-len(fragment), style="class:arg",
+                           display_meta=f"PACKAGE {env.dists[name]}".rstrip())
+                for name in env.matching_dists(fragment)
+            ]
+
+        package, dot, prefix = fragment.rpartition(".")
+        if not dot:
+            names = env.matching_modules(fragment)
+            return [
+                Completion(name, start_position=-len(fragment), style="class:arg",
+                           display_meta="PACKAGE" if env.modules[name] else "MODULE")
+                for name in names
+            ]
+
+        # python -m http.server: walk into the package one level at a time
+        root, *rest = package.split(".")
+        package_dir = env.modules.get(root)
+        for part in rest:
+            if package_dir is None:
+                break
+            package_dir = os.path.join(package_dir, part)
+        if package_dir is None or not os.path.isdir(package_dir):
+            return []
+        return [
+            Completion(f"{package}.{name}", start_position=-len(fragment), style="class:arg", display_meta="MODULE")
+            for name in python_envs.submodules(package_dir)
+            if name.startswith(prefix) and name != "__init__"
+        ]
@@ -0,0 +1,179 @@
+import config
+from config import COMPLETE_ARGS, COMPLETE_PATHS, COMPLETE_HISTORY, HELP_FILE
+from .base import CompletionSource
+from .build import BuildTargetSource
+from .env import EnvVarSource
+from .git import GitRefSource
+from .processes import BackgroundTaskSource, ProcessSource
+from .python import PythonPackageSource
+
+
+class HistorySource(CompletionSource):
+    name = "history"
+    priority = 10
+
+    def applies(self, context):
+        return COMPLETE_HISTORY
+
+    def complete(self, context):
+        completer = context.completer
+        return completer._narrow(
+            "history",
+            context.text,
+            context.fragment,
+            lambda: [
+                (c.text, c)
+                for c in completer._complete_history(context.text, context.tool_index, context.token_index,
+                                                     context.last_token, context.cwd)
+            ],
+        )
+
+
+class BuiltInArgsSource(CompletionSource):
+    name = "built_in_args"
+    priority = 20
+    fast = True
+
+    def applies(self, context):
+        return COMPLETE_ARGS
+
+    def complete(self, context):
+        return context.completer._complete_build_in_arg(context.text.removeprefix("sudo"))
+
+
+class MapSource(CompletionSource):
+    """
+    Subcommands and options from the help index built by 'map'.
+    Never narrowed: once the token spells a subcommand, get_suggested moves into its
+    branch, so the candidates are not a filter of the previous ones.
+    """
+    name = "map"
+    priority = 30
+
+    def applies(self, context):
+        return COMPLETE_ARGS
+
+    def key(self, context):
+        return context.text
+
+    def watched_files(self, context):
+        return (HELP_FILE,)
+
+    def complete(self, context):
+        return context.completer._complete_map(context.last_token, context.text)
+
+
+class PathSource(CompletionSource):
+    # Memoized by the directory cache and narrowing already
+    name = "path"
+    priority = 40
+
+    def applies(self, context):
+        return COMPLETE_PATHS
+
+    def complete(self, context):
+        return context.completer._complete_path(context.text, context.cwd)
+
+
+class FuzzyPathSource(CompletionSource):
+    name = "fuzzy_path"
+    priority = 50
+
+    def applies(self, context):
+        return (
+                COMPLETE_PATHS
+                and config.FUZZY_PATH_COMPLETION
+                and "**" in context.last_token
+                and not context.trailing_space
+        )
+
+    def complete(self, context):
+        return context.completer._complete_fuzzy_path(context.last_token, context.cwd)
+
+
+class CommandSource(CompletionSource):
+    name = "command"
+    priority = 60
+    fast = True
+
+    def applies(self, context):
+        return len(context.tokens) == 1 and not context.trailing_space
+
+    def complete(self, context):
+        completer = context.completer
+        token = context.tokens[0]
+        return completer._narrow(
+            "command",
+            context.text,
+            token,
+            lambda: [(c.text, c) for c in completer._complete_command(token)],
+        )
+
+
+class LazyCommandSource(CompletionSource):
+    """
+    Every command, for an empty line or "sudo ".
+    """
+    name = "command"
+    priority = 10
+    kinds = ("empty",)
+    fast = True
+    lazy = True
+
+    def complete(self, context):
+        return context.completer._lazy_commands(no_sudo=context.text == "sudo ")
+
+
+class FilePickerSource(CompletionSource):
+    name = "file_picker"
+    priority = 10
+    kinds = ("picker",)
+    timed = False
+
+    def complete(self, context):
+        return context.completer._complete_fuzzy_path(context.fragment, context.cwd, display_meta="FILE")
+
+
+class AITranslationSource(CompletionSource):
+    name = "ai_translation"
+    priority = 10
+    kinds = ("ai",)
+    timed = False
+    # The same request in the same place gets the same answer for a while
+    cache_by_cwd = True
+    ttl = 60
+
+    def key(self, context):
+        return context.text
+
+    def complete(self, context):
+        return context.completer._complete_ai_translation(context.text)
+
+
+class AISuggestionSource(AITranslationSource):
+    name = "ai"
+    priority = 20
+
+    def complete(self, context):
+        return context.completer._complete_ai_suggestions(context.text)
+
+
+def default_sources():
+    return [
+        HistorySource(),
+        BuiltInArgsSource(),
+        BackgroundTaskSource(),
+        EnvVarSource(),
+        GitRefSource(),
+        BuildTargetSource(),
+        PythonPackageSource(),
+        ProcessSource(),
+        MapSource(),
+        PathSource(),
+        FuzzyPathSource(),
+        CommandSource(),
+        LazyCommandSource(),
+        FilePickerSource(),
+        AITranslationSource(),
+        AISuggestionSource(),
+    ]
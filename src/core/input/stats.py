@@ -0,0 +1,130 @@
+import math
+from threading import Lock
+
+
+class LatencyHistogram:
+    """
+    Log-scale latency histogram: four buckets per doubling from 10µs, so any
+    percentile is reported within ~19% of the true value at constant memory.
+    """
+    __slots__ = ("buckets", "count", "total", "max", "candidates", "dropped")
+
+    BASE = 1e-5
+    STEPS_PER_DOUBLING = 4
+    SIZE = 96  # 10µs * 2**24 ≈ 168s, anything slower lands in the last bucket
+
+    def __init__(self):
+        self.buckets = [0] * self.SIZE
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.candidates = 0
+        self.dropped = 0
+
+    @classmethod
+    def _bucket(cls, seconds):
+        if seconds <= cls.BASE:
+            return 0
+        index = int(math.log2(seconds / cls.BASE) * cls.STEPS_PER_DOUBLING) + 1
+        return min(index, cls.SIZE - 1)
+
+    @classmethod
+    def _upper_bound(cls, index):
+        return cls.BASE * 2 ** (index / cls.STEPS_PER_DOUBLING)
+
+    def add(self, seconds, candidates=0):
+        self.buckets[self._bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.candidates += candidates
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket holding the p-th percentile, in seconds.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                if index == self.SIZE - 1:
+                    return self.max
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+
+class CompletionStats:
+    """
+    Session-wide latency of every completion source and the lexer, shown by 'stats completion'.
+    """
+
+    def __init__(self):
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._caches: dict[str, list[int]] = {}  # name -> [hits, misses]
+        self._lock = Lock()
+
+    def _histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds, candidates=0):
+        with self._lock:
+            self._histogram(name).add(seconds, candidates)
+
+    def drop(self, name):
+        """
+        Count a result that missed its deadline and was not shown.
+        """
+        with self._lock:
+            self._histogram(name).dropped += 1
+
+    def cache_hit(self, name):
+        with self._lock:
+            self._caches.setdefault(name, [0, 0])[0] += 1
+
+    def cache_miss(self, name):
+        with self._lock:
+            self._caches.setdefault(name, [0, 0])[1] += 1
+
+    def cache_rows(self):
+        """
+        [name, hits, misses, hit rate %] for every cache that was consulted.
+        """
+        with self._lock:
+            items = sorted(self._caches.items())
+        return [
+            [name, hits, misses, round(100 * hits / (hits + misses), 1)]
+            for name, (hits, misses) in items
+        ]
+
+    def rows(self):
+        """
+        [name, calls, p50 ms, p95 ms, p99 ms, max ms, avg candidates, dropped], busiest first.
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+
+        rows = []
+        for name, h in sorted(items, key=lambda item: -item[1].count):
+            rows.append([
+                name,
+                h.count,
+                *(round(h.percentile(p) * 1000, 2) for p in (50, 95, 99)),
+                round(h.max * 1000, 2),
+                round(h.candidates / h.count, 1) if h.count else 0,
+                h.dropped,
+            ])
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._caches.clear()
+
+
+completion_stats = CompletionStats()
@@ -27,6 +27,7 @@ style_dict = {
 
     # environment & errors
     "env_var": "#5f826b",
+    "env_var.undefined": "#5f826b strike",
     "error": "bold #db5d6b",
 
     # Menu background
@@ -0,0 +1,22 @@
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+
+
+class HistoryAutoSuggest(AutoSuggest):
+    """
+    Fish-style ghost text: the rest of the most likely history entry for the line,
+    from the history's prefix index. Accept it with the right arrow or Ctrl-E.
+    """
+
+    def __init__(self, history, shell):
+        self.history = history
+        self.shell = shell
+
+    def get_suggestion(self, buffer, document):
+        text = document.text
+        if not text.strip() or "\n" in text or not document.is_cursor_at_the_end:
+            return None
+
+        entry = self.history.prefix_index.suggest(text, cwd=self.shell.working_dir)
+        if entry is None:
+            return None
+        return Suggestion(entry[len(text):])
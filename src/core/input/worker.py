@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import time
+from threading import Lock
+from types import SimpleNamespace
+
+from prompt_toolkit.completion import Completion
+from prompt_toolkit.document import Document
+
+from core.environment import environment
+
+
+class _WorkerInputHandler:
+    """
+    Headless stand-in for ShellInput inside the worker process.
+    Ranking stays in the prompt process, so there is no ranker here.
+    """
+
+    def __init__(self, commands, built_ins, history_file, working_dir):
+        from core.indexer import HelpIndexer
+        from .history import IndexedFileHistory
+
+        self.indexer = SimpleNamespace(get_commands=lambda: commands, help_indexer=HelpIndexer())
+        self.history = IndexedFileHistory(history_file)
+        list(self.history.load_history_strings())  # builds history.index
+        self.ranker = None
+        self.shell = SimpleNamespace(
+            working_dir=working_dir,
+            command_handler=SimpleNamespace(command_list=built_ins),
+        )
+
+    @property
+    def history_index(self):
+        return self.history.index
+
+    def reload_help(self):
+        from core.indexer import HelpIndexer
+
+        self.indexer.help_indexer = HelpIndexer()
+
+
+def _latest(conn, message):
+    """
+    Handle everything already queued behind message and return the newest completion
+    request: when typing outpaces the worker, only the last keystroke is answered.
+    """
+    while conn.poll():
+        queued = conn.recv()
+        if queued[0] != "complete":
+            return message, queued
+        message = queued
+    return message, None
+
+
+def _serve(conn, commands, built_ins, history_file, working_dir, ignore_case):
+    from .completer import CommandCompleter
+
+    handler = _WorkerInputHandler(commands, built_ins, history_file, working_dir)
+    completer = CommandCompleter(handler, ignore_case=ignore_case)
+    generation = None
+
+    backlog = []
+    while True:
+        message = backlog.pop(0) if backlog else conn.recv()
+        kind = message[0]
+
+        if kind == "stop":
+            return
+        elif kind == "history":
+            handler.history_index.add(message[1])
+        elif kind == "reload":
+            handler.reload_help()
+        elif kind == "complete":
+            message, interrupted = _latest(conn, message)
+            if interrupted is not None:
+                backlog.append(interrupted)
+
+            _, request_id, text, cwd, env_generation, env = message
+            if env is not None and env_generation != generation:
+                os.environ.clear()
+                os.environ.update(env)
+                environment.bump()
+                generation = env_generation
+            handler.shell.working_dir = cwd
+
+            try:
+                completer._begin(Document(text))
+                sources, keep = completer._plan(text)
+                candidates = completer._collect(text, [s for s in sources if not s.fast and not s.lazy])
+                reply = [
+                    (c.text, c.start_position, c.display_text, c.display_meta_text, c.style)
+                    for c in completer._dedupe(candidates)
+                    if keep is None or keep(c)
+                ]
+            except Exception as e:
+                reply = e
+            conn.send((request_id, reply))
+
+
+class CompletionWorker:
+    """
+    Computes the slow completion sources in a separate process, so heavy completion
+    work never holds the GIL the prompt renders with. Requests are (text, cwd,
+    environment generation); the environment itself is only sent when it changed.
+    """
+
+    def __init__(self, commands, built_ins, history_file, working_dir, ignore_case=True):
+        # spawn everywhere: forking a process that already runs threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(
+            target=_serve,
+            args=(child, commands, built_ins, history_file, working_dir, ignore_case),
+            name="completion-worker",
+            daemon=True,
+        )
+        self._process.start()
+        child.close()
+
+        self._lock = Lock()
+        self._request_id = 0
+        self._sent_generation = None
+        self.alive = True
+
+    def _send(self, message):
+        try:
+            self._conn.send(message)
+        except (OSError, EOFError, ValueError):
+            self.alive = False
+
+    def complete(self, text, cwd, timeout):
+        """
+        Completions for text from the worker, or [] if it did not answer within timeout seconds.
+        """
+        with self._lock:
+            if not self.alive:
+                return []
+            self._request_id += 1
+            request_id = self._request_id
+
+            generation, env = environment.snapshot()
+            if generation == self._sent_generation:
+                env = None
+            self._send(("complete", request_id, text, cwd, generation, env))
+            self._sent_generation = generation
+
+            deadline = time.monotonic() + timeout
+            try:
+                while self._conn.poll(max(0.0, deadline - time.monotonic())):
+                    reply_id, reply = self._conn.recv()
+                    if reply_id != request_id:
+                        continue  # answer to a request that already timed out
+                    if isinstance(reply, Exception):
+                        raise reply
+                    return [
+                        Completion(text, start_position=start, display=display,
+                                   display_meta=meta or None, style=style)
+                        for text, start, display, meta, style in reply
+                    ]
+            except (OSError, EOFError):
+                self.alive = False
+            return []
+
+    def add_history(self, line):
+        with self._lock:
+            self._send(("history", line))
+
+    def reload(self):
+        """
+        Pick up a changed help index (after 'map').
+        """
+        with self._lock:
+            self._send(("reload",))
+
+    def stop(self):
+        with self._lock:
+            self._send(("stop",))
+            self.alive = False
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
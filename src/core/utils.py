@@ -0,0 +1,31 @@
+import os
+from bisect import bisect_left
+
+# Sorts after every real character, closes the bisect range of a prefix
+PREFIX_END = "\U0010ffff"
+
+
+def prefix_range(keys, prefix):
+    """
+    (start, end) of the entries in the sorted list keys that start with prefix.
+    Costs two bisects, however many keys there are.
+    """
+    start = bisect_left(keys, prefix)
+    return start, bisect_left(keys, prefix + PREFIX_END, start)
+
+
+def mtime_ns(path):
+    """
+    The mtime of path in nanoseconds, or None if it cannot be stated.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def stamps_changed(stamps):
+    """
+    True if any path of stamps ({path: mtime_ns}) changed, appeared or disappeared since.
+    """
+    return any(mtime_ns(path) != mtime for path, mtime in stamps.items())
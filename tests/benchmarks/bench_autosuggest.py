@@ -0,0 +1,58 @@
+"""
+Inline suggestion lookup over a synthetic history with a million entries.
+
+Run directly: python tests/benchmarks/bench_autosuggest.py
+"""
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from core.input.history import HistoryPrefixIndex
+
+ENTRIES = 1_000_000
+ROUNDS = 10_000
+COMMANDS = ["git", "docker", "kubectl", "python", "make", "npm", "cargo", "ls", "cd", "grep", "ssh", "vim"]
+CWDS = [f"/home/user/project{i}" for i in range(20)]
+
+
+def make_history(seed=0):
+    rng = random.Random(seed)
+
+    def word():
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+
+    base = time.time() - ENTRIES
+    for i in range(ENTRIES):
+        entry = " ".join([rng.choice(COMMANDS)] + [word() for _ in range(rng.randint(1, 4))])
+        yield entry, rng.choice(CWDS), base + i
+
+
+def main():
+    index = HistoryPrefixIndex()
+    start = time.perf_counter()
+    for entry, cwd, ts in make_history():
+        index.add(entry, cwd=cwd, ts=ts)
+    print(f"{len(index)} unique entries, built in {time.perf_counter() - start:.1f} s")
+
+    rng = random.Random(1)
+    prefixes = [rng.choice(COMMANDS)[:rng.randint(1, 3)] for _ in range(100)]
+    prefixes += [f"{rng.choice(COMMANDS)} {rng.choice(string.ascii_lowercase)}" for _ in range(100)]
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        index.suggest(prefixes[i % len(prefixes)], cwd=CWDS[i % len(CWDS)])
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1e6
+    print(f"suggest             {elapsed:8.1f} us/keystroke")
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        index.add(f"git commit -m 'change {i}'", cwd=CWDS[0])
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1e6
+    print(f"add                 {elapsed:8.1f} us/entry")
+
+
+if __name__ == "__main__":
+    main()
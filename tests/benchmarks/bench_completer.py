@@ -0,0 +1,68 @@
+"""
+Microbenchmarks for CommandCompleter.
+
+Run directly: python tests/benchmarks/bench_completer.py
+"""
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.input.completer import CommandCompleter
+from test_completer import BUILT_INS, FakeInputHandler
+
+COMMAND_COUNT = 20_000
+ROUNDS = 200
+
+
+def make_commands(count, seed=0):
+    rng = random.Random(seed)
+    commands = set()
+    while len(commands) < count:
+        name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12)))
+        if rng.random() < 0.2:
+            name += f".{rng.randint(1, 9)}"
+        commands.add(name)
+    return sorted(commands)
+
+
+def linear_scan(commands, built_ins, text):
+    """The pre-index implementation, kept for comparison."""
+    out = []
+    for cmd in commands:
+        cmd_name = cmd.split(".")[0]
+        if cmd_name.lower().startswith(text.lower()):
+            category = "built_in" if cmd_name in built_ins else "command"
+            out.append((category, cmd_name.split()[0]))
+    return out
+
+
+def bench(label, func, prefixes):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for prefix in prefixes:
+            func(prefix)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (ROUNDS * len(prefixes)) * 1e6
+    print(f"{label:<28} {per_call:10.1f} us/keystroke")
+
+
+def main():
+    commands = make_commands(COMMAND_COUNT)
+    handler = FakeInputHandler(commands, BUILT_INS, ".")
+    completer = CommandCompleter(handler, extra_commands=BUILT_INS, ignore_case=True)
+    all_commands = completer.commands
+    prefixes = ["g", "gi", "git", "pyt", "xq", "abc", "m", "zz"]
+
+    print(f"{COMMAND_COUNT} commands, {ROUNDS} rounds x {len(prefixes)} prefixes")
+    bench("linear scan", lambda p: linear_scan(all_commands, BUILT_INS, p), prefixes)
+    bench("index lookup", completer._complete_command, prefixes)
+    bench("built-in args", lambda p: completer._complete_build_in_arg("bg " + p), prefixes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Fuzzy search over a synthetic 500k-file project index.
+
+Run directly: python tests/benchmarks/bench_file_index.py
+"""
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from core.input.file_index import ProjectFileIndex
+
+FILE_COUNT = 500_000
+QUERIES = ["main", "srcutil", "readme", "xqz", "cfgyaml", "test_api"]
+
+
+def make_paths(count, seed=0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    exts = [".py", ".js", ".md", ".yaml", ".json", ".c", ".h"]
+    paths = set()
+    while len(paths) < count:
+        depth = rng.randint(1, 6)
+        parts = [rng.choice(words) for _ in range(depth)]
+        paths.add("/".join(parts) + rng.choice(exts))
+    return sorted(paths)
+
+
+def main():
+    index = ProjectFileIndex("/synthetic")
+    index._set_paths(make_paths(FILE_COUNT))
+    index.ready = True
+
+    print(f"{FILE_COUNT} files")
+    for query in QUERIES:
+        start = time.perf_counter()
+        results = index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query:<10} {elapsed:8.1f} ms  {len(results)} results")
+
+
+if __name__ == "__main__":
+    main()
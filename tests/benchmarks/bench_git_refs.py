@@ -0,0 +1,62 @@
+"""
+Git ref lookup in a synthetic repository with tens of thousands of refs.
+
+Run directly: python tests/benchmarks/bench_git_refs.py
+"""
+import random
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from core.input.sources.git import GitRefCache
+
+PACKED_REFS = 50_000
+LOOSE_REFS = 500
+ROUNDS = 1000
+SHA = "0" * 40
+
+
+def make_repo(root, seed=0):
+    rng = random.Random(seed)
+    git_dir = root / ".git"
+    (git_dir / "refs/heads/feature").mkdir(parents=True)
+    (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+
+    def name():
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+
+    lines = ["# pack-refs with: peeled fully-peeled sorted"]
+    for i in range(PACKED_REFS):
+        kind = rng.choice(["heads", "tags", "remotes/origin"])
+        lines.append(f"{SHA} refs/{kind}/{name()}-{i}")
+    (git_dir / "packed-refs").write_text("\n".join(lines) + "\n")
+
+    for i in range(LOOSE_REFS):
+        (git_dir / "refs/heads/feature" / f"{name()}-{i}").write_text(SHA)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_repo(root)
+        cache = GitRefCache()
+
+        start = time.perf_counter()
+        cache.refs(root)
+        print(f"{PACKED_REFS + LOOSE_REFS} refs, first load {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        prefixes = ["a", "fe", "feature/k", "mo", "zz", ""]
+        start = time.perf_counter()
+        for i in range(ROUNDS):
+            refs = cache.refs(root)
+            refs.matching(prefixes[i % len(prefixes)])
+        elapsed = (time.perf_counter() - start) / ROUNDS * 1e6
+        print(f"cached lookup       {elapsed:8.1f} us/keystroke")
+
+
+if __name__ == "__main__":
+    main()
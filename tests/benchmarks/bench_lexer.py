@@ -0,0 +1,113 @@
+"""
+Tokenizing and highlighting pasted input of a few megabytes: split_by_linkers and
+split_words should stay linear, so doubling the input roughly doubles the time.
+Re-rendering after an edit should cost about as much as the edited segment, and
+with async validation a render should not wait for path checks at all.
+
+Run directly: python tests/benchmarks/bench_lexer.py
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from core.input.lexer import ShellLexer, split_by_linkers, split_words
+
+SIZES_MB = [1, 2, 4, 8]
+SCRIPT_LINES = 2000
+PIECES = ["echo", "file.txt", "-v", "$HOME", '"a b | c"', "'it''s'", '"esc \\" q"', "&&", "|", "2>", ">>", "x" * 20]
+
+
+def make_line(size, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        piece = rng.choice(PIECES)
+        parts.append(piece)
+        length += len(piece) + 1
+    return " ".join(parts)
+
+
+def tokenize(line):
+    words = 0
+    for kind, value in split_by_linkers(line):
+        if kind == "segment":
+            words += len(split_words(value))
+    return words
+
+
+class _Commands:
+    def get_commands(self):
+        return ["echo"]
+
+
+class _Shell:
+    command_handler = _Commands()
+
+    def __init__(self, working_dir):
+        self.working_dir = working_dir
+
+
+class _Document:
+    def __init__(self, text):
+        self.lines = text.split("\n")
+
+
+def render(lexer, document):
+    get_line = lexer.lex_document(document)
+    return sum(len(get_line(lineno)) for lineno in range(len(document.lines)))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    for size in SIZES_MB:
+        line = make_line(size * 1_000_000)
+        elapsed, words = timed(tokenize, line)
+        print(f"tokenize        {size:2} MB  {elapsed * 1000:8.1f} ms  {elapsed * 1000 / size:6.1f} ms/MB  {words} items")
+
+    # An unterminated quote makes the rest of the input one segment and one word
+    line = "'" + make_line(4_000_000).replace("'", "")
+    elapsed, words = timed(tokenize, line)
+    print(f"open quote       4 MB  {elapsed * 1000:8.1f} ms  {elapsed * 1000 / 4:6.1f} ms/MB  {words} items")
+
+    with tempfile.TemporaryDirectory() as root:
+        lexer = ShellLexer(_Shell(root))
+        for size in SIZES_MB[:2]:
+            document = _Document(make_line(size * 1_000_000, seed=size))
+            elapsed, tokens = timed(lexer.lex_document(document), 0)
+            print(f"highlight       {size:2} MB  {elapsed * 1000:8.1f} ms  {elapsed * 1000 / size:6.1f} ms/MB  {len(tokens)} tokens")
+
+        # The same, with paths resolved by the background worker
+        async_lexer = ShellLexer(_Shell(root), async_validation=True)
+        document = _Document(make_line(1_000_000, seed=3))
+        elapsed, tokens = timed(async_lexer.lex_document(document), 0)
+        print(f"async highlight  1 MB  {elapsed * 1000:8.1f} ms  first render, provisional")
+
+        # A long multi-line command, then one character typed in its middle line
+        lines = [make_line(200, seed=i) for i in range(SCRIPT_LINES)]
+        elapsed, count = timed(render, lexer, _Document("\n".join(lines)))
+        print(f"script    {SCRIPT_LINES} lines  {elapsed * 1000:8.1f} ms  first render, {count} tokens")
+        lines[SCRIPT_LINES // 2] += "x"
+        elapsed, count = timed(render, lexer, _Document("\n".join(lines)))
+        print(f"script    {SCRIPT_LINES} lines  {elapsed * 1000:8.1f} ms  after an edit, {count} tokens")
+
+        # One long line, edited in its middle segment
+        line = " && ".join(make_line(200, seed=i) for i in range(SCRIPT_LINES))
+        elapsed, count = timed(render, lexer, _Document(line))
+        print(f"long line {len(line) // 1000:5} KB  {elapsed * 1000:8.1f} ms  first render, {count} tokens")
+        middle = len(line) // 2
+        elapsed, count = timed(render, lexer, _Document(line[:middle] + "x" + line[middle:]))
+        print(f"long line {len(line) // 1000:5} KB  {elapsed * 1000:8.1f} ms  after an edit, {count} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+First page of path completions in a directory with half a million entries,
+on a cold cache (streamed) and a warm one (bisect).
+
+Run directly: python tests/benchmarks/bench_path_completion.py
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from core.input.dircache import DirectoryCache
+
+ENTRIES = 500_000
+LIMIT = 100
+PREFIXES = ["msg", "msg1", "msg12", "msg4999", "x"]
+
+
+def make_directory(root):
+    for i in range(ENTRIES):
+        open(os.path.join(root, f"msg{i}"), "w").close()
+
+
+def timed(cache, root, prefix):
+    start = time.perf_counter()
+    matches, complete = cache.matching(root, prefix, ignore_case=True, limit=LIMIT)
+    return (time.perf_counter() - start) * 1000, len(matches), complete
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        make_directory(root)
+        print(f"created {ENTRIES} files in {time.perf_counter() - start:.1f} s")
+
+        for prefix in PREFIXES:
+            cache = DirectoryCache()
+            elapsed, count, complete = timed(cache, root, prefix)
+            print(f"cold  {prefix!r:10} {elapsed:8.1f} ms  {count:4} matches  complete={complete}")
+
+            # The background fill replaces the stream on later keystrokes
+            while cache._filling:
+                time.sleep(0.05)
+            elapsed, count, complete = timed(cache, root, prefix)
+            print(f"warm  {prefix!r:10} {elapsed:8.3f} ms  {count:4} matches  complete={complete}")
+
+
+if __name__ == "__main__":
+    main()
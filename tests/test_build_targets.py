@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+from prompt_toolkit.document import Document
+
+from core.input.sources.build import ParseCache, parse_justfile, parse_makefile, parse_package_json
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+MAKEFILE = """\
+CC := gcc
+FLAGS ::= -O2
+URL = http://example.com
+.PHONY: all clean
+all: build test
+build test:: deps
+%.o: %.c
+\t@echo "not: a target"
+$(OUT): x
+install: ; cp a b
+"""
+
+JUSTFILE = """\
+set shell := ["bash", "-c"]
+version := "1.0"
+alias b := build
+
+default:
+    just --list
+
+build target="x" mode='debug': default
+@test *args:
+_helper:
+[private]
+hidden:
+"""
+
+
+def test_parse_makefile():
+    assert parse_makefile(MAKEFILE) == ["all", "build", "test", "install"]
+
+
+def test_parse_justfile():
+    assert parse_justfile(JUSTFILE) == ["b", "default", "build", "test"]
+
+
+def test_parse_package_json():
+    assert parse_package_json('{"scripts": {"dev": "vite", "lint": "eslint ."}}') == ["dev", "lint"]
+    assert parse_package_json("{broken") == []
+    assert parse_package_json('{"name": "x"}') == []
+
+
+def test_parse_cache_reparses_only_on_change(tmp_path):
+    path = tmp_path / "Makefile"
+    path.write_text("a:\n")
+    calls = []
+    cache = ParseCache()
+
+    def parser(text):
+        calls.append(text)
+        return parse_makefile(text)
+
+    assert cache.get(str(path), parser) == ["a"]
+    assert cache.get(str(path), parser) == ["a"]
+    assert len(calls) == 1
+
+    path.write_text("a:\nb:\n")
+    later = time.time() + 5
+    os.utime(path, (later, later))
+    assert cache.get(str(path), parser) == ["a", "b"]
+    assert len(calls) == 2
+
+
+def test_build_targets_are_completed(completer, tmp_path):
+    (tmp_path / "Makefile").write_text(MAKEFILE)
+    (tmp_path / "justfile").write_text(JUSTFILE)
+    (tmp_path / "package.json").write_text(json.dumps({"scripts": {"dev": "vite", "deploy": "x"}}))
+    nested = tmp_path / "packages" / "app"
+    nested.mkdir(parents=True)
+
+    def complete(text, cwd=tmp_path):
+        completer.input_handler.shell.working_dir = str(cwd)
+        return [c for c in completer.get_completions(Document(text), None) if c.display_meta_text.endswith(
+            ("TARGET", "RECIPE", "SCRIPT"))]
+
+    assert texts(complete("make all b")) == ["build"]
+    assert texts(complete("sudo make ")) == ["all", "build", "test", "install"]
+    assert texts(complete("just te")) == ["test"]
+    assert texts(complete("just build ")) == []
+    assert texts(complete("npm run d")) == ["dev", "deploy"]
+    # npm and just look for their file in parent directories, make does not
+    assert texts(complete("npm run de", nested)) == ["dev", "deploy"]
+    assert texts(complete("make ", nested)) == []
+    assert texts(complete("npm install d")) == []
+    assert complete("make") == []
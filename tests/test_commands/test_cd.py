@@ -1,3 +1,4 @@
+from unittest.mock import patch
 from pathlib import Path
 
 def test_cd_to_home(shell_commands):
@@ -74,3 +75,14 @@ def test_cd_with_tilde_expansion_to_subdir(shell_commands):
 
     # cleanup
     subdir.rmdir()
+
+def test_cd_prefetches_new_directory(shell_commands):
+    """Test that 'cd' warms the directory cache for the new working directory."""
+    commands, shell, _ = shell_commands
+    target = Path(shell.working_dir) / "prefetched"
+    target.mkdir()
+
+    with patch("core.input.dircache.dir_cache.prefetch") as prefetch:
+        commands.handle_command(f"cd {target}")
+
+    prefetch.assert_called_once_with(str(target))
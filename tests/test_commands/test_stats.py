@@ -0,0 +1,50 @@
+import pytest
+
+from core.input.stats import completion_stats
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    completion_stats.reset()
+    yield
+    completion_stats.reset()
+
+
+def test_stats_completion_prints_percentiles(shell_commands, capsys):
+    commands, _, _ = shell_commands
+    completion_stats.record("path", 0.003, 4)
+    completion_stats.record("lexer", 0.0002, 7)
+
+    commands.handle_command("stats completion")
+
+    out = capsys.readouterr().out
+    for column in ("Source", "p50 ms", "p95 ms", "p99 ms"):
+        assert column in out
+    assert "path" in out and "lexer" in out
+
+
+def test_stats_completion_prints_cache_hit_rates(shell_commands, capsys):
+    commands, _, _ = shell_commands
+    completion_stats.cache_hit("lexer")
+    completion_stats.cache_miss("lexer")
+
+    commands.handle_command("stats completion")
+
+    out = capsys.readouterr().out
+    assert "Hit Rate %" in out and "50.0" in out
+
+
+def test_stats_completion_without_data(shell_commands, capsys):
+    commands, _, _ = shell_commands
+
+    commands.handle_command("stats completion")
+
+    assert "No completions recorded" in capsys.readouterr().out
+
+
+def test_stats_usage(shell_commands, capsys):
+    commands, _, _ = shell_commands
+
+    commands.handle_command("stats")
+
+    assert "Usage: stats completion" in capsys.readouterr().out
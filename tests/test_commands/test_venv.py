@@ -109,3 +109,18 @@ def test_activate_non_existent_venv(shell_commands, capsys, monkeypatch):
     captured = capsys.readouterr()
     assert "Did not find a valid virtual environment" in captured.out
     assert "Could not find python in" in captured.out
+
+
+def test_deactivate_bumps_environment_generation(shell_commands, monkeypatch):
+    """Test that 'deactivate' invalidates environment snapshots."""
+    from core.environment import environment
+
+    commands, shell, _ = shell_commands
+    monkeypatch.setitem(os.environ, "VIRTUAL_ENV", str(Path(shell.working_dir) / "venv"))
+    generation, _ = environment.snapshot()
+
+    commands.handle_command("deactivate")
+
+    new_generation, snapshot = environment.snapshot()
+    assert new_generation == generation + 1
+    assert "VIRTUAL_ENV" not in snapshot
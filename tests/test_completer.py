@@ -0,0 +1,385 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from prompt_toolkit.document import Document
+
+from core.input.completer import CommandCompleter
+from core.indexer import HelpIndexer
+from core.input.history import HistoryTokenIndex
+
+
+class FakeHelpIndexer:
+    def get_suggested(self, line):
+        return {}
+
+
+class FakeIndexer:
+    def __init__(self, commands):
+        self.commands = commands
+        self.help_indexer = FakeHelpIndexer()
+
+    def get_commands(self):
+        return self.commands
+
+
+class FakeInputHandler:
+    def __init__(self, commands, built_ins, working_dir, history=None):
+        self.indexer = FakeIndexer(commands)
+        self.history = history or []
+        self.history_index = HistoryTokenIndex()
+        self.history_index.rebuild(self.history)
+        self.ranker = None
+        self.shell = SimpleNamespace(
+            working_dir=working_dir,
+            command_handler=SimpleNamespace(command_list=built_ins),
+        )
+
+    def get_history(self):
+        return self.history
+
+
+BUILT_INS = ["cd", "bg", "bg tasks", "bg kill", "bg output", "instr", "instr add", "instr list"]
+
+
+@pytest.fixture
+def completer(tmp_path):
+    commands = ["git", "gitk", "grep", "python3.11", "Gzip", "sudo", "sed"]
+    handler = FakeInputHandler(commands, BUILT_INS, str(tmp_path))
+    return CommandCompleter(handler, extra_commands=BUILT_INS, ignore_case=True)
+
+
+def texts(completions):
+    return [c.text for c in completions]
+
+
+def test_command_prefix_lookup(completer):
+    assert texts(completer._complete_command("gi")) == ["git", "gitk"]
+    assert texts(completer._complete_command("G")) == ["git", "gitk", "grep", "Gzip"]
+    assert texts(completer._complete_command("python")) == ["python3"]
+    assert completer._complete_command("zzz") == []
+
+
+def test_command_categories_and_order(completer):
+    completions = completer._complete_command("")
+    styles = [c.style for c in completions]
+
+    assert completions[0].text == "sudo"
+    assert styles.index("class:built_in") < styles.index("class:command")
+    assert texts(completions).count("instr") == 1
+    assert "sudo" not in texts(completer._complete_command("", no_sudo=True))
+
+
+def test_built_in_args(completer):
+    assert texts(completer._complete_build_in_arg("bg ")) == ["tasks", "kill", "output"]
+    assert texts(completer._complete_build_in_arg("bg k")) == ["kill"]
+    assert texts(completer._complete_build_in_arg("instr l")) == ["list"]
+    assert completer._complete_build_in_arg("cd ") == []
+
+
+def test_get_completions_first_word(completer):
+    completions = list(completer.get_completions(Document("gi"), None))
+
+    assert texts(completions) == ["git", "gitk"]
+
+
+def test_path_completion_allows_dots(completer, tmp_path):
+    (tmp_path / ".hidden").write_text("x")
+    (tmp_path / "archive.tar.gz").write_text("x")
+    (tmp_path / "src").mkdir()
+
+    assert texts(completer._complete_path("ls .h", str(tmp_path))) == [".hidden"]
+    assert texts(completer._complete_path("ls archive.t", str(tmp_path))) == ["archive.tar.gz"]
+    assert texts(completer._complete_path("ls s", str(tmp_path))) == ["src" + os.sep]
+
+
+def test_history_completion_uses_previous_token(tmp_path):
+    history = ["git commit -m fix", "git checkout main", "docker compose up", "git checkout dev"]
+    handler = FakeInputHandler(["git", "docker"], BUILT_INS, str(tmp_path), history=history)
+    completer = CommandCompleter(handler, ignore_case=True)
+
+    after_git = completer._complete_history("git ", 0, 1, "git", str(tmp_path))
+    partial = completer._complete_history("git checkout d", 0, 3, "d", str(tmp_path))
+
+    assert texts(after_git) == ["checkout", "commit"]
+    assert texts(partial) == ["dev"]
+    assert partial[0].start_position == -1
+
+
+def test_history_completion_skips_missing_paths(tmp_path):
+    (tmp_path / "real").mkdir()
+    history = ["cat ./real/file", "cat /no/such/dir/file"]
+    handler = FakeInputHandler(["cat"], BUILT_INS, str(tmp_path), history=history)
+    completer = CommandCompleter(handler, ignore_case=True)
+
+    assert texts(completer._complete_history("cat ", 0, 1, "cat", str(tmp_path))) == ["./real/file"]
+
+
+def test_extending_a_token_narrows_cached_candidates(completer, monkeypatch):
+    calls = []
+    original = completer._complete_command
+    monkeypatch.setattr(completer, "_complete_command", lambda text: calls.append(text) or original(text))
+
+    list(completer.get_completions(Document("g"), None))
+    narrowed = list(completer.get_completions(Document("gi"), None))
+
+    assert calls == ["g"]
+    assert texts(narrowed) == ["git", "gitk"]
+    assert all(c.start_position == -2 for c in narrowed)
+
+
+def test_deletion_recomputes(completer, monkeypatch):
+    calls = []
+    original = completer._complete_command
+    monkeypatch.setattr(completer, "_complete_command", lambda text: calls.append(text) or original(text))
+
+    list(completer.get_completions(Document("gi"), None))
+    list(completer.get_completions(Document("g"), None))
+    list(completer.get_completions(Document("gr"), None))
+
+    assert calls == ["gi", "g"]
+
+
+def test_typing_into_a_map_subcommand_follows_its_branch(completer):
+    help_indexer = HelpIndexer(json_path=os.devnull)
+    help_indexer.data = {"git": {
+        "subcommands": ["commit", "clone"],
+        "branches": {"commit": {"subcommands": ["amendx"]}},
+    }}
+    completer.help_indexer.help_indexer = help_indexer
+
+    text = "git c"
+    list(completer.get_completions(Document(text), None))
+    for ch in "ommit":
+        text += ch
+        typed = texts(completer.get_completions(Document(text), None))
+
+    assert "amendx" in typed
+    assert "commit" not in typed
+
+
+def test_line_without_any_source_has_no_completions(completer):
+    completer.sources = [source for source in completer.sources if source.kinds != ("line",)]
+
+    assert list(completer.get_completions(Document("ls foo"), None)) == []
+    assert collect_async(completer, "ls foo") == []
+
+
+def test_cd_invalidates_narrowed_paths(completer, tmp_path):
+    (tmp_path / "alpha").mkdir()
+    other = tmp_path / "alpha"
+    (other / "apple").write_text("x")
+
+    assert texts(list(completer.get_completions(Document("ls a"), None))) == ["alpha" + os.sep]
+
+    completer.input_handler.shell.working_dir = str(other)
+    assert texts(list(completer.get_completions(Document("ls ap"), None))) == ["apple"]
+
+
+def test_slow_source_is_dropped(completer, tmp_path, monkeypatch):
+    import time
+
+    (tmp_path / "notes.txt").write_text("x")
+    monkeypatch.setattr("config.COMPLETION_SOURCE_BUDGET_MS", 50)
+    monkeypatch.setattr(completer, "_complete_history", lambda *args: time.sleep(0.5) or [])
+
+    started = time.monotonic()
+    completions = completer.complete_deterministic("n", "cat n", token_index=2, tool_index=0)
+
+    assert time.monotonic() - started < 0.4
+    assert texts(completions) == ["notes.txt"]
+
+
+def test_stale_results_are_dropped(completer, tmp_path, monkeypatch):
+    (tmp_path / "notes.txt").write_text("x")
+    monkeypatch.setattr(CommandCompleter, "_is_stale", staticmethod(lambda text: True))
+
+    assert completer.complete_deterministic("n", "cat n", token_index=2, tool_index=0) == []
+
+
+def test_debounce_skips_outdated_requests(completer, monkeypatch):
+    from prompt_toolkit.completion import CompleteEvent
+
+    monkeypatch.setattr("config.COMPLETION_DEBOUNCE_MS", 1)
+    monkeypatch.setattr(CommandCompleter, "_is_stale", staticmethod(lambda text: True))
+
+    typing = CompleteEvent(text_inserted=True)
+    requested = CompleteEvent(completion_requested=True)
+
+    assert list(completer.get_completions(Document("gi"), typing)) == []
+    assert texts(completer.get_completions(Document("gi"), requested)) == ["git", "gitk"]
+
+
+def collect_async(completer, text, limit=None):
+    import asyncio
+
+    async def run():
+        out = []
+        generator = completer.get_completions_async(Document(text), None)
+        async for c in generator:
+            out.append(c)
+            if limit is not None and len(out) >= limit:
+                await generator.aclose()
+                break
+        return out
+
+    return asyncio.run(run())
+
+
+def test_async_streams_fast_sources_first(completer, tmp_path, monkeypatch):
+    import time
+
+    (tmp_path / "gizmo").mkdir()
+    monkeypatch.setattr("config.COMPLETION_SOURCE_BUDGET_MS", 1000)
+    original = completer._complete_path
+    monkeypatch.setattr(completer, "_complete_path", lambda *args: time.sleep(0.1) or original(*args))
+
+    completions = collect_async(completer, "gi")
+
+    assert texts(completions) == ["git", "gitk", "gizmo" + os.sep]
+
+
+def test_async_close_cancels_pending_sources(completer, monkeypatch):
+    import time
+
+    monkeypatch.setattr("config.COMPLETION_SOURCE_BUDGET_MS", 5000)
+    monkeypatch.setattr(completer, "_complete_history", lambda *args: time.sleep(0.3) or [])
+
+    started = time.monotonic()
+    completions = collect_async(completer, "gi", limit=1)
+
+    assert texts(completions) == ["git"]
+    assert time.monotonic() - started < 0.25
+
+
+def test_completions_are_ranked_and_acceptance_tracked(completer, tmp_path):
+    from core.input.ranking import FrecencyRanker
+
+    completer.input_handler.ranker = FrecencyRanker(str(tmp_path / "rank"))
+    completer.input_handler.ranker.record("gitk")
+
+    assert texts(completer.get_completions(Document("gi"), None)) == ["gitk", "git"]
+    assert completer.accepted_completions("gitk --all") == ["gitk"]
+    assert completer.accepted_completions("gitk --all") == []
+
+
+@pytest.fixture
+def huge_completer(tmp_path):
+    commands = [f"tool{i:05d}" for i in range(20_000)] + ["sudo"]
+    handler = FakeInputHandler(commands, BUILT_INS, str(tmp_path))
+    return CommandCompleter(handler, extra_commands=BUILT_INS, ignore_case=True)
+
+
+def test_empty_line_is_generated_lazily_in_ranked_order(huge_completer, tmp_path, monkeypatch):
+    from itertools import islice
+    from core.input.ranking import FrecencyRanker
+
+    huge_completer.input_handler.ranker = FrecencyRanker(str(tmp_path / "rank"))
+    huge_completer.input_handler.ranker.record("tool19999")
+    huge_completer.input_handler.ranker.record("not-a-command")
+
+    built = []
+    original = huge_completer._iter_commands
+    monkeypatch.setattr(huge_completer, "_iter_commands", lambda *a, **kw: (
+        built.append(c) or c for c in original(*a, **kw)
+    ))
+
+    first = list(islice(huge_completer.get_completions(Document(""), None), 3))
+
+    assert texts(first) == ["tool19999", "sudo", "bg"]
+    assert len(built) <= 2 * huge_completer._menu_page_size()
+    assert "sudo" not in texts(islice(huge_completer.get_completions(Document("sudo "), None), 50))
+
+
+def test_empty_line_ranking_is_reused_until_the_ranker_changes(huge_completer, tmp_path):
+    from itertools import islice
+    from core.input.ranking import FrecencyRanker
+
+    ranker = huge_completer.input_handler.ranker = FrecencyRanker(str(tmp_path / "rank"))
+    ranker.record("tool00001", ts=1)
+    ranker.record("tool00002", ts=2)
+
+    def first():
+        return texts(islice(huge_completer.get_completions(Document(""), None), 2))
+
+    assert first() == ["tool00002", "tool00001"]
+    ranked = huge_completer._scored_commands()
+    assert huge_completer._scored_commands() is ranked
+
+    ranker.record("tool00001", ts=3)
+    assert first() == ["tool00001", "tool00002"]
+
+
+def test_async_empty_line_stops_after_two_pages(huge_completer):
+    page = huge_completer._menu_page_size()
+
+    completions = collect_async(huge_completer, "")
+
+    assert len(completions) == 2 * page
+    assert texts(completions[:2]) == ["sudo", "bg"]
+
+
+def test_empty_line_menu_grows_on_scroll(huge_completer):
+    from prompt_toolkit.buffer import Buffer, CompletionState
+
+    page = huge_completer._menu_page_size()
+    buffer = Buffer()
+    state = buffer.complete_state = CompletionState(Document(""), collect_async(huge_completer, ""))
+
+    huge_completer.more_completions(buffer)
+    assert len(state.completions) == 2 * page  # nothing selected yet
+
+    state.go_to_index(page - 1)
+    huge_completer.more_completions(buffer)
+    assert len(state.completions) == 2 * page
+
+    state.go_to_index(page)  # scrolled into the last page
+    huge_completer.more_completions(buffer)
+    assert len(state.completions) == 3 * page
+    assert len({c.text for c in state.completions}) == 3 * page
+
+    buffer.complete_state = CompletionState(Document("g"), state.completions[:])
+    buffer.complete_state.go_to_index(3 * page - 1)
+    huge_completer.more_completions(buffer)  # another menu
+    assert len(buffer.complete_state.completions) == 3 * page
+
+
+def test_truncated_path_matches_are_recomputed(completer, tmp_path, monkeypatch):
+    monkeypatch.setattr("config.PATH_COMPLETION_LIMIT", 3)
+    for name in ["log1", "log2", "log3", "log4", "logz"]:
+        (tmp_path / name).write_text("x")
+
+    # Any three: the scan stops at the limit, in directory order
+    shown = texts(completer._complete_path("cat lo", str(tmp_path)))
+    assert len(shown) == 3 and shown == sorted(shown)
+    # Narrowing the three shown could lose logz
+    assert texts(completer._complete_path("cat logz", str(tmp_path))) == ["logz"]
+
+
+def test_cut_short_path_scan_restarts_completion_once_listed(completer, tmp_path, monkeypatch):
+    import threading
+    from core.input import completer as completer_module
+
+    monkeypatch.setattr("config.PATH_STREAM_THRESHOLD", 10)
+    for i in range(100):
+        (tmp_path / f"file{i:03}").write_text("x")
+    (tmp_path / "zeta.txt").write_text("x")
+
+    restarted = threading.Event()
+    buffer = SimpleNamespace(document=Document("cat ze"), complete_state=object(),
+                             start_completion=lambda **kwargs: restarted.set())
+    loop = SimpleNamespace(is_closed=lambda: False, call_soon_threadsafe=lambda func: func())
+    app = SimpleNamespace(current_buffer=buffer, loop=loop)
+    monkeypatch.setattr(completer_module, "get_app_or_none", lambda: app)
+
+    release = threading.Event()
+    original = completer_module.dir_cache._scan
+    monkeypatch.setattr(completer_module.dir_cache, "_scan", lambda *args: release.wait(5) and original(*args))
+
+    assert texts(completer.get_completions(Document("cat ze"), None)) in ([], ["zeta.txt"])
+    assert not restarted.is_set()
+
+    release.set()
+    assert restarted.wait(5)
+    assert buffer.complete_state is None
+    assert texts(completer.get_completions(Document("cat ze"), None)) == ["zeta.txt"]
@@ -0,0 +1,100 @@
+import os
+import time
+
+from prompt_toolkit.completion import Completion
+from prompt_toolkit.document import Document
+
+from core.environment import environment
+from core.input import completer as completer_module
+from core.input.sources import CompletionSource
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+
+class CountingSource(CompletionSource):
+    name = "counting"
+    priority = 35
+
+    def __init__(self, watched=(), **declared):
+        self.calls = 0
+        self.watched = watched
+        for attr, value in declared.items():
+            setattr(self, attr, value)
+
+    def applies(self, context):
+        return context.command == "deploy"
+
+    def key(self, context):
+        return context.text
+
+    def watched_files(self, context):
+        return self.watched
+
+    def complete(self, context):
+        self.calls += 1
+        return [Completion(f"target{self.calls}", start_position=-len(context.fragment))]
+
+
+def test_registered_source_is_triggered_and_ordered(completer):
+    source = CountingSource()
+    completer.register_source(source)
+
+    line_sources = [s.name for s in completer.sources if "line" in s.kinds]
+    assert line_sources[:2] == ["history", "built_in_args"]
+    assert line_sources[line_sources.index("map"):][:3] == ["map", "counting", "path"]
+    assert texts(completer.get_completions(Document("deploy "), None)) == ["target1"]
+    assert source.calls == 1
+
+    list(completer.get_completions(Document("git "), None))
+    assert source.calls == 1
+
+
+def test_declared_cache_keys_memoize(completer, tmp_path):
+    manifest = tmp_path / "targets"
+    manifest.write_text("x")
+    source = CountingSource(watched=(str(manifest),), cache_by_cwd=True, cache_by_env=True)
+    completer.register_source(source)
+
+    def run(text="deploy "):
+        return texts(completer.get_completions(Document(text), None))
+
+    assert run() == ["target1"]
+    assert run() == ["target1"]
+
+    later = time.time() + 5
+    os.utime(manifest, (later, later))
+    assert run() == ["target2"]
+
+    environment.bump()
+    assert run() == ["target3"]
+
+    completer.input_handler.shell.working_dir = str(tmp_path / "elsewhere")
+    assert run() == ["target4"]
+    assert run("deploy t") == ["target5"]
+
+
+def test_ttl_expires_memoized_results(completer):
+    source = CountingSource(ttl=0.05)
+    completer.register_source(source)
+
+    list(completer.get_completions(Document("deploy "), None))
+    list(completer.get_completions(Document("deploy "), None))
+    assert source.calls == 1
+
+    time.sleep(0.06)
+    list(completer.get_completions(Document("deploy "), None))
+    assert source.calls == 2
+
+
+def test_sources_are_chosen_by_kind(completer, monkeypatch):
+    def names(text):
+        return [s.name for s in completer._plan(text)[0]]
+
+    assert names("") == ["command"]
+    assert names("git st") == ["history", "built_in_args", "map", "path"]
+
+    monkeypatch.setattr(completer_module, "ai_mode", True)
+    assert names("list files") == ["ai_translation", "ai"]
+    monkeypatch.setattr(completer_module, "ai_mode", False)
+
+    monkeypatch.setattr(completer_module, "picker_mode", True)
+    assert names("vim ma") == ["file_picker"]
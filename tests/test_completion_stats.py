@@ -0,0 +1,56 @@
+from core.input.stats import CompletionStats, LatencyHistogram
+
+
+def test_histogram_percentiles_are_close_to_the_samples():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000, candidates=2)
+
+    assert histogram.count == 100
+    assert histogram.candidates == 200
+    for p in (50, 95, 99):
+        expected = p / 1000
+        assert expected <= histogram.percentile(p) <= expected * 1.2
+    assert histogram.percentile(100) == histogram.max == 0.1
+
+
+def test_histogram_handles_extremes():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0.0
+
+    histogram.add(0.0)
+    histogram.add(10_000.0)
+    assert histogram.percentile(50) <= LatencyHistogram.BASE
+    assert histogram.percentile(99) == 10_000.0
+
+
+def test_rows_report_each_source_busiest_first():
+    stats = CompletionStats()
+    stats.record("path", 0.002, 10)
+    stats.record("path", 0.004, 20)
+    stats.record("history", 0.001, 1)
+    stats.drop("history")
+
+    rows = stats.rows()
+
+    assert [row[0] for row in rows] == ["path", "history"]
+    name, calls, p50, p95, p99, worst, candidates, dropped = rows[0]
+    assert calls == 2 and candidates == 15.0 and dropped == 0
+    assert p50 <= p95 <= p99 <= worst == 4.0
+    assert rows[1][-1] == 1
+
+    stats.reset()
+    assert stats.rows() == []
+
+
+def test_cache_rows_report_hit_rate():
+    stats = CompletionStats()
+    assert stats.cache_rows() == []
+
+    for _ in range(3):
+        stats.cache_hit("lexer")
+    stats.cache_miss("lexer")
+
+    assert stats.cache_rows() == [["lexer", 3, 1, 75.0]]
+    stats.reset()
+    assert stats.cache_rows() == []
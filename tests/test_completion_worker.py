@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from core.environment import environment
+from core.input.completer import CommandCompleter
+from core.input.worker import CompletionWorker
+from test_completer import BUILT_INS, FakeInputHandler, texts
+
+
+@pytest.fixture
+def worker(tmp_path):
+    history_file = tmp_path / "history"
+    history_file.write_text("\n# 2024-01-01 00:00:00.000000\n+make build\n")
+    worker = CompletionWorker(["git", "make", "cat"] + BUILT_INS, BUILT_INS, str(history_file), str(tmp_path))
+    # Wait for the process to start and import everything
+    (tmp_path / "warmup").write_text("x")
+    deadline = time.monotonic() + 30
+    while not worker.complete("cat warm", str(tmp_path), timeout=1) and time.monotonic() < deadline:
+        pass
+    yield worker
+    worker.stop()
+
+
+def test_worker_completes_paths_and_history(worker, tmp_path):
+    (tmp_path / "notes.txt").write_text("x")
+
+    assert texts(worker.complete("cat no", str(tmp_path), timeout=5)) == ["notes.txt"]
+    assert "build" in texts(worker.complete("make ", str(tmp_path), timeout=5))
+
+    worker.add_history("make clean")
+    assert "clean" in texts(worker.complete("make ", str(tmp_path), timeout=5))
+
+
+def test_worker_follows_environment_generation(worker, tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    (home / "dotfile").write_text("x")
+
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "dotrc").write_text("x")
+
+    monkeypatch.setitem(os.environ, "HOME", str(home))
+    environment.bump()
+    try:
+        assert texts(worker.complete("cat ~/dot", str(tmp_path), timeout=5)) == ["dotfile"]
+        monkeypatch.setitem(os.environ, "HOME", str(other))
+        environment.bump()
+        assert texts(worker.complete("cat ~/dot", str(tmp_path), timeout=5)) == ["dotrc"]
+    finally:
+        monkeypatch.undo()
+        environment.bump()
+
+
+def test_completer_delegates_slow_sources_to_worker(worker, tmp_path):
+    (tmp_path / "gizmo").mkdir()
+    handler = FakeInputHandler(["git", "gitk"], BUILT_INS, str(tmp_path))
+    completer = CommandCompleter(handler, extra_commands=BUILT_INS, ignore_case=True)
+    completer.worker = worker
+
+    sources, _ = completer._plan("gi")
+
+    assert [source.name for source in sources] == ["built_in_args", "command", "worker"]
+    assert texts(completer._collect("gi", sources)) == ["git", "gitk", "gizmo" + os.sep]
+
+
+def test_dead_worker_falls_back_to_local_sources(worker, tmp_path):
+    handler = FakeInputHandler(["git"], BUILT_INS, str(tmp_path))
+    completer = CommandCompleter(handler, extra_commands=BUILT_INS, ignore_case=True)
+    completer.worker = worker
+    worker.stop()
+
+    sources, _ = completer._plan("gi")
+
+    assert "worker" not in [source.name for source in sources]
+    assert worker.complete("gi", str(tmp_path), timeout=0.1) == []
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+
+import config
+from core.input.dircache import MISSING, DirectoryCache, PathResolver, PathStatus
+
+
+def test_listing_records_entry_types(tmp_path):
+    (tmp_path / "file.txt").write_text("x")
+    (tmp_path / "sub").mkdir()
+    cache = DirectoryCache(max_size=4)
+
+    listing = cache.listing(tmp_path)
+
+    assert listing.names == ["file.txt", "sub"]
+    assert listing.is_dir("sub")
+    assert not listing.is_dir("file.txt")
+
+
+def test_listing_is_reused_until_mtime_changes(tmp_path):
+    cache = DirectoryCache(max_size=4)
+    first = cache.listing(tmp_path)
+
+    assert cache.listing(tmp_path) is first
+
+    (tmp_path / "new").write_text("x")
+    later = time.time() + 5
+    os.utime(tmp_path, (later, later))
+
+    refreshed = cache.listing(tmp_path)
+    assert refreshed is not first
+    assert "new" in refreshed
+
+
+def test_cache_is_bounded(tmp_path):
+    cache = DirectoryCache(max_size=2)
+    dirs = []
+    for name in "abc":
+        (tmp_path / name).mkdir()
+        dirs.append(tmp_path / name)
+        cache.listing(tmp_path / name)
+
+    assert len(cache._listings) == 2
+    assert str(dirs[0]) not in cache._listings
+
+
+def test_missing_and_unlistable_paths(tmp_path):
+    cache = DirectoryCache(max_size=4)
+    (tmp_path / "file.txt").write_text("x")
+
+    assert cache.listing(tmp_path / "missing") is None
+    assert cache.listing(tmp_path / "file.txt") is None
+
+
+def test_listing_matching_uses_sorted_names(tmp_path):
+    for name in ["Makefile", "main.py", "mod", "readme"]:
+        (tmp_path / name).write_text("x")
+    listing = DirectoryCache(max_size=4).listing(tmp_path)
+
+    assert listing.matching("m") == ["main.py", "mod"]
+    assert listing.matching("m", ignore_case=True) == ["main.py", "Makefile", "mod"]
+    assert listing.matching("M", ignore_case=True, limit=2) == ["main.py", "Makefile"]
+    assert listing.matching("x") == []
+    assert "mod" in listing and "mo" not in listing
+
+
+def test_small_directories_are_listed_and_cached(tmp_path):
+    (tmp_path / "alpha").mkdir()
+    (tmp_path / "apple").write_text("x")
+    cache = DirectoryCache(max_size=4)
+
+    assert cache.matching(tmp_path, "a", limit=1) == ([("alpha", True)], False)
+    assert cache.matching(tmp_path, "a", limit=5) == ([("alpha", True), ("apple", False)], True)
+    assert str(tmp_path) in cache._listings
+
+
+def test_large_directories_are_streamed_then_filled(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PATH_STREAM_THRESHOLD", 10)
+    for i in range(100):
+        (tmp_path / f"file{i:03}").write_text("x")
+    cache = DirectoryCache(max_size=4)
+    filled = threading.Event()
+    original = cache._store
+    monkeypatch.setattr(cache, "_store", lambda *args: (original(*args), filled.set())[0])
+
+    matches, complete = cache.matching(tmp_path, "file", limit=5)
+
+    assert len(matches) == 5 and not complete
+    assert matches == sorted(matches)
+    assert filled.wait(5)
+    assert cache.matching(tmp_path, "file", limit=5)[0] == [(f"file{i:03}", False) for i in range(5)]
+    assert cache.matching(tmp_path, "file050", limit=5) == ([("file050", False)], True)
+
+
+def test_generation_moves_only_on_changes(tmp_path):
+    cache = DirectoryCache(max_size=4)
+    start = cache.generation
+
+    cache.listing(tmp_path)
+    assert cache.generation == start + 1
+    cache.listing(tmp_path)
+    cache.listing(tmp_path / "missing")
+    assert cache.generation == start + 1
+
+    cache.touch()
+    assert cache.generation == start + 2
+
+
+def test_resolver_answers_a_batch_per_parent(tmp_path, monkeypatch):
+    (tmp_path / "file.txt").write_text("x")
+    (tmp_path / "sub").mkdir()
+    cache = DirectoryCache(max_size=4)
+    resolver = PathResolver(cache)
+    lookups = []
+    original = cache.listing
+    monkeypatch.setattr(cache, "listing", lambda path, strict=False: lookups.append(path) or original(path, strict))
+
+    root = str(tmp_path)
+    statuses = resolver.resolve([
+        os.path.join(root, "file.txt"),
+        os.path.join(root, "fi"),
+        os.path.join(root, "sub"),
+        os.path.join(root, "sub", ""),
+        os.path.join(root, "nothing"),
+        os.path.join(root, "file.txt", ""),
+        os.path.join(root, "missing", "x"),
+    ])
+
+    assert statuses == [
+        PathStatus(True, True, False),
+        PathStatus(False, True, False),
+        PathStatus(True, True, True),
+        PathStatus(True, True, True),
+        MISSING,
+        PathStatus(False, False, False, error=True),
+        MISSING,
+    ]
+    assert sorted(lookups) == sorted({root, os.path.join(root, "sub"), os.path.join(root, "file.txt"),
+                                      os.path.join(root, "missing")})
+
+
+def test_slow_listing_of_a_healthy_directory_is_not_marked_slow(tmp_path, monkeypatch):
+    from core.input.fsguard import fs_guard
+
+    (tmp_path / "f000001").write_text("x")
+    monkeypatch.setattr(config, "FS_PROBE_TIMEOUT_MS", 20)
+    cache = DirectoryCache()
+    original = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda *args, **kwargs: time.sleep(0.1) or original(*args, **kwargs))
+    fs_guard.reset()
+
+    statuses = PathResolver(cache).resolve([str(tmp_path / "f000001")])
+
+    assert statuses == [PathStatus(True, True, False)]
+    assert not fs_guard.is_slow(str(tmp_path))
+
+
+def test_hung_listing_holds_up_callers_once(tmp_path, monkeypatch):
+    (tmp_path / "f000001").write_text("x")
+    monkeypatch.setattr(config, "FS_SCAN_TIMEOUT_MS", 50)
+    cache = DirectoryCache()
+    released = threading.Event()
+    original = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda *args, **kwargs: released.wait(5) and original(*args, **kwargs))
+
+    started = time.monotonic()
+    assert cache.listing(str(tmp_path)) is None
+    assert PathResolver(cache).resolve([str(tmp_path / "f000001")]) == [MISSING]
+    assert time.monotonic() - started < 1
+
+    generation = cache.generation
+    released.set()
+    deadline = time.monotonic() + 5
+    while cache.generation == generation and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "f000001" in cache.listing(str(tmp_path))
+
+
+def test_streamed_scan_stops_once_the_limit_matched(tmp_path, monkeypatch):
+    for i in range(100):
+        (tmp_path / f"file{i:03}").write_text("x")
+    cache = DirectoryCache(max_size=4)
+    monkeypatch.setattr(cache, "prefetch", lambda path: None)
+
+    matches, complete = cache.matching(tmp_path, "file", limit=5)
+
+    assert len(matches) == 5 and not complete
+    assert str(tmp_path) not in cache._listings  # stopped before listing it all
+    assert cache.matching(tmp_path, "file042", limit=5) == ([("file042", False)], True)
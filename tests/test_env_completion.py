@@ -0,0 +1,41 @@
+import os
+
+from prompt_toolkit.document import Document
+
+from core.environment import EnvironmentSnapshot, environment
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+
+def test_snapshot_is_copied_once_per_generation(monkeypatch):
+    snapshot = EnvironmentSnapshot()
+    monkeypatch.setenv("TS_FIRST", "1")
+    assert snapshot.matching("TS_F") == ["TS_FIRST"]
+    _, environ = snapshot.snapshot()
+
+    monkeypatch.setenv("TS_FIRST_TOO", "2")
+    assert snapshot.matching("TS_F") == ["TS_FIRST"]
+    assert snapshot.snapshot()[1] is environ
+
+    snapshot.bump()
+    assert snapshot.matching("TS_F") == ["TS_FIRST", "TS_FIRST_TOO"]
+    assert "TS_FIRST_TOO" in snapshot
+    assert snapshot.get("TS_FIRST_TOO") == "2"
+
+
+def test_env_vars_are_completed(completer, monkeypatch):
+    monkeypatch.setenv("TS_HOME", "/home/ts")
+    monkeypatch.setenv("TS_HOST", "x" * 100)
+    environment.bump()
+
+    def complete(text):
+        return [c for c in completer.get_completions(Document(text), None) if c.style == "class:env_var"]
+
+    assert texts(complete("echo $TS_HO")) == ["$TS_HOME", "$TS_HOST"]
+    assert complete("echo $TS_HO")[0].start_position == -len("$TS_HO")
+    assert complete("echo $TS_HOM")[0].display_meta_text == "/home/ts"
+    assert complete("echo $TS_HOS")[0].display_meta_text.endswith("...")
+    assert texts(complete("ls ${TS_HOM")) == ["${TS_HOME}"]
+    assert texts(complete("cp --to=$TS_HOM")) == ["$TS_HOME"]
+    assert complete("echo $TS_HOME/") == []
+    assert complete("echo TS_HO") == []
+    assert len(complete("echo $")) == len(os.environ)
@@ -0,0 +1,147 @@
+import os
+import time
+
+import pytest
+
+from core.input import file_index
+from core.input.file_index import GitIgnore, ProjectFileIndex, find_project_root
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / ".git").mkdir(parents=True)
+    (root / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (root / ".gitignore").write_text("build/\n*.log\n!keep.log\n")
+    (root / "src" / "core").mkdir(parents=True)
+    (root / "src" / "core" / "main.py").write_text("")
+    (root / "src" / "core" / "utils.py").write_text("")
+    (root / "src" / ".gitignore").write_text("/generated.py\n")
+    (root / "src" / "generated.py").write_text("")
+    (root / "build").mkdir()
+    (root / "build" / "main.o").write_text("")
+    (root / "debug.log").write_text("")
+    (root / "keep.log").write_text("")
+    (root / "README.md").write_text("")
+    return root
+
+
+def indexed(index):
+    return sorted(index.search("", limit=100))
+
+
+def test_gitignore_rules():
+    ignore = GitIgnore(["*.pyc", "/dist", "docs/**/*.tmp", "cache/", "!important.pyc"])
+
+    assert ignore.match("a/b/x.pyc", False)
+    assert ignore.match("important.pyc", False) is False
+    assert ignore.match("dist", True)
+    assert ignore.match("src/dist", True) is None
+    assert ignore.match("docs/a/b/x.tmp", False)
+    assert ignore.match("cache", True)
+    assert ignore.match("cache", False) is None
+
+
+def test_index_respects_gitignore(project):
+    index = ProjectFileIndex(str(project))
+    index.build()
+
+    assert indexed(index) == [
+        ".gitignore", "README.md", "keep.log", "src/.gitignore", "src/core/main.py", "src/core/utils.py",
+    ]
+
+
+def test_fuzzy_search_prefers_file_names(project):
+    index = ProjectFileIndex(str(project))
+    index.build()
+
+    assert index.search("main")[0] == "src/core/main.py"
+    assert index.search("scpy") == ["src/core/main.py", "src/core/utils.py"]
+    assert index.search("zzz") == []
+
+
+def test_search_ranks_every_match(project):
+    index = ProjectFileIndex(str(project))
+    # Thousands of weak subsequence matches sorting before the one good match
+    index._set_paths([f"a{i:04}/mxaxixn.txt" for i in range(3000)] + ["zz/main.py", "docs/domain.md"])
+
+    assert index.search("main", limit=3) == ["zz/main.py", "docs/domain.md", "a0000/mxaxixn.txt"]
+    assert len(index.search("main", limit=5000)) == 3002
+    assert index.search("MAIN.PY") == ["zz/main.py"]
+
+
+def test_refresh_rescans_changed_directories(project):
+    index = ProjectFileIndex(str(project))
+    index.build()
+
+    (project / "src" / "core" / "new_module.py").write_text("")
+    bump_mtime(project / "src" / "core")
+    index.refresh()
+
+    assert "src/core/new_module.py" in indexed(index)
+
+
+def bump_mtime(path):
+    later = time.time() + 5
+    os.utime(path, (later, later))
+
+
+def test_refresh_rescans_only_changed_directory_entries(project, monkeypatch):
+    index = ProjectFileIndex(str(project))
+    index.build()
+    scanned = []
+    original = index._scan_dir
+    monkeypatch.setattr(index, "_scan_dir", lambda rel_dir: scanned.append(rel_dir) or original(rel_dir))
+
+    (project / "notes.txt").write_text("")
+    (project / "docs" / "api").mkdir(parents=True)
+    (project / "docs" / "api" / "index.md").write_text("")
+    bump_mtime(project)
+    index.refresh()
+
+    assert sorted(scanned) == ["", "docs", "docs/api"]
+    assert {"notes.txt", "docs/api/index.md", "src/core/main.py"} <= set(indexed(index))
+
+    scanned.clear()
+    for path in (project / "docs" / "api").iterdir():
+        path.unlink()
+    (project / "docs" / "api").rmdir()
+    (project / "docs").rmdir()
+    bump_mtime(project)
+    index.refresh()
+
+    assert "" in scanned and not any(rel_dir.startswith("src") for rel_dir in scanned)
+    assert not any(path.startswith("docs/") for path in indexed(index))
+
+
+def test_changed_gitignore_rescans_its_subtree(project):
+    index = ProjectFileIndex(str(project))
+    index.build()
+
+    (project / ".gitignore").write_text("build/\n*.log\n!keep.log\nsrc/core/utils.py\n")
+    bump_mtime(project)
+    index.refresh()
+
+    assert "src/core/utils.py" not in indexed(index)
+    assert "src/core/main.py" in indexed(index)
+
+
+def test_project_root_is_found(project):
+    assert find_project_root(str(project / "src" / "core")) == str(project)
+
+
+def test_completer_fuzzy_mode(project, monkeypatch):
+    from test_completer import BUILT_INS, FakeInputHandler
+    from core.input.completer import CommandCompleter
+
+    index = ProjectFileIndex(str(project))
+    index.build()
+    monkeypatch.setitem(file_index._indexes, str(project), index)
+
+    handler = FakeInputHandler(["vim"], BUILT_INS, str(project / "src"))
+    completer = CommandCompleter(handler)
+    completions = completer.complete_deterministic("util**", "vim util**", token_index=2, tool_index=0)
+
+    fuzzy = [c for c in completions if c.display_meta_text == "FUZZY PATH"]
+    assert fuzzy[0].text == os.path.join("core", "utils.py")
+    assert fuzzy[0].start_position == -len("util**")
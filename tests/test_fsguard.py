@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from core.input import dircache
+from core.input.fsguard import FilesystemGuard
+
+
+@pytest.fixture(autouse=True)
+def fast_timeouts(monkeypatch):
+    monkeypatch.setattr(config, "FS_PROBE_TIMEOUT_MS", 20, raising=False)
+    monkeypatch.setattr(config, "SLOW_PATH_RETRY_SECONDS", 0.05, raising=False)
+    monkeypatch.setattr(config, "SLOW_PATH_RETRY_MAX_SECONDS", 0.2, raising=False)
+
+
+def hang(release):
+    release.wait(5)
+    return "late"
+
+
+def test_fast_probe_returns_result(tmp_path):
+    guard = FilesystemGuard()
+
+    assert guard.exists(tmp_path)
+    assert guard.isdir(tmp_path)
+    assert not guard.exists(tmp_path / "missing")
+
+
+def test_slow_probe_times_out_and_marks_directory(tmp_path):
+    guard = FilesystemGuard()
+    release = threading.Event()
+    try:
+        start = time.perf_counter()
+        assert guard.run(tmp_path, hang, release, default="gave up") == "gave up"
+        assert time.perf_counter() - start < 1
+
+        assert guard.is_slow(tmp_path)
+        assert guard.is_slow(tmp_path / "nested" / "deeper")
+        assert not guard.is_slow(os.path.dirname(tmp_path))
+
+        # Skipped without touching the filesystem while the directory is slow
+        assert guard.run(tmp_path / "nested", os.listdir, tmp_path, default=None) is None
+    finally:
+        release.set()
+
+
+def test_directory_recovers_after_a_fast_trial(tmp_path):
+    guard = FilesystemGuard()
+    release = threading.Event()
+    guard.run(tmp_path, hang, release)
+    release.set()
+
+    # Still off until the backoff passes, even though the stuck probe has returned
+    time.sleep(0.01)
+    assert guard.is_slow(tmp_path)
+
+    time.sleep(0.1)
+    assert not guard.is_slow(tmp_path)
+    assert guard.isdir(tmp_path)
+    assert tmp_path.as_posix() not in guard._slow
+
+
+def test_stuck_probe_keeps_directory_off(tmp_path):
+    guard = FilesystemGuard()
+    release = threading.Event()
+    try:
+        guard.run(tmp_path, hang, release)
+        time.sleep(0.1)
+
+        # Backoff has passed but the first probe is still hanging: no second one is started
+        assert guard.is_slow(tmp_path)
+    finally:
+        release.set()
+
+
+def test_probe_errors_propagate(tmp_path):
+    guard = FilesystemGuard()
+
+    with pytest.raises(OSError):
+        guard.run(tmp_path, os.listdir, tmp_path / "missing")
+    assert not guard.is_slow(tmp_path)
+
+
+def test_directory_cache_skips_slow_directories(tmp_path, monkeypatch):
+    guard = FilesystemGuard()
+    monkeypatch.setattr(dircache, "fs_guard", guard)
+    cache = dircache.DirectoryCache(max_size=4)
+    (tmp_path / "file.txt").write_text("x")
+
+    release = threading.Event()
+    try:
+        guard.run(tmp_path, hang, release)
+
+        assert cache.listing(tmp_path) is None
+    finally:
+        release.set()
@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+from prompt_toolkit.document import Document
+
+from core.input.sources import git
+from core.input.sources.git import GitRefCache, find_git_dir
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git_dir = tmp_path / ".git"
+    write(git_dir / "HEAD", "ref: refs/heads/main\n")
+    write(git_dir / "refs/heads/main", SHA)
+    write(git_dir / "refs/heads/feature/login", SHA)
+    write(git_dir / "refs/tags/v1.0", SHA)
+    write(git_dir / "refs/remotes/origin/HEAD", "ref: refs/remotes/origin/main\n")
+    write(git_dir / "refs/remotes/origin/main", SHA)
+    write(git_dir / "packed-refs", (
+        "# pack-refs with: peeled fully-peeled sorted\n"
+        f"{SHA} refs/heads/release\n"
+        f"{SHA} refs/tags/v0.9\n"
+        f"^{SHA}\n"
+        f"{SHA} refs/tags/main\n"
+    ))
+    return tmp_path
+
+
+def test_refs_are_read_from_loose_and_packed_refs(repo):
+    (repo / "src").mkdir()
+    refs = GitRefCache().refs(repo / "src")
+
+    assert refs.names == ["feature/login", "main", "origin/main", "release", "v0.9", "v1.0"]
+    assert refs.kinds["main"] == "branch"  # shadows the tag of the same name
+    assert refs.kinds["v0.9"] == "tag"
+    assert refs.kinds["origin/main"] == "remote"
+    assert refs.head == "main"
+    assert refs.matching("fe") == ["feature/login"]
+
+
+def test_refs_reload_when_mtimes_change(repo, monkeypatch):
+    monkeypatch.setattr(git, "VALIDATE_INTERVAL", 0)
+    cache = GitRefCache()
+    refs = cache.refs(repo)
+    assert "hotfix" not in refs.kinds
+
+    write(repo / ".git/refs/heads/hotfix", SHA)
+    later = time.time() + 5
+    os.utime(repo / ".git/refs/heads", (later, later))
+
+    assert "hotfix" in cache.refs(repo).kinds
+
+
+def test_worktree_reads_its_own_head_and_shared_refs(repo):
+    worktree = repo.parent / "worktree"
+    worktree.mkdir()
+    write(repo / ".git/worktrees/worktree/HEAD", "ref: refs/heads/feature/login\n")
+    write(repo / ".git/worktrees/worktree/commondir", "../..\n")
+    write(worktree / ".git", f"gitdir: {repo / '.git/worktrees/worktree'}\n")
+
+    git_dir, common_dir = find_git_dir(worktree)
+    refs = GitRefCache().refs(worktree)
+
+    assert os.path.samefile(common_dir, repo / ".git")
+    assert refs.head == "feature/login"
+    assert "release" in refs.kinds
+
+
+def test_git_checkout_completes_refs(completer, repo):
+    completer.input_handler.shell.working_dir = str(repo)
+
+    completions = list(completer.get_completions(Document("git checkout fe"), None))
+    assert texts(completions) == ["feature/login"]
+
+    metas = {c.text: c.display_meta_text for c in completer.get_completions(Document("git switch "), None)}
+    assert metas["main"] == "GIT BRANCH (current)"
+    assert metas["v1.0"] == "GIT TAG"
+    assert "release" not in texts(completer.get_completions(Document("git add rel"), None))
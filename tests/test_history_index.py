@@ -0,0 +1,138 @@
+import random
+from types import SimpleNamespace
+
+from prompt_toolkit.document import Document
+
+from core.input.history import HistoryPrefixIndex, HistoryTokenIndex, IndexedFileHistory, ShellFileHistory
+from core.input.ranking import FrecencyRanker
+from core.input.suggest import HistoryAutoSuggest
+
+
+def test_index_orders_by_recency_and_counts():
+    index = HistoryTokenIndex()
+    index.rebuild(["git pull", "git push", "git pull"])
+
+    assert index.candidates("git", 1) == [("pull", 2), ("push", 1)]
+    assert index.candidates("pull", 2) == []
+
+
+def test_index_buckets_are_bounded(monkeypatch):
+    monkeypatch.setattr(HistoryTokenIndex, "MAX_BUCKET", 3)
+    index = HistoryTokenIndex()
+    for i in range(10):
+        index.add(f"echo {i}")
+
+    assert [c for c, _ in index.candidates("echo", 1)] == ["9", "8", "7"]
+
+
+def test_file_history_keeps_index_in_step(tmp_path):
+    filename = str(tmp_path / "history.txt")
+    history = IndexedFileHistory(filename)
+    history.append_string("make build")
+
+    reloaded = IndexedFileHistory(filename)
+    reloaded.load_history_strings()
+    reloaded.append_string("make test")
+
+    assert [c for c, _ in reloaded.index.candidates("make", 1)] == ["test", "build"]
+
+
+def test_prefix_index_suggests_most_recent_extension():
+    index = HistoryPrefixIndex()
+    index.add("git status", ts=1000)
+    index.add("git stash", ts=2000)
+    index.add("git status", ts=3000)
+
+    assert index.suggest("git st") == "git status"
+    assert index.suggest("git stas") == "git stash"
+    assert index.suggest("git status") is None  # nothing longer
+    assert index.suggest("gx") is None
+    assert index.suggest("") is None
+    assert len(index) == 2
+
+
+def test_prefix_index_prefers_entries_from_cwd():
+    index = HistoryPrefixIndex()
+    index.add("make deploy", cwd="/srv/site", ts=1000)
+    index.add("make test", cwd="/src/app", ts=2000)
+
+    assert index.suggest("make") == "make test"
+    assert index.suggest("make", cwd="/srv/site") == "make deploy"
+
+
+def test_prefix_index_top_lists_survive_edge_splits(monkeypatch):
+    monkeypatch.setattr(HistoryPrefixIndex, "TOP_K", 2)
+    index = HistoryPrefixIndex()
+    for ts, entry in enumerate(["docker run", "docker ps", "docker push", "dig x", "docker pull"], 1):
+        index.add(entry, ts=ts * 1000)
+
+    assert index.suggest("d") == "docker pull"
+    assert index.suggest("docker r") == "docker run"
+    assert index.suggest("docker pus") == "docker push"
+    assert index.suggest("di") == "dig x"
+
+    index.add("docker run", ts=10_000)
+    assert index.suggest("do") == "docker run"
+
+
+def test_prefix_index_matches_a_linear_scan():
+    rng = random.Random(0)
+    index = HistoryPrefixIndex()
+    ranker = FrecencyRanker(None)
+    for ts in range(1, 3000):
+        entry = " ".join(rng.choice(["git", "go", "grep", "ls", "l"]) for _ in range(rng.randint(1, 3)))
+        index.add(entry, ts=ts * 3600)
+        ranker.record(entry, ts=ts * 3600)
+
+    for prefix in ["g", "gi", "git g", "l", "ls l", "go go", "grep grep grep"]:
+        matches = [e for e in ranker.scores if e.startswith(prefix) and e != prefix]
+        expected = max(matches, key=ranker.score) if matches else None
+        assert index.suggest(prefix) == expected, prefix
+
+
+def test_shell_history_feeds_prefix_index(tmp_path):
+    filename = str(tmp_path / "history.txt")
+    shell = SimpleNamespace(working_dir="/work", active_venv=None)
+    history = ShellFileHistory(shell, filename)
+    history.append_string("pytest -q")
+    history.append_string("pip install -e .")
+
+    reloaded = ShellFileHistory(shell, filename)
+    assert reloaded.prefix_index.ready.wait(5)
+    assert reloaded.prefix_index.suggest("py") == "pytest -q"
+    assert reloaded.prefix_index.suggest("pi", cwd="/work") == "pip install -e ."
+
+    suggest = HistoryAutoSuggest(reloaded, shell)
+    suggestion = suggest.get_suggestion(None, Document("pyt"))
+    assert suggestion.text == "est -q"
+    assert suggest.get_suggestion(None, Document("pyt", cursor_position=1)) is None
+    assert suggest.get_suggestion(None, Document("  ")) is None
+
+
+def test_prefix_index_keeps_entries_added_during_rebuild():
+    index = HistoryPrefixIndex()
+
+    def items():
+        yield "ls -la", None, 1000
+        index.add("ls -lh", ts=3000)  # typed while the history is still being indexed
+        yield "ls -l /tmp", None, 2000
+
+    index.rebuild(items())
+
+    assert index.suggest("ls -l") == "ls -lh"
+    assert index.suggest("ls -l/") is None
+    assert len(index) == 3
+
+
+def test_prefix_index_outgrows_the_ranking_cap(monkeypatch):
+    monkeypatch.setattr("config.RANKING_MAX_ITEMS", 50)
+    index = HistoryPrefixIndex()
+    index.rebuild_in_background((f"echo {i}", None, 1000 + i) for i in range(300))
+    assert index.ready.wait(5)
+    for i in range(300, 400):
+        index.add(f"echo {i}", ts=1000 + i)
+
+    assert len(index) == 400
+    assert index.suggest("echo 2") == "echo 299"
+    assert index.suggest("echo 1") == "echo 199"
+    assert index.suggest("echo 3") == "echo 399"
@@ -1,8 +1,16 @@
 import os
+import random
+import threading
 import re
+import time
 import pytest
 from collections import Counter
+import config
+from core.environment import environment
 from core.input.__init__ import ShellLexer, style
+from core.input.lexer import split_by_linkers, split_words
+from core.input.dircache import dir_cache, path_resolver
+from core.input.stats import completion_stats
 
 # ---------- Prepare formating ----------
 # Map basic colors to ANSI codes
@@ -105,10 +113,12 @@ def shell(fake_fs):
     return FakeShell(working_dir=fake_fs)
 
 
-def test_shell_lexing(shell, capsys):
+def test_shell_lexing(shell, capsys, monkeypatch):
     """
     Ensures every lexer token type is produced exactly once.
     """
+    monkeypatch.setenv("ENV_VAR", "value")
+    environment.bump()
     print("\n[test_shell_lexing] --- Running Lexer Test ---")
 
     lexer = ShellLexer(shell)
@@ -197,3 +207,226 @@ def test_multichar_linkers_are_matched_first(shell):
 
     assert ("class:link", ">>") in tokens
     assert ("class:link", ">") not in tokens
+
+
+def test_undefined_env_vars_are_marked(shell, monkeypatch):
+    monkeypatch.setenv("TS_DEFINED", "1")
+    monkeypatch.delenv("TS_UNDEFINED", raising=False)
+    environment.bump()
+    lexer = ShellLexer(shell)
+    document = FakeDocument("tool $TS_DEFINED ${TS_DEFINED}/x $TS_UNDEFINED $? $(date)")
+
+    tokens = [(cls, val) for cls, val in lexer.lex_document(document)(0) if cls]
+
+    assert tokens[1:] == [
+        ("class:env_var", "$TS_DEFINED"),
+        ("class:env_var", "${TS_DEFINED}/x"),
+        ("class:env_var.undefined", "$TS_UNDEFINED"),
+        ("class:env_var", "$?"),
+        ("class:env_var", "$(date)"),
+    ]
+
+
+def test_unchanged_lines_are_served_from_cache(shell, fake_fs, monkeypatch):
+    completion_stats.reset()
+    lexer = ShellLexer(shell)
+    document = FakeDocument("tool file_complete.txt")
+
+    first = lexer.lex_document(document)(0)
+    assert lexer.lex_document(document)(0) == first
+    assert completion_stats.cache_rows() == [["lexer", 1, 1, 50.0]]
+
+    # A new file shows up once the filesystem generation moves on
+    (fake_fs / "new.txt").write_text("x")
+    document = FakeDocument("tool new.txt")
+    lexer.lex_document(document)(0)
+    dir_cache.touch()
+    assert ("class:file_complete", "new.txt") in lexer.lex_document(document)(0)
+    assert completion_stats.cache_rows() == [["lexer", 1, 3, 25.0]]
+
+    monkeypatch.setattr(config, "HIGHLIGHT_CACHE_SECONDS", 0)
+    lexer.lex_document(document)(0)
+    assert completion_stats.cache_rows()[0][2] == 4
+    completion_stats.reset()
+
+
+def test_words_sharing_a_directory_are_resolved_together(shell, fake_fs, monkeypatch):
+    lookups = []
+    original = dir_cache.listing
+    monkeypatch.setattr(dir_cache, "listing", lambda path, strict=False: lookups.append(path) or original(path, strict))
+    lexer = ShellLexer(shell)
+
+    tokens = lexer.lex_document(FakeDocument("tool file_complete.txt file_partia nope dev/partial_di"))(0)
+
+    assert ("class:file_complete", "file_complete.txt") in tokens
+    assert ("class:file", "file_partia") in tokens
+    assert ("class:path", "dev/partial_di") in tokens
+    assert sorted(lookups) == [str(fake_fs), str(fake_fs / "dev")]
+
+
+
+def test_edits_relex_only_the_changed_segment(shell, fake_fs, monkeypatch):
+    resolved = []
+    original = path_resolver.resolve
+    monkeypatch.setattr(path_resolver, "resolve", lambda paths: resolved.append(paths) or original(paths))
+    lexer = ShellLexer(shell)
+    lexer.lex_document(FakeDocument("tool file_complete.txt | tool file_partia && tool nope"))(0)
+
+    resolved.clear()
+    tokens = lexer.lex_document(FakeDocument("tool file_complete.txt | tool file_partial.txt && tool nope"))(0)
+
+    assert ("class:file_complete", "file_complete.txt") in tokens
+    assert ("class:file_complete", "file_partial.txt") in tokens
+    assert resolved == [[os.path.join(str(fake_fs), "tool"), os.path.join(str(fake_fs), "file_partial.txt")]]
+
+
+def test_stale_segments_are_revalidated_without_retokenizing(shell, fake_fs, monkeypatch):
+    lexer = ShellLexer(shell)
+    document = FakeDocument("tool fresh.txt && tool file_complete.txt")
+    assert ("class:arg", "fresh.txt") in lexer.lex_document(document)(0)
+
+    monkeypatch.setattr(lexer, "_tokenize", lambda segment, cwd: pytest.fail(f"re-tokenized {segment!r}"))
+    (fake_fs / "fresh.txt").write_text("x")
+    dir_cache.touch()
+    tokens = lexer.lex_document(document)(0)
+
+    assert ("class:file_complete", "fresh.txt") in tokens
+    assert ("class:file_complete", "file_complete.txt") in tokens
+
+
+
+class FakeApp:
+    def __init__(self):
+        self.invalidated = threading.Event()
+
+    def invalidate(self):
+        self.invalidated.set()
+
+
+def test_async_validation_renders_provisionally_then_invalidates(shell, fake_fs, monkeypatch):
+    app = FakeApp()
+    monkeypatch.setattr("core.input.lexer.get_app_or_none", lambda: app)
+    resolved = threading.Event()
+    original = path_resolver.resolve
+
+    def slow_resolve(paths):
+        assert threading.current_thread() is not threading.main_thread()
+        resolved.wait(5)
+        return original(paths)
+
+    monkeypatch.setattr(path_resolver, "resolve", slow_resolve)
+    lexer = ShellLexer(shell, async_validation=True)
+    document = FakeDocument("tool file_complete.txt dev/partial_di")
+
+    # Rendered at once, as if nothing existed, while the worker waits on "disk"
+    tokens = lexer.lex_document(document)(0)
+    assert ("class:arg", "file_complete.txt") in tokens
+    assert ("class:arg", "dev/partial_di") in tokens
+
+    resolved.set()
+    assert app.invalidated.wait(5)
+    tokens = lexer.lex_document(document)(0)
+    assert ("class:file_complete", "file_complete.txt") in tokens
+    assert ("class:path", "dev/partial_di") in tokens
+
+
+def test_failed_validation_does_not_stop_later_ones(shell, fake_fs, monkeypatch):
+    app = FakeApp()
+    monkeypatch.setattr("core.input.lexer.get_app_or_none", lambda: app)
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+    original = path_resolver.resolve
+    calls = []
+
+    def failing_once(paths):
+        calls.append(paths)
+        if len(calls) == 1:
+            raise RuntimeError("resolver bug")
+        return original(paths)
+
+    monkeypatch.setattr(path_resolver, "resolve", failing_once)
+    lexer = ShellLexer(shell, async_validation=True)
+    lexer.lex_document(FakeDocument("tool dev/partial_di"))(0)
+    deadline = time.monotonic() + 5
+    while lexer._validating and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    document = FakeDocument("tool file_complete.txt")
+    lexer.lex_document(document)(0)
+    assert app.invalidated.wait(5)
+    assert ("class:file_complete", "file_complete.txt") in lexer.lex_document(document)(0)
+
+
+def _reference_split_by_linkers(line):
+    # The original character loop, kept to check the scanner against
+    parts, buf, i, quote = [], "", 0, None
+    symbols = sorted(config.COMMAND_LINKING_SYMBOLS, key=len, reverse=True)
+    while i < len(line):
+        ch = line[i]
+        if ch == "\\" and quote == '"' and i + 1 < len(line):
+            buf += line[i:i + 2]
+            i += 2
+            continue
+        if ch in ("'", '"'):
+            if quote is None:
+                quote = ch
+            elif ch == quote:
+                quote = None
+            buf += ch
+            i += 1
+            continue
+        sym = next((s for s in symbols if quote is None and line.startswith(s, i)), None)
+        if sym is None:
+            buf += ch
+            i += 1
+            continue
+        if buf:
+            parts.append(("segment", buf))
+        parts.append(("link", sym))
+        buf = ""
+        i += len(sym)
+    if buf:
+        parts.append(("segment", buf))
+    return parts
+
+
+def _reference_split_words(segment):
+    items, current, i, quote, quoted = [], "", 0, None, False
+    while i < len(segment):
+        ch = segment[i]
+        if ch == "\\" and quote == '"' and i + 1 < len(segment):
+            current += segment[i:i + 2]
+            i += 2
+            continue
+        if ch in ("'", '"'):
+            if quote is None:
+                quote, quoted = ch, True
+            elif ch == quote:
+                quote = None
+        elif ch == " " and quote is None:
+            if current:
+                items.append((current, quoted))
+            items.append((None, False))
+            current, quoted = "", False
+            i += 1
+            continue
+        current += ch
+        i += 1
+    if current:
+        items.append((current, quoted or quote is not None))
+    return items
+
+
+def test_scanner_matches_character_loop():
+    rng = random.Random(48)
+    alphabet = ["a", "2", " ", " ", "'", '"', "\\", "&", "|", ">", "<", "$"]
+    lines = [
+        'echo "a \\" && b" && c',
+        "a 2>err &>all >>log | b || c",
+        "it's \"x 'y\" z' \\",
+        'unterminated "a && b',
+    ]
+    lines += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(3000)]
+
+    for line in lines:
+        assert split_by_linkers(line) == _reference_split_by_linkers(line), line
+        assert split_words(line) == _reference_split_words(line), line
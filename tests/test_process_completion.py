@@ -0,0 +1,73 @@
+import os
+from types import SimpleNamespace
+
+import psutil
+from prompt_toolkit.document import Document
+
+from core.input.sources import processes
+from core.input.sources.processes import ProcessSnapshot
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+PROCESSES = [(1, "init"), (42, "sshd"), (420, "Firefox"), (4242, "firefox-bin"), (7, "python3")]
+
+
+def fake_process_iter(calls):
+    def process_iter(attrs):
+        calls.append(attrs)
+        return [SimpleNamespace(info={"pid": pid, "name": name}) for pid, name in PROCESSES]
+
+    return process_iter
+
+
+def test_snapshot_walks_processes_once_per_ttl(monkeypatch):
+    calls = []
+    monkeypatch.setattr(psutil, "process_iter", fake_process_iter(calls))
+    snapshot = ProcessSnapshot()
+
+    assert snapshot.processes()[:2] == [(1, "init"), (7, "python3")]
+    snapshot.processes()
+    assert len(calls) == 1
+
+    monkeypatch.setattr(processes, "SNAPSHOT_TTL", 0)
+    snapshot.processes()
+    assert len(calls) == 2
+
+
+def test_pids_are_completed_by_pid_or_name(completer, monkeypatch):
+    monkeypatch.setattr(psutil, "process_iter", fake_process_iter([]))
+    monkeypatch.setattr(processes, "process_snapshot", ProcessSnapshot())
+
+    def complete(text):
+        return [c for c in completer.get_completions(Document(text), None) if c.text.isdigit()]
+
+    assert texts(complete("kill 42")) == ["42", "420", "4242"]
+    assert [c.display_meta_text for c in complete("kill 42")] == ["sshd", "Firefox", "firefox-bin"]
+    assert texts(complete("sudo kill -9 fire")) == ["420", "4242"]
+    assert texts(complete("strace -p ")) == ["1", "7", "42", "420", "4242"]
+    assert complete("kill -") == []
+    assert complete("sed 4") == []
+
+
+def test_own_pid_is_found():
+    pids = [pid for pid, _ in ProcessSnapshot().processes()]
+    assert os.getpid() in pids
+
+
+def test_task_ids_are_completed_with_status(completer):
+    def task(task_id, running, command):
+        status = "RUNNING" if running else "DONE"
+        return SimpleNamespace(id=task_id, running=running, command=command, status=lambda: status)
+
+    completer.input_handler.shell.btm = SimpleNamespace(tasks={
+        1: task(1, False, "make"),
+        2: task(2, True, "sleep 100"),
+        12: task(12, True, "npm run dev"),
+    })
+
+    def complete(text):
+        return [c for c in completer.get_completions(Document(text), None) if c.text.isdigit()]
+
+    assert texts(complete("bg output ")) == ["1", "2", "12"]
+    assert [c.display_meta_text for c in complete("bg output 1")] == ["DONE make", "RUNNING npm run dev"]
+    assert texts(complete("bg kill ")) == ["2", "12"]
+    assert complete("bg kill 2 ") == []
@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+from prompt_toolkit.document import Document
+
+from core.input.sources import python
+from core.input.sources.python import PythonEnvironmentCache, environment_paths, scan_directory
+from test_completer import completer, texts  # noqa: F401 (fixture)
+
+
+def make_base(prefix, version="3.11"):
+    """
+    A Python installation at prefix: an interpreter, a stdlib and site-packages.
+    """
+    lib = prefix / "lib" / f"python{version}"
+    (lib / "json").mkdir(parents=True)
+    (lib / "json" / "__init__.py").write_text("")
+    (lib / "os.py").write_text("")
+    (lib / "site-packages" / "system_only").mkdir(parents=True)
+    (prefix / "bin").mkdir()
+    (prefix / "bin" / f"python{version}").write_text("")
+    (prefix / "bin" / f"python{version}").chmod(0o755)
+    return prefix
+
+
+def make_venv(root, modules=(), dists=(), system_site=False, base=None):
+    site = root / "lib" / "python3.11" / "site-packages"
+    site.mkdir(parents=True)
+    config = f"include-system-site-packages = {str(system_site).lower()}\nversion = 3.11.4\n"
+    if base is not None:
+        config = f"home = {base / 'bin'}\n" + config
+    (root / "pyvenv.cfg").write_text(config)
+    for module in modules:
+        if module.endswith("/"):
+            (site / module / "__init__.py").parent.mkdir(parents=True)
+            (site / module / "__init__.py").write_text("")
+        else:
+            (site / module).write_text("")
+    for dist in dists:
+        (site / dist).mkdir()
+    return site
+
+
+@pytest.fixture
+def venv(tmp_path):
+    root = tmp_path / "venv"
+    make_venv(root, base=make_base(tmp_path / "base"), modules=["requests/", "six.py", "_speedups.cpython-311-x86_64-linux-gnu.so", "not-a-module.py"],
+              dists=["requests-2.31.0.dist-info", "six-1.16.0.dist-info", "Flask_Login-0.6.egg-info"])
+    (root / "lib/python3.11/site-packages/requests/adapters.py").write_text("")
+    (root / "lib/python3.11/site-packages/requests/auth.py").write_text("")
+    return root
+
+
+def test_scan_finds_modules_packages_and_distributions(venv):
+    modules, dists = scan_directory(venv / "lib/python3.11/site-packages")
+
+    assert set(modules) == {"requests", "six", "_speedups"}
+    assert modules["six"] is None
+    assert dists == {"requests": "2.31.0", "six": "1.16.0", "Flask_Login": "0.6"}
+
+
+def test_venv_paths_come_from_its_base_interpreter(venv, tmp_path):
+    base = tmp_path / "base" / "lib" / "python3.11"
+
+    assert environment_paths(str(venv)) == [str(base), str(venv / "lib/python3.11/site-packages")]
+
+    shared = tmp_path / "shared"
+    make_venv(shared, base=tmp_path / "base", system_site=True)
+    assert environment_paths(str(shared))[-1] == str(base / "site-packages")
+
+
+def test_paths_without_a_venv_follow_the_python_on_path(tmp_path, monkeypatch):
+    make_base(tmp_path / "py39", version="3.9")
+    (tmp_path / "py39" / "bin" / "python3").symlink_to("python3.9")
+    monkeypatch.setenv("PATH", str(tmp_path / "py39" / "bin"))
+    monkeypatch.setenv("HOME", str(tmp_path))
+
+    paths = environment_paths(None)
+
+    assert paths == [str(tmp_path / "py39/lib/python3.9"), str(tmp_path / "py39/lib/python3.9/site-packages")]
+
+
+def test_switching_venvs_reuses_snapshots(venv, tmp_path, monkeypatch):
+    monkeypatch.setattr(python, "VALIDATE_INTERVAL", 0)
+    other = tmp_path / "other"
+    make_venv(other, modules=["numpy/"], dists=["numpy-1.26.0.dist-info"])
+    cache = PythonEnvironmentCache()
+
+    first = cache.get(str(venv))
+    second = cache.get(str(other))
+    scans = []
+    monkeypatch.setattr(python, "scan_directory", lambda path: scans.append(path) or ({}, {}))
+
+    assert cache.get(str(venv)) is first
+    assert cache.get(str(other)) is second
+    assert "numpy" in second.dists and "numpy" not in first.dists
+    assert scans == []
+
+    # Installing into one venv rescans only its site-packages
+    site = venv / "lib/python3.11/site-packages"
+    (site / "attrs-23.1.0.dist-info").mkdir()
+    later = time.time() + 5
+    os.utime(site, (later, later))
+    cache.get(str(venv))
+    assert scans == [str(site)]
+
+
+def test_packages_are_completed_for_the_active_venv(completer, venv, monkeypatch):
+    monkeypatch.setenv("VIRTUAL_ENV", str(venv))
+    completer.input_handler.shell.working_dir = str(venv)
+
+    def complete(text):
+        return [c for c in completer.get_completions(Document(text), None)
+                if c.display_meta_text.startswith(("PACKAGE", "MODULE"))]
+
+    assert texts(complete("pip show re")) == ["requests"]
+    assert texts(complete("pip uninstall six flask")) == ["Flask_Login"]
+    assert texts(complete("python3.11 -m pip show s")) == ["six"]
+    assert "requests" in texts(complete("python3.11 -m re"))
+    assert "json" in texts(complete("sudo python3.11 -m js"))
+    assert texts(complete("python3.11 -m requests.a")) == ["requests.adapters", "requests.auth"]
+    assert complete("pip install re") == []
+    assert complete("python3.11 script.py re") == []
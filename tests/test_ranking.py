@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+from prompt_toolkit.completion import Completion
+
+from core.input.history import ShellFileHistory
+from core.input.ranking import FrecencyRanker
+
+DAY = 86400
+
+
+def completions(*names):
+    return [Completion(name) for name in names]
+
+
+def names(items):
+    return [c.text for c in items]
+
+
+def test_frequent_items_rank_first(tmp_path):
+    ranker = FrecencyRanker(str(tmp_path / "rank"), half_life_days=1)
+    for _ in range(3):
+        ranker.record("pull", ts=100 * DAY)
+    ranker.record("push", ts=100 * DAY)
+
+    assert names(ranker.rank(completions("push", "status", "pull"))) == ["pull", "push", "status"]
+
+
+def test_recent_use_outweighs_old_frequency(tmp_path):
+    ranker = FrecencyRanker(str(tmp_path / "rank"), half_life_days=1)
+    for _ in range(4):
+        ranker.record("old", ts=100 * DAY)
+    ranker.record("new", ts=103 * DAY)
+
+    assert names(ranker.rank(completions("old", "new"))) == ["new", "old"]
+
+
+def test_current_directory_is_preferred(tmp_path):
+    ranker = FrecencyRanker(str(tmp_path / "rank"), half_life_days=1)
+    ranker.record("build", cwd="/proj", ts=100 * DAY)
+    ranker.record("deploy", cwd="/other", ts=100 * DAY)
+    ranker.record("deploy", cwd="/other", ts=100 * DAY)
+
+    assert names(ranker.rank(completions("deploy", "build"), cwd="/proj")) == ["build", "deploy"]
+    assert names(ranker.rank(completions("build", "deploy"), cwd="/other")) == ["deploy", "build"]
+
+
+def test_scores_persist(tmp_path):
+    path = str(tmp_path / "rank")
+    ranker = FrecencyRanker(path)
+    ranker.record_line("git status", cwd="/proj")
+    ranker.save()
+
+    reloaded = FrecencyRanker(path)
+
+    assert reloaded.load()
+    assert reloaded.scores.keys() == {"git", "status"}
+    assert not FrecencyRanker(str(tmp_path / "missing")).load()
+
+
+def test_history_metadata_pairs_with_entries(tmp_path):
+    shell = SimpleNamespace(working_dir="/proj", active_venv=None)
+    filename = str(tmp_path / "history.txt")
+    history = ShellFileHistory(shell, filename)
+    history.append_string("make build")
+    shell.working_dir = "/other"
+    history.append_string("echo one\necho two")
+
+    reloaded = ShellFileHistory(shell, filename)
+
+    assert reloaded.cmd_meta["make build"][0]["cwd"] == "/proj"
+    assert reloaded.cmd_meta["echo one\necho two"][0]["cwd"] == "/other"
+
+    ranker = FrecencyRanker(str(tmp_path / "rank"))
+    ranker.bootstrap(reloaded.cmd_meta)
+    assert ranker.score("build", cwd="/proj") > ranker.score("build", cwd="/other")
+
+
+def test_vocabulary_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.RANKING_MAX_ITEMS", 100)
+    monkeypatch.setattr("config.RANKING_MAX_DIRECTORIES", 4)
+    monkeypatch.setattr("config.RANKING_MAX_DIRECTORY_ITEMS", 10)
+    path = str(tmp_path / "rank")
+    ranker = FrecencyRanker(path, half_life_days=1)
+    for day in range(1, 1001):
+        ranker.record(f"token{day}", cwd="/proj", ts=day * DAY)
+        ranker.record("ls", cwd=f"/dir{day % 10}", ts=day * DAY)
+        assert len(ranker.scores) <= 125
+        assert len(ranker.cwd_scores) <= 5
+    ranker.save()
+
+    reloaded = FrecencyRanker(path)
+    assert reloaded.load()
+    # The most recent uses survive
+    assert len(reloaded.scores) == 100 and "token1000" in reloaded.scores and "token1" not in reloaded.scores
+    assert sorted(reloaded.cwd_scores) == ["/dir0", "/dir8", "/dir9", "/proj"]
+    assert len(reloaded.cwd_scores["/proj"]) == 10 and "token1000" in reloaded.cwd_scores["/proj"]